@@ -0,0 +1,86 @@
+"""
+Admission control for voter WebSocket handshakes.
+
+After a deploy or proxy restart every voter reconnects at once. A
+per-process token bucket admits up to ``CONNECT_RATE`` handshakes per second
+(with ``CONNECT_BURST`` of headroom); the rest are closed straight away with
+``CLOSE_TRY_AGAIN`` and a jittered ``retry_after_ms`` hint, spread over the
+time it takes to admit everyone already turned away. While turned-away
+clients are still expected back the bucket reports a storm, and admitted
+sockets skip the presence broadcast on connect.
+"""
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+from django.conf import settings
+
+CONNECT_RATE = float(getattr(settings, "MOTION_CONNECT_RATE", 200))
+CONNECT_BURST = float(getattr(settings, "MOTION_CONNECT_BURST", 400))
+MIN_RETRY_SEC = 0.5
+
+# Application close code (4000-4999), mirroring HTTP 429.
+CLOSE_TRY_AGAIN = 4429
+
+
+class AdmissionBucket:
+    def __init__(self, rate: float = CONNECT_RATE, burst: float = CONNECT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._tokens = burst
+        # Turned-away handshakes expected back, drained at ``rate``.
+        self._waiting = 0.0
+        self._updated = time.monotonic()
+        self.admitted = 0
+        self.deferred = 0
+
+    def _refill(self, now: float):
+        elapsed = max(0.0, now - self._updated)
+        self._updated = now
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._waiting = max(0.0, self._waiting - elapsed * self.rate)
+
+    def admit(self, now: Optional[float] = None) -> Optional[float]:
+        """
+        None when the handshake may proceed, otherwise seconds to wait.
+        """
+        if self.rate <= 0:
+            return None
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.admitted += 1
+                return None
+            self._waiting += 1
+            self.deferred += 1
+            spread = self._waiting / self.rate
+            return max(MIN_RETRY_SEC, random.uniform(spread / 2, spread))
+
+    def storm(self, now: Optional[float] = None) -> bool:
+        if self.rate <= 0:
+            return False
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._refill(now)
+            return self._waiting >= 1
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            self._refill(now)
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "tokens": round(self._tokens, 1),
+                "waiting": round(self._waiting, 1),
+                "storm": self._waiting >= 1,
+                "admitted": self.admitted,
+                "deferred": self.deferred,
+            }
+
+
+admission = AdmissionBucket()
@@ -0,0 +1,192 @@
+"""
+Attendance history per event for quorum tracking.
+
+The presence ticker records the live count once per tick. Points are kept at
+per-second resolution in a ring buffer and rolled up incrementally into
+per-minute points (min, max, average, last). Both series live in Redis lists
+trimmed to a fixed length, or in process-local deques without Redis, so
+reading history is O(points) and never touches heartbeats.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from django.conf import settings
+
+from .redis_registry import get_redis, record_failure
+
+logger = logging.getLogger(__name__)
+
+SECONDS_KEPT = int(getattr(settings, "MOTION_ATTENDANCE_SECONDS_KEPT", 900))
+MINUTES_KEPT = int(getattr(settings, "MOTION_ATTENDANCE_MINUTES_KEPT", 1440))
+KEY_TTL_SEC = 7 * 86400
+
+RESOLUTION_SECOND = "second"
+RESOLUTION_MINUTE = "minute"
+
+# KEYS: seconds list, minutes list, current-minute accumulator hash
+# ARGV: ts, count, seconds kept, minutes kept, ttl
+# Seconds entries are "ts:count"; minute entries "minute:min:max:avg:last".
+_RECORD_SCRIPT = """
+local ts = tonumber(ARGV[1])
+local c = tonumber(ARGV[2])
+local entry = ARGV[1] .. ':' .. ARGV[2]
+local last = redis.call('LINDEX', KEYS[1], -1)
+if last and string.sub(last, 1, #ARGV[1] + 1) == ARGV[1] .. ':' then
+  redis.call('LSET', KEYS[1], -1, entry)
+else
+  redis.call('RPUSH', KEYS[1], entry)
+  redis.call('LTRIM', KEYS[1], -tonumber(ARGV[3]), -1)
+end
+local minute = math.floor(ts / 60) * 60
+local acc = redis.call('HMGET', KEYS[3], 'minute', 'min', 'max', 'sum', 'n', 'last')
+if acc[1] and tonumber(acc[1]) ~= minute then
+  local avg = string.format('%.1f', tonumber(acc[4]) / tonumber(acc[5]))
+  redis.call('RPUSH', KEYS[2], acc[1] .. ':' .. acc[2] .. ':' .. acc[3] .. ':' .. avg .. ':' .. acc[6])
+  redis.call('LTRIM', KEYS[2], -tonumber(ARGV[4]), -1)
+  acc[1] = false
+end
+if not acc[1] then
+  redis.call('HSET', KEYS[3], 'minute', minute, 'min', c, 'max', c, 'sum', c, 'n', 1, 'last', c)
+else
+  redis.call('HSET', KEYS[3], 'min', math.min(tonumber(acc[2]), c), 'max', math.max(tonumber(acc[3]), c),
+    'sum', tonumber(acc[4]) + c, 'n', tonumber(acc[5]) + 1, 'last', c)
+end
+for i = 1, 3 do
+  redis.call('EXPIRE', KEYS[i], tonumber(ARGV[5]))
+end
+return 1
+"""
+
+
+def _keys(event_id: int) -> List[str]:
+    base = f"attendance:event:{event_id}"
+    return [f"{base}:s", f"{base}:m", f"{base}:acc"]
+
+
+def _minute_point(minute: int, low: int, high: int, total: float, n: int, last: int) -> Dict:
+    return {"t": minute, "min": low, "max": high, "avg": round(total / max(n, 1), 1), "last": last}
+
+
+class _LocalSeries:
+    __slots__ = ("seconds", "minutes", "acc")
+
+    def __init__(self):
+        self.seconds: Deque[List[int]] = deque(maxlen=SECONDS_KEPT)
+        self.minutes: Deque[Dict] = deque(maxlen=MINUTES_KEPT)
+        # [minute, min, max, sum, n, last] for the minute in progress
+        self.acc: Optional[List[int]] = None
+
+
+class AttendanceSeries:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local: Dict[int, _LocalSeries] = {}
+        self._script = None
+
+    def record(self, event_id: int, count: int, now: Optional[float] = None):
+        ts = int(time.time() if now is None else now)
+        client = get_redis()
+        if client:
+            try:
+                if self._script is None or getattr(self._script, "registered_client", None) is not client:
+                    self._script = client.register_script(_RECORD_SCRIPT)
+                self._script(
+                    keys=_keys(event_id), args=[ts, int(count), SECONDS_KEPT, MINUTES_KEPT, KEY_TTL_SEC]
+                )
+                return
+            except Exception as exc:  # pragma: no cover
+                record_failure(exc)
+                logger.debug("Attendance record fallback to local series")
+        minute = ts - ts % 60
+        with self._lock:
+            series = self._local.setdefault(event_id, _LocalSeries())
+            if series.seconds and series.seconds[-1][0] == ts:
+                series.seconds[-1][1] = count
+            else:
+                series.seconds.append([ts, count])
+            acc = series.acc
+            if acc and acc[0] != minute:
+                series.minutes.append(_minute_point(*acc))
+                acc = None
+            if acc is None:
+                series.acc = [minute, count, count, count, 1, count]
+            else:
+                acc[1] = min(acc[1], count)
+                acc[2] = max(acc[2], count)
+                acc[3] += count
+                acc[4] += 1
+                acc[5] = count
+
+    def history(self, event_id: int, resolution: str = RESOLUTION_MINUTE, since: Optional[int] = None) -> List[Dict]:
+        """
+        Points oldest first. Minute history includes the minute in progress.
+        """
+        client = get_redis()
+        if client:
+            try:
+                return self._redis_history(client, event_id, resolution, since)
+            except Exception as exc:  # pragma: no cover
+                record_failure(exc)
+                logger.debug("Attendance history fallback to local series")
+        with self._lock:
+            series = self._local.get(event_id)
+            if series is None:
+                return []
+            if resolution == RESOLUTION_SECOND:
+                points = [{"t": ts, "count": count} for ts, count in series.seconds]
+            else:
+                points = list(series.minutes)
+                if series.acc:
+                    points.append(_minute_point(*series.acc))
+        if since is not None:
+            points = [point for point in points if point["t"] >= since]
+        return points
+
+    def _redis_history(self, client, event_id: int, resolution: str, since: Optional[int]) -> List[Dict]:
+        seconds_key, minutes_key, acc_key = _keys(event_id)
+        if resolution == RESOLUTION_SECOND:
+            points = []
+            for entry in client.lrange(seconds_key, 0, -1):
+                ts, count = entry.split(":")
+                points.append({"t": int(ts), "count": int(count)})
+        else:
+            pipe = client.pipeline(transaction=False)
+            pipe.lrange(minutes_key, 0, -1)
+            pipe.hgetall(acc_key)
+            entries, acc = pipe.execute()
+            points = []
+            for entry in entries:
+                minute, low, high, avg, last = entry.split(":")
+                points.append(
+                    {"t": int(minute), "min": int(low), "max": int(high), "avg": float(avg), "last": int(last)}
+                )
+            if acc:
+                points.append(
+                    _minute_point(
+                        int(acc["minute"]),
+                        int(acc["min"]),
+                        int(acc["max"]),
+                        float(acc["sum"]),
+                        int(acc["n"]),
+                        int(acc["last"]),
+                    )
+                )
+        if since is not None:
+            points = [point for point in points if point["t"] >= since]
+        return points
+
+    def clear(self, event_id: int):
+        with self._lock:
+            self._local.pop(event_id, None)
+        client = get_redis()
+        if client:
+            try:
+                client.delete(*_keys(event_id))
+            except Exception as exc:  # pragma: no cover
+                record_failure(exc)
+
+
+attendance = AttendanceSeries()
@@ -0,0 +1,97 @@
+"""
+Channel names of each voter's open sockets, keyed by event and identity.
+
+``notify_voter`` used to send through a single-member group per voter, which
+cost every connection a ``group_add``/``group_discard`` and every ``vote_ack``
+a group lookup in the channel layer. The consumers now register their channel
+name here and direct frames go straight to those channels with
+``channel_layer.send``. Entries live in a Redis set per voter with a TTL, or
+in a process-local dict without Redis (which is also when the in-memory
+channel layer is in use, so both sides share the process).
+"""
+import logging
+import threading
+from typing import Dict, List, Set, Tuple
+
+from django.conf import settings
+
+from .redis_registry import get_async_redis, get_redis, record_failure
+
+logger = logging.getLogger(__name__)
+
+# Matches the channels_redis group expiry, so a socket that dies without a
+# disconnect is forgotten on the same schedule as its groups.
+REGISTRY_TTL_SEC = int(getattr(settings, "MOTION_CHANNEL_REGISTRY_TTL_SEC", 86400))
+
+
+def _channels_key(event_id: int, voter_token: str) -> str:
+    return f"motions:channels:{event_id}:{voter_token}"
+
+
+class VoterChannelRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local: Dict[Tuple[int, str], Set[str]] = {}
+
+    async def register(self, event_id: int, voter_token: str, channel_name: str):
+        client = get_async_redis()
+        if client:
+            try:
+                key = _channels_key(event_id, voter_token)
+                async with client.pipeline(transaction=False) as pipe:
+                    pipe.sadd(key, channel_name)
+                    pipe.expire(key, REGISTRY_TTL_SEC)
+                    await pipe.execute()
+                return
+            except Exception as exc:  # pragma: no cover - fallback on runtime failure
+                record_failure(exc)
+                logger.debug("Channel registry: redis register fallback to local")
+        with self._lock:
+            self._local.setdefault((event_id, voter_token), set()).add(channel_name)
+
+    async def unregister(self, event_id: int, voter_token: str, channel_name: str):
+        client = get_async_redis()
+        if client:
+            try:
+                await client.srem(_channels_key(event_id, voter_token), channel_name)
+            except Exception as exc:  # pragma: no cover
+                record_failure(exc)
+        with self._lock:
+            channels = self._local.get((event_id, voter_token))
+            if channels is not None:
+                channels.discard(channel_name)
+                if not channels:
+                    del self._local[(event_id, voter_token)]
+
+    def channels(self, event_id: int, voter_token: str) -> List[str]:
+        client = get_redis()
+        if client:
+            try:
+                return sorted(client.smembers(_channels_key(event_id, voter_token)))
+            except Exception as exc:  # pragma: no cover
+                record_failure(exc)
+                logger.debug("Channel registry: redis lookup fallback to local")
+        return self._local_channels(event_id, voter_token)
+
+    async def channels_async(self, event_id: int, voter_token: str) -> List[str]:
+        client = get_async_redis()
+        if client:
+            try:
+                return sorted(await client.smembers(_channels_key(event_id, voter_token)))
+            except Exception as exc:  # pragma: no cover
+                record_failure(exc)
+        return self._local_channels(event_id, voter_token)
+
+    def _local_channels(self, event_id: int, voter_token: str) -> List[str]:
+        with self._lock:
+            return sorted(self._local.get((event_id, voter_token), ()))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "local_voters": len(self._local),
+                "local_channels": sum(len(channels) for channels in self._local.values()),
+            }
+
+
+voter_channels = VoterChannelRegistry()
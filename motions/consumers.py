@@ -1,33 +1,186 @@
+import asyncio
 import json
 import logging
 from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
 
+from asgiref.sync import sync_to_async
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from django.http import Http404
+from django.utils import timezone as tz
 
-from .presence import PresenceTracker
-from .realtime import admin_group, broadcast_to_admins, user_group, voter_group
+from voters.session_cache import session_resolver
+
+from .admission import CLOSE_TRY_AGAIN, admission
+from .channel_registry import voter_channels
+from .models import Motion
+from .presence import AsyncPresenceTracker, presence_ticker
+from .realtime import admin_group, broadcast_to_admins, notify_voter, queue_tally_update, voter_group
+from .replay import AUDIENCE_ADMINS, AUDIENCE_VOTERS, event_stream
+from .sendqueue import CLOSE_SLOW_CONSUMER, SEND_QUEUE_DEPTH, SendQueue
+from .services import record_vote
 from .utils import get_event_by_uuid, get_voter_identity_from_scope
+from .wire import (
+    SUBPROTOCOL_MSGPACK,
+    binary_available,
+    decode_client,
+    encode_binary,
+    encode_text,
+    state_key,
+)
 
 logger = logging.getLogger(__name__)
 
+# Stateless; the Redis connections live in the shared registry.
+_tracker = AsyncPresenceTracker()
+
+
+def _latest_state_only(entries: List[Dict]) -> List[Dict]:
+    """
+    Drop replayed state frames that a later frame in ``entries`` supersedes.
+    """
+    seen = set()
+    kept = []
+    for entry in reversed(entries):
+        key = state_key(entry["event"], entry["payload"])
+        if key is not None:
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append(entry)
+    kept.reverse()
+    return kept
+
 
-class MotionVoterConsumer(AsyncJsonWebsocketConsumer):
+class MotionSocketConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Frame handling shared by the motion consumers: negotiates the msgpack
+    subprotocol, forwards pre-encoded broadcast frames unchanged through a
+    bounded ``SendQueue`` and replays the frames a reconnecting socket missed
+    (``?last_seq=N``).
+    """
+
+    binary = False
+    audience: Optional[str] = None
+    # Sequence numbers already sent by _replay; their live copy is dropped.
+    _replayed = frozenset()
+
+    async def accept(self, subprotocol=None):
+        offered = self.scope.get("subprotocols") or ()
+        if subprotocol is None and binary_available() and SUBPROTOCOL_MSGPACK in offered:
+            subprotocol = SUBPROTOCOL_MSGPACK
+        self.binary = subprotocol == SUBPROTOCOL_MSGPACK
+        await super().accept(subprotocol)
+        self._outgoing = SendQueue(self._write)
+        self._writer = asyncio.ensure_future(self._outgoing.run())
+
+    async def websocket_disconnect(self, message):
+        outgoing = getattr(self, "_outgoing", None)
+        if outgoing is not None:
+            outgoing.close()
+        await super().websocket_disconnect(message)
+
+    async def receive(self, text_data=None, bytes_data=None, **kwargs):
+        if bytes_data and self.binary:
+            await self.receive_json(decode_client(bytes_data), **kwargs)
+            return
+        await super().receive(text_data=text_data, bytes_data=bytes_data, **kwargs)
+
+    async def _write(self, frame):
+        if isinstance(frame, bytes):
+            await self.send(bytes_data=frame)
+        else:
+            await self.send(text_data=frame)
+
+    async def _enqueue(self, frame, key: Optional[str] = None):
+        outgoing = getattr(self, "_outgoing", None)
+        if outgoing is None:
+            await self._write(frame)
+        elif not outgoing.put(frame, key):
+            await self.close(code=CLOSE_SLOW_CONSUMER)
+
+    async def send_event(self, event: str, payload, seq: Optional[int] = None):
+        encode = encode_binary if self.binary else encode_text
+        await self._enqueue(encode(event, payload, seq), state_key(event, payload))
+
+    async def push_event(self, message):
+        seq = message.get("seq")
+        if seq in self._replayed:
+            self._replayed.discard(seq)
+            return
+        encoded = message.get("packed" if self.binary else "text")
+        if encoded is None:
+            await self.send_event(message.get("event"), message.get("payload"))
+        else:
+            await self._enqueue(encoded, message.get("state_key"))
+
+    async def push_batch(self, message):
+        for frame in message.get("frames") or []:
+            await self.push_event(frame)
+
+    def _last_seq(self) -> Optional[int]:
+        query = parse_qs((self.scope.get("query_string") or b"").decode())
+        try:
+            return int(query["last_seq"][0])
+        except (KeyError, IndexError, ValueError):
+            return None
+
+    async def _missed_frames(self) -> Tuple[Dict, List[Dict]]:
+        """
+        Stream position for the connection frame and the frames to replay.
+        Call after joining the group so nothing falls between the two.
+        ``resync`` tells the client to reload the snapshot instead, also when
+        the gap would not fit in the send queue.
+        """
+        head, missed = await event_stream.since(self.event_id, self.audience, self._last_seq())
+        if missed is not None:
+            missed = _latest_state_only(missed)
+        if missed is None or len(missed) > SEND_QUEUE_DEPTH // 2:
+            return {"seq": head, "resync": True}, []
+        return {"seq": head, "resync": False, "replayed": len(missed)}, missed
+
+    async def _replay(self, missed: List[Dict]):
+        self._replayed = {entry["seq"] for entry in missed}
+        now = tz.now().isoformat()
+        for entry in missed:
+            payload = entry["payload"]
+            if isinstance(payload, dict) and "server_now" in payload:
+                # Timers are synced from server_now; do not replay a stale clock.
+                payload = {**payload, "server_now": now}
+            await self.send_event(entry["event"], payload, entry["seq"])
+
+
+class MotionVoterConsumer(MotionSocketConsumer):
     """
     Receives live motion state and connection health for voters.
     """
 
+    audience = AUDIENCE_VOTERS
+    # Set when connect closes the socket: frames that still arrive before the
+    # close, and the disconnect, find no event or identity to act on.
+    _rejected = False
+
     async def connect(self):
+        retry_after = admission.admit()
+        if retry_after is not None:
+            self._rejected = True
+            # Accept so the client sees the close code and the hint.
+            await self.accept()
+            await self.close(code=CLOSE_TRY_AGAIN, reason=f"retry_after_ms={int(retry_after * 1000)}")
+            return
         self.session_uuid = self.scope["url_route"]["kwargs"].get("session_uuid")
         try:
             event = await self._get_event()
         except Http404:
+            self._rejected = True
             await self.close(code=4404)
             return
 
         identity = get_voter_identity_from_scope(self.scope, self.session_uuid)
         if not identity:
+            self._rejected = True
             await self.close(code=4401)
             return
 
@@ -35,81 +188,103 @@ class MotionVoterConsumer(AsyncJsonWebsocketConsumer):
         self.event_id = event.pk
         self.identity = identity
         self.event_group = voter_group(self.event_id)
-        self.user_group = user_group(self.event_id, identity)
 
         await self.channel_layer.group_add(self.event_group, self.channel_name)
-        await self.channel_layer.group_add(self.user_group, self.channel_name)
+        await voter_channels.register(self.event_id, identity, self.channel_name)
         await self.accept()
 
-        count = await self._heartbeat()
-        await self._emit_presence(count)
-        await self.send_json({"event": "connection", "payload": {"status": "connected"}})
+        await self._heartbeat()
+        if not admission.storm():
+            # During a reconnect storm the next heartbeats publish presence.
+            presence_ticker.touch(self.event_id)
+        resume, missed = await self._missed_frames()
+        await self.send_event("connection", {"status": "connected", **resume})
+        await self._replay(missed)
 
     async def disconnect(self, code):
+        if self._rejected:
+            return
         try:
             await self.channel_layer.group_discard(self.event_group, self.channel_name)
-            await self.channel_layer.group_discard(self.user_group, self.channel_name)
         except Exception:
             pass
         if getattr(self, "event_id", None) and getattr(self, "identity", None):
+            await voter_channels.unregister(self.event_id, self.identity, self.channel_name)
             await self._mark_gone()
-            count = await self._count_presence()
-            await self._emit_presence(count)
+            presence_ticker.touch(self.event_id)
 
     async def receive_json(self, content, **kwargs):
+        if self._rejected:
+            return
         action = content.get("type")
         if action in ("heartbeat", "ping"):
             count = await self._heartbeat()
-            await self._emit_presence(count)
-            await self.send_json(
-                {"event": "heartbeat_ack", "payload": {"active_count": count}}
-            )
+            presence_ticker.touch(self.event_id)
+            await self.send_event("heartbeat_ack", {"active_count": count})
+            return
+        if action == "cast":
+            await self._cast(content)
             return
-        await self.send_json(
-            {"event": "error", "payload": {"message": "Unknown event type"}}
-        )
+        await self.send_event("error", {"message": "Unknown event type"})
 
-    async def push_event(self, event):
-        await self.send_json({"event": event.get("event"), "payload": event.get("payload")})
+    async def _cast(self, content):
+        """
+        Record a vote sent over the socket, using the identity resolved at
+        connect. Sends the same ``vote_ack`` payload as api_cast_vote to every
+        socket of the identity, so other tabs show the new selection too.
+        """
+        ref = content.get("ref")
+        try:
+            motion_id = int(content.get("motion_id"))
+        except (TypeError, ValueError):
+            await self._send_vote_error(None, "invalid_motion", ref)
+            return
+        choice = str(content.get("choice") or "").lower()
+        ok, data = await self._record_vote(motion_id, choice)
+        if not ok:
+            await self._send_vote_error(motion_id, data.pop("error"), ref, **data)
+            return
+        queue_tally_update(self.event_id, motion_id)
+        payload = {"motion_id": motion_id, **data}
+        if ref is not None:
+            payload["ref"] = ref
+        await sync_to_async(notify_voter)(self.event_id, self.identity, "vote_ack", payload)
 
-    @database_sync_to_async
-    def _get_event(self):
-        return get_event_by_uuid(self.session_uuid)
+    async def _send_vote_error(self, motion_id, error, ref=None, **extra):
+        payload = {"motion_id": motion_id, "error": error, **extra}
+        if ref is not None:
+            payload["ref"] = ref
+        await self.send_event("vote_error", payload)
 
     @database_sync_to_async
-    def _heartbeat(self) -> int:
-        tracker = PresenceTracker()
-        return tracker.heartbeat(self.event_id, self.identity)
+    def _record_vote(self, motion_id: int, choice: str):
+        # Looked up per cast: the session may have been deactivated since connect.
+        event = session_resolver.resolve(self.session_uuid)
+        if event is None or not event.is_active:
+            return False, {"error": "inactive_session"}
+        motion = Motion.objects.filter(pk=motion_id, event_id=self.event_id).first()
+        if motion is None:
+            return False, {"error": "invalid_motion"}
+        return record_vote(motion, self.identity, choice)
 
     @database_sync_to_async
-    def _mark_gone(self):
-        tracker = PresenceTracker()
-        tracker.mark_gone(self.event_id, self.identity)
+    def _get_event(self):
+        return get_event_by_uuid(self.session_uuid)
 
-    @database_sync_to_async
-    def _count_presence(self) -> int:
-        tracker = PresenceTracker()
-        return tracker.count(self.event_id)
+    async def _heartbeat(self) -> int:
+        return await _tracker.heartbeat(self.event_id, self.identity)
 
-    async def _emit_presence(self, count: int):
-        try:
-            await self.channel_layer.group_send(
-                admin_group(self.event_id),
-                {"type": "push.event", "event": "presence_update", "payload": {"count": count}},
-            )
-            await self.channel_layer.group_send(
-                voter_group(self.event_id),
-                {"type": "push.event", "event": "presence_update", "payload": {"count": count}},
-            )
-        except Exception:
-            logger.debug("Failed to broadcast presence update", exc_info=True)
+    async def _mark_gone(self):
+        await _tracker.mark_gone(self.event_id, self.identity)
 
 
-class MotionAdminConsumer(AsyncJsonWebsocketConsumer):
+class MotionAdminConsumer(MotionSocketConsumer):
     """
     Admin/moderator channel for live tallies and control state updates.
     """
 
+    audience = AUDIENCE_ADMINS
+
     async def connect(self):
         self.session_uuid = self.scope["url_route"]["kwargs"].get("session_uuid")
         user = self.scope.get("user")
@@ -130,9 +305,10 @@ class MotionAdminConsumer(AsyncJsonWebsocketConsumer):
         await self.accept()
 
         count = await self._count_presence()
-        await self.send_json(
-            {"event": "presence_update", "payload": {"count": count, "role": "moderator"}}
-        )
+        await self.send_event("presence_update", {"count": count, "role": "moderator"})
+        resume, missed = await self._missed_frames()
+        await self.send_event("connection", {"status": "connected", "role": "moderator", **resume})
+        await self._replay(missed)
 
     async def disconnect(self, code):
         try:
@@ -144,22 +320,13 @@ class MotionAdminConsumer(AsyncJsonWebsocketConsumer):
         action = content.get("type")
         if action in ("heartbeat", "ping"):
             count = await self._count_presence()
-            await self.send_json(
-                {"event": "heartbeat_ack", "payload": {"active_count": count, "role": "moderator"}}
-            )
+            await self.send_event("heartbeat_ack", {"active_count": count, "role": "moderator"})
             return
-        await self.send_json(
-            {"event": "error", "payload": {"message": "Unknown event type"}}
-        )
-
-    async def push_event(self, event):
-        await self.send_json({"event": event.get("event"), "payload": event.get("payload")})
+        await self.send_event("error", {"message": "Unknown event type"})
 
     @database_sync_to_async
     def _get_event(self):
         return get_event_by_uuid(self.session_uuid)
 
-    @database_sync_to_async
-    def _count_presence(self) -> int:
-        tracker = PresenceTracker()
-        return tracker.count(self.event_id)
+    async def _count_presence(self) -> int:
+        return await _tracker.count(self.event_id)
@@ -0,0 +1,479 @@
+"""
+Write-behind vote ingestion for motions.
+
+When ``MOTION_VOTE_INGEST_MODE = "write_behind"`` and Redis is reachable, a
+vote is a single Lua call that updates the voter's current choice, the live
+tally and a pending-writes hash atomically. A background flusher bulk-upserts
+pending choices into ``MotionVote``; ``close_motion`` drains the motion fully
+before final counts are taken from the database, and refuses to close while
+votes are still pending. Flushes of one motion are serialised by a lease in
+Redis (``motion:{id}:flushing``): every process runs a flusher, and two
+flushes holding different versions of a voter's choice could otherwise
+leave the older one in the database.
+
+While Redis is configured it is the source of truth for an open motion's
+choices: a cast that cannot reach Redis is refused rather than written to
+the database behind the buffer's back, which would let the two disagree.
+"""
+import logging
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+
+from .models import MotionVote
+from .redis_registry import get_redis, record_failure, redis_url
+
+logger = logging.getLogger(__name__)
+
+INGEST_MODE_DB = "db"
+INGEST_MODE_WRITE_BEHIND = "write_behind"
+
+FLUSH_INTERVAL_SEC = float(getattr(settings, "MOTION_WRITE_BEHIND_FLUSH_SEC", 0.5))
+FLUSH_BATCH_SIZE = int(getattr(settings, "MOTION_WRITE_BEHIND_BATCH_SIZE", 500))
+KEY_TTL_SEC = 86400
+DRAIN_ATTEMPTS = 5
+DRAIN_BACKOFF_SEC = 0.05
+# Lease on a motion's pending votes; renewed before each flushed batch.
+FLUSH_LEASE_MS = int(getattr(settings, "MOTION_WRITE_BEHIND_LEASE_MS", 30000))
+
+PENDING_MOTIONS_KEY = "motions:pending"
+
+# Cast statuses the write-behind path adds to ``services.VOTE_*``.
+CAST_CLOSED = -1
+# The motion's choices have not been loaded into Redis.
+CAST_NOT_SEEDED = -2
+
+# KEYS: choices, tally, pending, closed flag, pending-motions set, seeded flag
+# ARGV: voter_id, choice, allow_change ("1"/"0"), ttl, motion_id
+# Returns {status, previous_choice}: -2 not seeded, -1 closed, 0 locked,
+# 1 unchanged, 2 created, 3 changed
+CAST_SCRIPT = """
+if redis.call('EXISTS', KEYS[4]) == 1 then
+  return {%(closed)d, ''}
+end
+if redis.call('EXISTS', KEYS[6]) == 0 then
+  return {%(not_seeded)d, ''}
+end
+local prev = redis.call('HGET', KEYS[1], ARGV[1])
+if prev then
+  if prev == ARGV[2] then
+    return {1, prev}
+  end
+  if ARGV[3] ~= '1' then
+    return {0, prev}
+  end
+  redis.call('HINCRBY', KEYS[2], prev, -1)
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('HINCRBY', KEYS[2], ARGV[2], 1)
+redis.call('HSET', KEYS[3], ARGV[1], ARGV[2])
+redis.call('SADD', KEYS[5], ARGV[5])
+local ttl = tonumber(ARGV[4])
+redis.call('EXPIRE', KEYS[1], ttl)
+redis.call('EXPIRE', KEYS[2], ttl)
+redis.call('EXPIRE', KEYS[3], ttl)
+if prev then
+  return {3, prev}
+end
+return {2, ''}
+""" % {"closed": CAST_CLOSED, "not_seeded": CAST_NOT_SEEDED}
+
+# Remove flushed entries only if the voter has not changed their choice since.
+# KEYS: pending, pending-motions set; ARGV: motion_id, voter1, choice1, voter2, choice2, ...
+ACK_SCRIPT = """
+for i = 2, #ARGV, 2 do
+  if redis.call('HGET', KEYS[1], ARGV[i]) == ARGV[i + 1] then
+    redis.call('HDEL', KEYS[1], ARGV[i])
+  end
+end
+local left = redis.call('HLEN', KEYS[1])
+if left == 0 then
+  redis.call('SREM', KEYS[2], ARGV[1])
+end
+return left
+"""
+
+# Load stored votes into the choices hash and mark the motion seeded. With
+# ARGV[1] = "0" an already seeded motion is left alone (lazy seeding races
+# with casts); "1" reseeds and reopens it.
+# KEYS: choices, closed flag, seeded flag; ARGV: force, ttl, voter1, choice1, ...
+SEED_SCRIPT = """
+if ARGV[1] ~= '1' and redis.call('EXISTS', KEYS[3]) == 1 then
+  return 0
+end
+if ARGV[1] == '1' then
+  redis.call('DEL', KEYS[2])
+end
+redis.call('DEL', KEYS[1])
+for i = 3, #ARGV, 2 do
+  redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+local ttl = tonumber(ARGV[2])
+redis.call('EXPIRE', KEYS[1], ttl)
+redis.call('SET', KEYS[3], '1', 'EX', ttl)
+return 1
+"""
+
+# Renew (ARGV[2] = ttl in ms) or release (no ARGV[2]) a lease we still hold.
+# KEYS: lease; ARGV: token[, ttl]
+LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+  return 0
+end
+if ARGV[2] then
+  return redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[2]))
+end
+return redis.call('DEL', KEYS[1])
+"""
+
+_scripts: Dict[str, object] = {}
+
+
+class DrainError(RuntimeError):
+    """
+    Pending votes for a motion could not all be written to the database;
+    ``pending`` is how many are left, or None when Redis is unreachable.
+    """
+
+    def __init__(self, motion_id: int, pending: Optional[int]):
+        self.motion_id = motion_id
+        self.pending = pending
+        left = "unknown" if pending is None else pending
+        super().__init__(f"motion {motion_id}: {left} vote(s) still pending")
+
+
+def ingest_mode() -> str:
+    return getattr(settings, "MOTION_VOTE_INGEST_MODE", INGEST_MODE_DB)
+
+
+def write_behind_enabled() -> bool:
+    return ingest_mode() == INGEST_MODE_WRITE_BEHIND
+
+
+def choices_key(motion_id: int) -> str:
+    return f"motion:{motion_id}:choices"
+
+
+def pending_key(motion_id: int) -> str:
+    return f"motion:{motion_id}:pending"
+
+
+def closed_key(motion_id: int) -> str:
+    return f"motion:{motion_id}:closed"
+
+
+def seeded_key(motion_id: int) -> str:
+    return f"motion:{motion_id}:seeded"
+
+
+def flushing_key(motion_id: int) -> str:
+    return f"motion:{motion_id}:flushing"
+
+
+class FlushLease:
+    """
+    Exclusive right to move or discard one motion's pending votes. Held
+    around HSCAN, upsert and ack so flushes from different processes (and a
+    reset) never interleave.
+    """
+
+    def __init__(self, client, motion_id: int):
+        self.client = client
+        self.key = flushing_key(motion_id)
+        self.token = secrets.token_hex(8)
+        self.held = False
+
+    def acquire(self, wait: float = 0.0) -> bool:
+        deadline = time.monotonic() + wait
+        while not self.client.set(self.key, self.token, nx=True, px=FLUSH_LEASE_MS):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        self.held = True
+        return True
+
+    def renew(self) -> bool:
+        script = _script(self.client, "lease", LEASE_SCRIPT)
+        return bool(script(keys=[self.key], args=[self.token, FLUSH_LEASE_MS]))
+
+    def release(self):
+        if not self.held:
+            return
+        self.held = False
+        try:
+            _script(self.client, "lease", LEASE_SCRIPT)(keys=[self.key], args=[self.token])
+        except Exception as exc:  # pragma: no cover
+            record_failure(exc)
+
+
+def _script(client, name: str, source: str):
+    # Registered scripts are bound to the client; the registry hands out one
+    # shared client per process so this is cached once.
+    cached = _scripts.get(name)
+    if cached is None or getattr(cached, "registered_client", None) is not client:
+        cached = client.register_script(source)
+        _scripts[name] = cached
+    return cached
+
+
+def cast(client, motion, voter_id: str, choice: str, tally_key: str) -> Tuple[int, Optional[str]]:
+    """
+    Run the atomic cast script. Raises on Redis errors so the caller can fall
+    back to the synchronous database path.
+    """
+    status, previous = _script(client, "cast", CAST_SCRIPT)(
+        keys=[
+            choices_key(motion.id),
+            tally_key,
+            pending_key(motion.id),
+            closed_key(motion.id),
+            PENDING_MOTIONS_KEY,
+            seeded_key(motion.id),
+        ],
+        args=[voter_id, choice, "1" if motion.allow_vote_change else "0", KEY_TTL_SEC, motion.id],
+    )
+    _flusher.ensure_started()
+    return int(status), (previous or None)
+
+
+def seed_choices(motion_id: int, choices: Dict[str, str], force: bool = True) -> bool:
+    """
+    Load the voter -> choice map from the database into Redis, so locked
+    votes and vote changes are judged against stored votes. Done when a
+    motion opens, and lazily by the first cast if Redis was down then.
+    """
+    client = get_redis()
+    if not client:
+        return False
+    args: List = ["1" if force else "0", KEY_TTL_SEC]
+    for voter_id, choice in choices.items():
+        args.extend([voter_id, choice])
+    try:
+        _script(client, "seed", SEED_SCRIPT)(
+            keys=[choices_key(motion_id), closed_key(motion_id), seeded_key(motion_id)], args=args
+        )
+        return True
+    except Exception as exc:  # pragma: no cover
+        record_failure(exc)
+        logger.warning("Write-behind: could not seed choices for motion %s (%s)", motion_id, exc)
+        return False
+
+
+def mark_closed(motion_id: int):
+    client = get_redis()
+    if not client:
+        return
+    try:
+        client.set(closed_key(motion_id), "1", ex=KEY_TTL_SEC)
+    except Exception as exc:  # pragma: no cover
+        record_failure(exc)
+
+
+@contextmanager
+def flush_paused(motion_id: int) -> Iterator[None]:
+    """
+    Hold the motion's flush lease for the block, waiting for a flush in
+    progress to finish. Used to discard votes without a flush that already
+    read them writing them back afterwards.
+    """
+    client = get_redis()
+    lease = FlushLease(client, motion_id) if client else None
+    if lease is not None:
+        try:
+            if not lease.acquire(wait=FLUSH_LEASE_MS / 1000):
+                logger.warning("Write-behind: flush lease for motion %s not released; proceeding", motion_id)
+        except Exception as exc:  # pragma: no cover
+            record_failure(exc)
+    try:
+        yield
+    finally:
+        if lease is not None:
+            lease.release()
+
+
+def clear(motion_id: int):
+    client = get_redis()
+    if not client:
+        return
+    try:
+        pipe = client.pipeline()
+        pipe.delete(choices_key(motion_id), pending_key(motion_id))
+        pipe.srem(PENDING_MOTIONS_KEY, motion_id)
+        pipe.execute()
+    except Exception as exc:  # pragma: no cover
+        record_failure(exc)
+
+
+def get_choice(motion_id: int, voter_id: str) -> Optional[str]:
+    """
+    The voter's current choice as seen by the ingest path, which may be ahead
+    of ``MotionVote`` until the next flush. None means "ask the database".
+    """
+    client = get_redis()
+    if not client:
+        return None
+    try:
+        return client.hget(choices_key(motion_id), voter_id)
+    except Exception as exc:  # pragma: no cover
+        record_failure(exc)
+        return None
+
+
+def _upsert(motion_id: int, batch: Iterable[Tuple[str, str]]):
+    objs = [
+        MotionVote(motion_id=motion_id, voter_id=voter_id, choice=choice)
+        for voter_id, choice in batch
+    ]
+    if not objs:
+        return
+    MotionVote.objects.bulk_create(
+        objs,
+        update_conflicts=True,
+        unique_fields=["motion", "voter_id"],
+        update_fields=["choice", "updated_at"],
+        batch_size=FLUSH_BATCH_SIZE,
+    )
+
+
+def flush_motion(motion_id: int, batch_size: int = FLUSH_BATCH_SIZE) -> int:
+    """
+    Write pending choices for one motion to the database in batches. Returns
+    the number of rows upserted, 0 when another flusher holds the motion's
+    lease; raises if Redis or the database fails.
+    """
+    client = get_redis()
+    if not client:
+        return 0
+    key = pending_key(motion_id)
+    ack = _script(client, "ack", ACK_SCRIPT)
+    lease = FlushLease(client, motion_id)
+    written = 0
+    cursor = 0
+    try:
+        if not lease.acquire():
+            return 0
+        while True:
+            cursor, chunk = client.hscan(key, cursor=cursor, count=batch_size)
+            if chunk:
+                items: List[Tuple[str, str]] = list(chunk.items())
+                if not lease.renew():
+                    raise RuntimeError(f"flush lease for motion {motion_id} expired")
+                _upsert(motion_id, items)
+                args: List = [motion_id]
+                for voter_id, choice in items:
+                    args.extend([voter_id, choice])
+                ack(keys=[key, PENDING_MOTIONS_KEY], args=args)
+                written += len(items)
+            if cursor == 0:
+                break
+        if not chunk:
+            ack(keys=[key, PENDING_MOTIONS_KEY], args=[motion_id])
+    except Exception as exc:
+        if not isinstance(exc, DatabaseError):
+            record_failure(exc)
+        logger.warning("Write-behind: flush failed for motion %s (%s)", motion_id, exc)
+        raise
+    finally:
+        lease.release()
+    return written
+
+
+def drain(motion_id: int, attempts: int = DRAIN_ATTEMPTS) -> int:
+    """
+    Flush until nothing is pending, retrying with backoff. Called after the
+    closed flag is set, so no new votes can land while draining. Raises
+    ``DrainError`` when votes are left over or Redis cannot be read.
+    """
+    if not redis_url():
+        return 0
+    total = 0
+    left: Optional[int] = None
+    for attempt in range(attempts):
+        if attempt:
+            time.sleep(DRAIN_BACKOFF_SEC * 2 ** (attempt - 1))
+        client = get_redis()
+        if not client:
+            left = None
+            continue
+        try:
+            total += flush_motion(motion_id)
+        except Exception:
+            pass  # logged by flush_motion; count what is left and retry
+        try:
+            left = int(client.hlen(pending_key(motion_id)))
+        except Exception as exc:
+            record_failure(exc)
+            left = None
+            continue
+        if not left:
+            return total
+    raise DrainError(motion_id, left)
+
+
+def flush_all() -> int:
+    client = get_redis()
+    if not client:
+        return 0
+    try:
+        motion_ids = client.smembers(PENDING_MOTIONS_KEY) or set()
+    except Exception as exc:  # pragma: no cover
+        record_failure(exc)
+        return 0
+    written = 0
+    for mid in motion_ids:
+        try:
+            written += flush_motion(int(mid))
+        except Exception:
+            continue  # logged by flush_motion; retried next interval
+    return written
+
+
+class VoteFlusher:
+    """
+    Daemon thread that periodically moves pending votes into the database.
+    Started lazily by the first write-behind vote in a process; the
+    ``motion_vote_flusher`` management command runs the same loop standalone.
+    """
+
+    def __init__(self, interval: float = FLUSH_INTERVAL_SEC):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self.run_forever, name="motion-vote-flusher", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self) -> int:
+        close_old_connections()
+        try:
+            return flush_all()
+        finally:
+            close_old_connections()
+
+    def run_forever(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:  # pragma: no cover - keep the loop alive
+                logger.exception("Write-behind flusher iteration failed")
+
+
+_flusher = VoteFlusher()
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from motions.scheduler import scheduler
+
+
+class Command(BaseCommand):
+    help = "Close motions when their auto_close_seconds deadline passes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Close anything already past its deadline and exit.",
+        )
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            scheduler.bootstrap()
+            closed = scheduler.run_pending()
+            self.stdout.write(f"[motion_autoclose] Closed {closed} motion(s).")
+            return
+        self.stdout.write("[motion_autoclose] Watching motion deadlines.")
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            scheduler.stop()
+            self.stdout.write("[motion_autoclose] Stopped.")
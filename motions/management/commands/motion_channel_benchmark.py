@@ -0,0 +1,87 @@
+import time
+from typing import Dict, List
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand
+
+from motions.channel_registry import voter_channels
+from motions.realtime import user_group
+from motions.redis_registry import get_redis
+from motions.utils import percentile
+
+# Far outside real primary keys so the benchmark never touches a live event.
+BENCH_EVENT_ID = 2_000_000_001
+
+
+class Command(BaseCommand):
+    help = (
+        "Cost of per-voter direct frames on the configured channel layer: "
+        "single-member groups (group_add, group_send, group_discard) against "
+        "the voter channel registry (register, lookup + send, unregister)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--voters", type=int, default=2000, help="Simulated voter sockets.")
+
+    def _log(self, message: str):
+        self.stdout.write(f"[motion_channel_benchmark] {message}")
+
+    async def _groups(self, layer, channels: List[str]) -> Dict[str, List[float]]:
+        timings: Dict[str, List[float]] = {"connect": [], "notify": [], "disconnect": []}
+        for i, channel in enumerate(channels):
+            start = time.perf_counter()
+            await layer.group_add(user_group(BENCH_EVENT_ID, f"bench-{i}"), channel)
+            timings["connect"].append((time.perf_counter() - start) * 1000)
+        for i, channel in enumerate(channels):
+            start = time.perf_counter()
+            await layer.group_send(user_group(BENCH_EVENT_ID, f"bench-{i}"), {"type": "push.event"})
+            timings["notify"].append((time.perf_counter() - start) * 1000)
+            await layer.receive(channel)
+        for i, channel in enumerate(channels):
+            start = time.perf_counter()
+            await layer.group_discard(user_group(BENCH_EVENT_ID, f"bench-{i}"), channel)
+            timings["disconnect"].append((time.perf_counter() - start) * 1000)
+        return timings
+
+    async def _registry(self, layer, channels: List[str]) -> Dict[str, List[float]]:
+        timings: Dict[str, List[float]] = {"connect": [], "notify": [], "disconnect": []}
+        for i, channel in enumerate(channels):
+            start = time.perf_counter()
+            await voter_channels.register(BENCH_EVENT_ID, f"bench-{i}", channel)
+            timings["connect"].append((time.perf_counter() - start) * 1000)
+        for i, channel in enumerate(channels):
+            start = time.perf_counter()
+            for name in await voter_channels.channels_async(BENCH_EVENT_ID, f"bench-{i}"):
+                await layer.send(name, {"type": "push.event"})
+            timings["notify"].append((time.perf_counter() - start) * 1000)
+            await layer.receive(channel)
+        for i, channel in enumerate(channels):
+            start = time.perf_counter()
+            await voter_channels.unregister(BENCH_EVENT_ID, f"bench-{i}", channel)
+            timings["disconnect"].append((time.perf_counter() - start) * 1000)
+        return timings
+
+    async def _run(self, voters: int):
+        layer = get_channel_layer()
+        channels = [await layer.new_channel() for _ in range(voters)]
+        return {
+            "groups": await self._groups(layer, channels),
+            "registry": await self._registry(layer, channels),
+        }
+
+    def handle(self, *args, **options):
+        layer = get_channel_layer()
+        if layer is None:
+            self._log("No channel layer configured.")
+            return
+        voters = max(1, options["voters"])
+        registry_backend = "redis" if get_redis() else "local"
+        self._log(f"{voters} voter(s), layer={type(layer).__name__}, registry={registry_backend}")
+        results = async_to_sync(self._run)(voters)
+        for label, timings in results.items():
+            for step, values in timings.items():
+                self._log(
+                    f"{label:<9} {step:<10} p50={percentile(values, 50):.3f}ms "
+                    f"p95={percentile(values, 95):.3f}ms total={sum(values):.1f}ms"
+                )
@@ -0,0 +1,107 @@
+import asyncio
+import time
+from typing import Dict, List
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from motions.redis_registry import get_redis, redis_url
+from motions.utils import percentile
+
+BENCH_PREFIX = "motions-bench"
+BENCH_GROUP = "motions_event_bench"
+IN_MEMORY = "channels.layers.InMemoryChannelLayer"
+
+
+def _command_calls(client) -> int:
+    stats = client.info("commandstats")
+    return sum(int(entry.get("calls", 0)) for entry in stats.values())
+
+
+class Command(BaseCommand):
+    help = (
+        "Broadcast cost of one voter group on each channel layer backend: "
+        "time for a group_send to reach every member socket and the Redis "
+        "commands it takes. Runs all members in this process, i.e. the "
+        "one-ASGI-process case; backends come from CHANNEL_LAYER_BACKENDS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--members", type=int, default=5000, help="Sockets in the voter group.")
+        parser.add_argument("--rounds", type=int, default=5, help="Broadcasts per backend.")
+        parser.add_argument(
+            "--backends",
+            default="memory,redis,pubsub",
+            help="Comma-separated keys of CHANNEL_LAYER_BACKENDS, plus 'memory'.",
+        )
+
+    def _log(self, message: str):
+        self.stdout.write(f"[motion_fanout_benchmark] {message}")
+
+    def _build(self, name: str):
+        if name == "memory":
+            return import_string(IN_MEMORY)()
+        path = getattr(settings, "CHANNEL_LAYER_BACKENDS", {}).get(name)
+        if not path:
+            raise ValueError(f"unknown backend {name!r}")
+        # A private prefix keeps the benchmark away from the live layer's keys.
+        return import_string(path)(hosts=[redis_url()], prefix=BENCH_PREFIX)
+
+    async def _run(self, layer, members: int, rounds: int, on_redis: bool) -> Dict[str, List[float]]:
+        client = get_redis() if on_redis else None
+        channels = [await layer.new_channel() for _ in range(members)]
+        start = time.perf_counter()
+        for channel in channels:
+            await layer.group_add(BENCH_GROUP, channel)
+        results: Dict[str, List[float]] = {
+            "join_ms": [(time.perf_counter() - start) * 1000],
+            "send_ms": [],
+            "deliver_ms": [],
+            "redis_cmds": [],
+        }
+        try:
+            for i in range(rounds):
+                calls = _command_calls(client) if client else 0
+                start = time.perf_counter()
+                message = {"type": "push.event", "event": "motion_opened", "round": i}
+                await layer.group_send(BENCH_GROUP, message)
+                results["send_ms"].append((time.perf_counter() - start) * 1000)
+                await asyncio.gather(*(layer.receive(channel) for channel in channels))
+                results["deliver_ms"].append((time.perf_counter() - start) * 1000)
+                if client:
+                    # Minus the INFO call itself.
+                    results["redis_cmds"].append(_command_calls(client) - calls - 1)
+        finally:
+            for channel in channels:
+                await layer.group_discard(BENCH_GROUP, channel)
+            if hasattr(layer, "flush"):
+                await layer.flush()
+            if hasattr(layer, "close_pools"):
+                await layer.close_pools()
+        return results
+
+    def handle(self, *args, **options):
+        members = max(1, options["members"])
+        rounds = max(1, options["rounds"])
+        self._log(f"{members} member(s), {rounds} broadcast(s) per backend")
+        for name in [item.strip() for item in options["backends"].split(",") if item.strip()]:
+            if name != "memory" and not redis_url():
+                self._log(f"{name:<7} skipped: REDIS_URL is not set")
+                continue
+            try:
+                layer = self._build(name)
+            except Exception as exc:
+                self._log(f"{name:<7} skipped: {exc}")
+                continue
+            results = async_to_sync(self._run)(layer, members, rounds, name != "memory")
+            line = (
+                f"{name:<7} join={results['join_ms'][0]:.0f}ms "
+                f"group_send p50={percentile(results['send_ms'], 50):.2f}ms "
+                f"all delivered p50={percentile(results['deliver_ms'], 50):.1f}ms "
+                f"p95={percentile(results['deliver_ms'], 95):.1f}ms"
+            )
+            if results["redis_cmds"]:
+                line += f" redis commands/broadcast={percentile(results['redis_cmds'], 50):.0f}"
+            self._log(line)
@@ -0,0 +1,384 @@
+import asyncio
+import json
+import random
+import secrets
+import time
+from collections import Counter
+from importlib import import_module
+from typing import Dict, List, Optional
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.auth import AuthMiddlewareStack
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from motions.admission import CLOSE_TRY_AGAIN
+from motions.models import Motion, MotionVote
+from motions.routing import websocket_urlpatterns
+from motions.utils import percentile
+from voters.models import VotingSession
+
+LOADTEST_USERNAME = "motion-loadtest"
+HOST = "localhost"
+BROADCAST_EVENTS = ("motion_opened", "motion_closed")
+
+
+class _Voter:
+    """
+    One simulated member: a stored Django session carrying ``ANON_ID``, a
+    voter WebSocket opened with that session cookie, and an HTTP client that
+    sends the same cookie.
+    """
+
+    def __init__(self, harness, index: int, session_key: str):
+        self.harness = harness
+        self.index = index
+        self.session_key = session_key
+        self.communicator: Optional[WebsocketCommunicator] = None
+        self.client = Client(HTTP_HOST=HOST)
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session_key
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.next_ref = 0
+        self.reader: Optional[asyncio.Task] = None
+        # Seconds the server asked us to wait after a deferred handshake.
+        self.retry_after: Optional[float] = None
+
+    async def connect(self, application, path: str, timeout: float) -> Optional[str]:
+        """
+        Open the voter socket and wait for its ``connection`` frame. Returns
+        None once connected, otherwise why the socket is not; a deferred
+        handshake also sets ``retry_after``.
+        """
+        self.retry_after = None
+        cookie = f"{settings.SESSION_COOKIE_NAME}={self.session_key}".encode()
+        self.communicator = WebsocketCommunicator(
+            application, path, headers=[(b"host", HOST.encode()), (b"cookie", cookie)]
+        )
+        try:
+            connected, code = await self.communicator.connect(timeout=timeout)
+            if not connected:
+                return f"rejected ({code})"
+            # A deferred handshake is accepted and then closed with 4429.
+            message = await self.communicator.receive_output(timeout)
+        except asyncio.TimeoutError:
+            return "timeout"
+        if message["type"] == "websocket.close":
+            code = message.get("code")
+            reason = message.get("reason") or ""
+            if code == CLOSE_TRY_AGAIN and reason.startswith("retry_after_ms="):
+                self.retry_after = int(reason.split("=", 1)[1]) / 1000
+            await self.close()
+            return f"closed ({code})"
+        self._handle(json.loads(message["text"]))
+        self.reader = asyncio.ensure_future(self._read())
+        return None
+
+    async def _read(self):
+        while True:
+            # A receive timeout would cancel the consumer, so wait "forever";
+            # the task is cancelled when the run ends.
+            self._handle(await self.communicator.receive_json_from(timeout=3600))
+
+    def _handle(self, message: Dict):
+        event = message.get("event")
+        payload = message.get("payload") or {}
+        ref = payload.get("ref")
+        self.harness.frames[event] += 1
+        if event in ("vote_ack", "vote_error") and ref in self.pending:
+            self.pending.pop(ref).set_result(message)
+        elif event in BROADCAST_EVENTS:
+            self.harness.delivered(event, payload.get("id") or payload.get("motion_id"))
+
+    async def cast_socket(self, motion_id: int, choice: str, timeout: float) -> bool:
+        self.next_ref += 1
+        ref = self.next_ref
+        future = asyncio.get_running_loop().create_future()
+        self.pending[ref] = future
+        await self.communicator.send_json_to(
+            {"type": "cast", "motion_id": motion_id, "choice": choice, "ref": ref}
+        )
+        try:
+            message = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.pending.pop(ref, None)
+            return False
+        return message["event"] == "vote_ack"
+
+    def cast_http(self, url: str, choice: str) -> bool:
+        response = self.client.post(url, {"choice": choice}, secure=True)
+        return response.status_code == 200
+
+    async def close(self):
+        if self.reader:
+            self.reader.cancel()
+        if self.communicator:
+            try:
+                await self.communicator.disconnect()
+            except Exception:
+                pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate N voters against live motions: seeds an event, connects one "
+        "voter WebSocket per member, casts votes over the socket and/or HTTP, "
+        "opens and closes motions on a schedule and reports latency "
+        "percentiles. Runs in-process against the configured channel layer "
+        "(in-memory or a local Redis) and database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--voters", type=int, default=500, help="Simulated members.")
+        parser.add_argument("--motions", type=int, default=3, help="Motions to open and close.")
+        parser.add_argument(
+            "--transport",
+            choices=["socket", "http", "mixed"],
+            default="socket",
+            help="How votes are cast; mixed alternates per voter.",
+        )
+        parser.add_argument(
+            "--vote-window",
+            type=float,
+            default=5.0,
+            help="Seconds each motion stays open; votes are spread across it.",
+        )
+        parser.add_argument(
+            "--change-rate",
+            type=float,
+            default=0.1,
+            help="Share of voters who change their vote once.",
+        )
+        parser.add_argument(
+            "--connect-concurrency", type=int, default=100, help="Parallel WebSocket handshakes."
+        )
+        parser.add_argument(
+            "--connect-timeout",
+            type=float,
+            default=10.0,
+            help="Seconds to wait for each WebSocket handshake and its first frame.",
+        )
+        parser.add_argument(
+            "--connect-retries",
+            type=int,
+            default=5,
+            help="Times a handshake deferred with close code 4429 is retried after retry_after_ms.",
+        )
+        parser.add_argument(
+            "--http-concurrency", type=int, default=8, help="Parallel HTTP vote requests."
+        )
+        parser.add_argument("--ack-timeout", type=float, default=10.0)
+        parser.add_argument("--seed", type=int, default=None, help="Random seed.")
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the seeded event, motions and sessions."
+        )
+
+    # -- reporting ---------------------------------------------------------
+    def _log(self, message: str):
+        self.stdout.write(f"[motion_loadtest] {message}")
+
+    def delivered(self, event: str, motion_id):
+        started = self.broadcast_started.get((event, motion_id))
+        if started is not None:
+            self.broadcast_ms[event].append((time.perf_counter() - started) * 1000)
+
+    def _failures(self, label: str, results: List):
+        """Log per-voter failures: exceptions or reason strings in ``results``."""
+        reasons = Counter(
+            f"error ({type(result).__name__})" if isinstance(result, BaseException) else result
+            for result in results
+            if result is not None
+        )
+        if reasons:
+            self._log(f"{label}: " + ", ".join(f"{reason}={n}" for reason, n in reasons.most_common()))
+
+    def _report(self, label: str, values: List[float], errors: int = 0):
+        if not values:
+            self._log(f"{label:<24} n=0 errors={errors}")
+            return
+        self._log(
+            f"{label:<24} n={len(values)} "
+            f"p50={percentile(values, 50):.1f}ms p95={percentile(values, 95):.1f}ms "
+            f"p99={percentile(values, 99):.1f}ms max={max(values):.1f}ms errors={errors}"
+        )
+
+    # -- seeding -----------------------------------------------------------
+    def _seed(self, voters: int, motions: int):
+        admin, created = User.objects.get_or_create(
+            username=LOADTEST_USERNAME, defaults={"is_staff": True}
+        )
+        if created:
+            admin.set_unusable_password()
+            admin.save()
+        run_id = secrets.token_hex(4)
+        event = VotingSession.objects.create(
+            title=f"Motion load test {time.strftime('%Y-%m-%d %H:%M:%S')}",
+            admin=admin,
+            is_active=True,
+            unique_url=f"{settings.SITE_URL}/loadtest/{run_id}",
+        )
+        motion_list = [
+            Motion.objects.create(
+                event=event,
+                title=f"Load test motion {i + 1}",
+                display_order=i + 1,
+                allow_vote_change=True,
+            )
+            for i in range(motions)
+        ]
+        store_cls = import_module(settings.SESSION_ENGINE).SessionStore
+        session_keys = []
+        for i in range(voters):
+            store = store_cls()
+            store["ANON_ID"] = f"loadtest-{run_id}-{i}"
+            store.create()
+            session_keys.append(store.session_key)
+        return admin, event, motion_list, session_keys
+
+    def _cleanup(self, event, session_keys):
+        store_cls = import_module(settings.SESSION_ENGINE).SessionStore
+        for key in session_keys:
+            store_cls(session_key=key).delete()
+        event.delete()
+
+    # -- run ---------------------------------------------------------------
+    def handle(self, *args, **options):
+        if options["seed"] is not None:
+            random.seed(options["seed"])
+        voters = max(1, options["voters"])
+        admin, event, motions, session_keys = self._seed(voters, max(1, options["motions"]))
+        self._log(
+            f"Seeded event {event.session_uuid} with {len(motions)} motion(s) and {voters} voter session(s)."
+        )
+        self.broadcast_started: Dict = {}
+        self.frames: Counter = Counter()
+        self.broadcast_ms: Dict[str, List[float]] = {event_name: [] for event_name in BROADCAST_EVENTS}
+        self.ack_ms: Dict[str, List[float]] = {"socket": [], "http": []}
+        self.ack_errors: Dict[str, int] = {"socket": 0, "http": 0}
+        self.connected = 0
+        try:
+            async_to_sync(self._run)(admin, event, motions, session_keys, options)
+        finally:
+            if options["keep"]:
+                self._log("Keeping seeded data (--keep).")
+            else:
+                self._cleanup(event, session_keys)
+
+        self._report("vote ack (socket)", self.ack_ms["socket"], self.ack_errors["socket"])
+        self._report("vote ack (http)", self.ack_ms["http"], self.ack_errors["http"])
+        for event_name in BROADCAST_EVENTS:
+            self._report(f"{event_name} delivery", self.broadcast_ms[event_name])
+        expected = self.connected * len(motions)
+        self._log(f"Expected {expected} deliveries per broadcast event ({self.connected} connected voter(s)).")
+        self._log(
+            "Frames received by voters: "
+            + ", ".join(f"{name}={count}" for name, count in self.frames.most_common())
+        )
+
+    async def _run(self, admin, event, motions, session_keys, options):
+        application = AuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+        path = f"/ws/motions/{event.session_uuid}/voter/"
+        voters = [_Voter(self, i, key) for i, key in enumerate(session_keys)]
+
+        connect_gate = asyncio.Semaphore(max(1, options["connect_concurrency"]))
+
+        deferred = 0
+
+        async def connect(voter):
+            nonlocal deferred
+            retries = max(0, options["connect_retries"])
+            for attempt in range(retries + 1):
+                async with connect_gate:
+                    failure = await voter.connect(application, path, options["connect_timeout"])
+                if voter.retry_after is None or attempt == retries:
+                    return failure
+                deferred += 1
+                # Jitter so retried voters do not come back as one burst.
+                await asyncio.sleep(voter.retry_after * random.uniform(1.0, 1.5))
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(connect(voter) for voter in voters), return_exceptions=True)
+        connected = [voter for voter, failure in zip(voters, results) if failure is None]
+        self.connected = len(connected)
+        self._log(
+            f"Connected {len(connected)}/{len(voters)} WebSocket(s) in {time.perf_counter() - started:.1f}s "
+            f"({deferred} deferred handshake(s) retried)."
+        )
+        self._failures("Not connected", results)
+
+        # SQLite cannot take concurrent writers from a thread pool; run HTTP
+        # requests on the same thread as the consumers' database calls.
+        self.serial_db = connection.vendor == "sqlite"
+        if self.serial_db:
+            self._log("SQLite database: HTTP requests are serialised.")
+        moderator = Client(HTTP_HOST=HOST)
+        await sync_to_async(moderator.force_login)(admin)
+        http_gate = asyncio.Semaphore(max(1, options["http_concurrency"]))
+
+        try:
+            for motion in motions:
+                await self._run_motion(moderator, event, motion, connected, http_gate, options)
+        finally:
+            await asyncio.gather(*(voter.close() for voter in voters))
+
+    async def _moderate(self, moderator, event_name: str, url_name: str, event, motion):
+        url = reverse(url_name, args=[event.session_uuid, motion.id])
+        self.broadcast_started[(event_name, motion.id)] = time.perf_counter()
+        response = await sync_to_async(moderator.post, thread_sensitive=self.serial_db)(
+            url, secure=True
+        )
+        if response.status_code >= 400:
+            self._log(f"{url_name} for motion {motion.id} returned {response.status_code}")
+
+    async def _run_motion(self, moderator, event, motion, voters, http_gate, options):
+        window = max(0.1, options["vote_window"])
+        transport = options["transport"]
+        vote_url = reverse("motions:api_cast_vote", args=[event.session_uuid, motion.id])
+
+        await self._moderate(moderator, "motion_opened", "motions:open_motion", event, motion)
+        self._log(f"Opened motion {motion.id}; voting for {window:.1f}s.")
+
+        async def cast(voter, choice):
+            use_http = transport == "http" or (transport == "mixed" and voter.index % 2)
+            kind = "http" if use_http else "socket"
+            start = time.perf_counter()
+            try:
+                if use_http:
+                    async with http_gate:
+                        ok = await sync_to_async(voter.cast_http, thread_sensitive=self.serial_db)(
+                            vote_url, choice
+                        )
+                else:
+                    ok = await voter.cast_socket(motion.id, choice, options["ack_timeout"])
+            except Exception:
+                self.ack_errors[kind] += 1
+                raise
+            if ok:
+                self.ack_ms[kind].append((time.perf_counter() - start) * 1000)
+            else:
+                self.ack_errors[kind] += 1
+
+        async def vote(voter):
+            choices = [choice for choice, _ in MotionVote.CHOICES]
+            await asyncio.sleep(random.uniform(0, window * 0.8))
+            await cast(voter, random.choice(choices))
+            if random.random() < options["change_rate"]:
+                await asyncio.sleep(random.uniform(0, window * 0.1))
+                await cast(voter, random.choice(choices))
+
+        opened = time.perf_counter()
+        results = await asyncio.gather(*(vote(voter) for voter in voters), return_exceptions=True)
+        self._failures(f"Voters failed on motion {motion.id}", results)
+        remaining = window - (time.perf_counter() - opened)
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+
+        await self._moderate(moderator, "motion_closed", "motions:close_motion", event, motion)
+        # Give the close broadcast time to reach every socket before the next motion.
+        await asyncio.sleep(min(2.0, window))
+        self._log(f"Closed motion {motion.id}.")
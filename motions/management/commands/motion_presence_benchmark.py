@@ -0,0 +1,81 @@
+import asyncio
+import time
+from typing import List
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from django.core.management.base import BaseCommand
+
+from motions.models import Motion
+from motions.presence import AsyncPresenceTracker, PresenceTracker, _zset_key
+from motions.redis_registry import get_redis
+from motions.utils import percentile
+
+# Far outside real primary keys so the benchmark never touches a live event.
+BENCH_EVENT_ID = 2_000_000_000
+
+
+class Command(BaseCommand):
+    help = (
+        "Heartbeat latency with N concurrent sockets: the sync tracker behind "
+        "database_sync_to_async (before) against the asyncio tracker (after). "
+        "Uses Redis when REDIS_URL is set, otherwise the local presence store."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sockets", type=int, default=10000, help="Concurrent heartbeats per round.")
+        parser.add_argument("--rounds", type=int, default=3)
+        parser.add_argument(
+            "--db-calls",
+            type=int,
+            default=0,
+            help="Concurrent ORM queries per round, to show heartbeats queueing behind real DB work.",
+        )
+
+    def _log(self, message: str):
+        self.stdout.write(f"[motion_presence_benchmark] {message}")
+
+    async def _round(self, heartbeat, sockets: int, db_calls: int):
+        latencies: List[float] = []
+
+        async def beat(i):
+            start = time.perf_counter()
+            await heartbeat(BENCH_EVENT_ID, f"bench-{i}")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        query = database_sync_to_async(lambda: Motion.objects.filter(pk=0).exists())
+        start = time.perf_counter()
+        await asyncio.gather(*(beat(i) for i in range(sockets)), *(query() for _ in range(db_calls)))
+        return latencies, time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        sockets = max(1, options["sockets"])
+        backend = "redis" if get_redis() else "local store"
+        self._log(f"{sockets} socket(s), {options['rounds']} round(s), backend={backend}")
+        sync_tracker = PresenceTracker()
+        async_tracker = AsyncPresenceTracker()
+        variants = (
+            ("database_sync_to_async", database_sync_to_async(sync_tracker.heartbeat)),
+            ("async tracker", async_tracker.heartbeat),
+        )
+        try:
+            for label, heartbeat in variants:
+                latencies: List[float] = []
+                wall = 0.0
+                for _ in range(max(1, options["rounds"])):
+                    round_latencies, elapsed = async_to_sync(self._round)(
+                        heartbeat, sockets, options["db_calls"]
+                    )
+                    latencies.extend(round_latencies)
+                    wall += elapsed
+                self._log(
+                    f"{label:<22} p50={percentile(latencies, 50):.2f}ms "
+                    f"p95={percentile(latencies, 95):.2f}ms p99={percentile(latencies, 99):.2f}ms "
+                    f"max={max(latencies):.2f}ms {len(latencies) / wall:.0f} heartbeats/s"
+                )
+        finally:
+            client = get_redis()
+            if client:
+                client.delete(_zset_key(BENCH_EVENT_ID))
+            for i in range(sockets):
+                sync_tracker.local.remove(BENCH_EVENT_ID, f"bench-{i}")
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from motions import reconcile
+
+
+class Command(BaseCommand):
+    help = "Compare live motion tallies with MotionVote and repair confirmed drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run a single pass and exit.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=reconcile.RECONCILE_INTERVAL_SEC,
+            help="Seconds between reconcile passes.",
+        )
+
+    def handle(self, *args, **options):
+        reconciler = reconcile.TallyReconciler(interval=options["interval"])
+        if options["once"]:
+            repaired = reconciler.run_once()
+            self.stdout.write(f"[motion_reconcile] Repaired {repaired} motion(s).")
+            return
+        self.stdout.write(f"[motion_reconcile] Checking open motions every {options['interval']}s.")
+        try:
+            reconciler.run_forever()
+        except KeyboardInterrupt:
+            self.stdout.write("[motion_reconcile] Stopped.")
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from motions.models import Motion, MotionVote
+from motions.services import _upsert_vote_locked, upsert_vote
+
+BENCH_PREFIX = "bench-upsert-"
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the MotionVote upsert against the select_for_update path. "
+        "Writes throwaway votes on the given motion and deletes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("motion_id", type=int)
+        parser.add_argument("--votes", type=int, default=500, help="Voters per pass.")
+
+    def _run(self, label, fn, motion, count):
+        voters = [f"{BENCH_PREFIX}{label}-{i}" for i in range(count)]
+        results = {}
+        for phase, choice in (("create", "yes"), ("change", "no"), ("repeat", "no")):
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                for voter_id in voters:
+                    fn(motion, voter_id, choice)
+                elapsed = time.perf_counter() - start
+            results[phase] = (elapsed * 1000 / count, len(ctx.captured_queries) / count)
+        return results
+
+    def handle(self, *args, **options):
+        motion = Motion.objects.filter(pk=options["motion_id"]).first()
+        if motion is None:
+            raise CommandError("Motion not found")
+        count = max(1, options["votes"])
+        allow_change = motion.allow_vote_change
+        motion.allow_vote_change = True
+        self.stdout.write(f"[motion_vote_benchmark] {connection.vendor}, {count} voter(s) per pass")
+        try:
+            for label, fn in (("select_for_update", _upsert_vote_locked), ("upsert", upsert_vote)):
+                for phase, (ms, queries) in self._run(label, fn, motion, count).items():
+                    self.stdout.write(
+                        f"[motion_vote_benchmark] {label:<18} {phase:<7} "
+                        f"{ms:.3f} ms/vote  {queries:.1f} queries/vote"
+                    )
+        finally:
+            motion.allow_vote_change = allow_change
+            MotionVote.objects.filter(motion=motion, voter_id__startswith=BENCH_PREFIX).delete()
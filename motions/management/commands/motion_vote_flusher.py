@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from motions import ingest
+
+
+class Command(BaseCommand):
+    help = "Flush write-behind motion votes from Redis into MotionVote."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Flush everything pending and exit.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=ingest.FLUSH_INTERVAL_SEC,
+            help="Seconds between flush passes.",
+        )
+
+    def handle(self, *args, **options):
+        flusher = ingest.VoteFlusher(interval=options["interval"])
+        if options["once"]:
+            written = flusher.run_once()
+            self.stdout.write(f"[motion_vote_flusher] Flushed {written} vote(s).")
+            return
+        self.stdout.write(f"[motion_vote_flusher] Flushing every {options['interval']}s.")
+        try:
+            while True:
+                written = flusher.run_once()
+                if written:
+                    self.stdout.write(f"[motion_vote_flusher] Flushed {written} vote(s).")
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("[motion_vote_flusher] Stopped.")
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('motions', '0002_rename_motions_mot_motion__9bfda0_idx_motions_mot_motion__c3806d_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MotionResult',
+            fields=[
+                ('motion', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='result', serialize=False, to='motions.motion')),
+                ('yes_count', models.PositiveIntegerField(default=0)),
+                ('no_count', models.PositiveIntegerField(default=0)),
+                ('abstain_count', models.PositiveIntegerField(default=0)),
+                ('frozen_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -113,3 +113,28 @@ class MotionVote(models.Model):
 
     def __str__(self):
         return f"{self.voter_id} -> {self.choice} on {self.motion_id}"
+
+
+class MotionResult(models.Model):
+    """
+    Final tally frozen when a motion closes, so read paths do not re-aggregate
+    MotionVote. Removed when votes are reset or the motion is reopened.
+    """
+
+    motion = models.OneToOneField(
+        Motion, on_delete=models.CASCADE, related_name="result", primary_key=True
+    )
+    yes_count = models.PositiveIntegerField(default=0)
+    no_count = models.PositiveIntegerField(default=0)
+    abstain_count = models.PositiveIntegerField(default=0)
+    frozen_at = models.DateTimeField(default=tz.now)
+
+    def __str__(self):
+        return f"Result for {self.motion_id}: {self.as_counts()}"
+
+    def as_counts(self):
+        return {
+            MotionVote.CHOICE_YES: self.yes_count,
+            MotionVote.CHOICE_NO: self.no_count,
+            MotionVote.CHOICE_ABSTAIN: self.abstain_count,
+        }
@@ -0,0 +1,33 @@
+from datetime import timedelta
+from typing import Dict, Optional
+
+from django.utils import timezone as tz
+
+from .models import Motion
+
+
+def motion_payload(motion: Motion) -> Dict:
+    return {
+        "id": motion.id,
+        "title": motion.title,
+        "body": motion.body,
+        "status": motion.status,
+        "allow_vote_change": motion.allow_vote_change,
+        "reveal_results": motion.reveal_results,
+        "auto_close_seconds": motion.auto_close_seconds,
+        "opened_at": motion.opened_at.isoformat() if motion.opened_at else None,
+        "closed_at": motion.closed_at.isoformat() if motion.closed_at else None,
+    }
+
+
+def closes_at(motion: Optional[Motion]):
+    if motion and motion.opened_at and motion.auto_close_seconds:
+        return motion.opened_at + timedelta(seconds=motion.auto_close_seconds)
+    return None
+
+
+def attach_timer_payload(motion: Motion, payload: Dict) -> Dict:
+    payload["server_now"] = tz.now().isoformat()
+    deadline = closes_at(motion)
+    payload["closes_at"] = deadline.isoformat() if deadline else None
+    return payload
@@ -1,95 +1,484 @@
 import logging
-import os
+import threading
 import time
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
 from django.conf import settings
-from django.core.cache import cache
 
-try:  # Redis is optional; fall back to process-local cache
-    import redis  # type: ignore
-except Exception:  # pragma: no cover - handled by fallback
-    redis = None
+from .attendance import attendance
+from .redis_registry import get_async_redis, get_redis, record_failure
 
 logger = logging.getLogger(__name__)
 
 HEARTBEAT_INTERVAL_SEC = int(getattr(settings, "MOTION_HEARTBEAT_SEC", 15))
 PRESENCE_TIMEOUT_SEC = int(getattr(settings, "MOTION_PRESENCE_TIMEOUT_SEC", 45))
+# presence_update cadence per audience: max seconds between frames while the
+# count moves, and the percent change that is sent right away.
+PRESENCE_ADMIN_SEC = float(getattr(settings, "MOTION_PRESENCE_ADMIN_SEC", 1))
+PRESENCE_ADMIN_CHANGE_PCT = float(getattr(settings, "MOTION_PRESENCE_ADMIN_CHANGE_PCT", 0))
+PRESENCE_VOTER_SEC = float(getattr(settings, "MOTION_PRESENCE_VOTER_SEC", 30))
+PRESENCE_VOTER_CHANGE_PCT = float(getattr(settings, "MOTION_PRESENCE_VOTER_CHANGE_PCT", 5))
+PRESENCE_BUCKET_SEC = max(1, int(getattr(settings, "MOTION_PRESENCE_BUCKET_SEC", 5)))
+# Lifetime of the shared last-published state; a lost entry only means one
+# early frame.
+PUBLISHED_TTL_SEC = 3600
 
+PRESENCE_MODE_EXACT = "exact"
+PRESENCE_MODE_HLL = "hll"
 
-class PresenceTracker:
+
+def presence_mode() -> str:
+    return getattr(settings, "MOTION_PRESENCE_MODE", PRESENCE_MODE_EXACT)
+
+
+def _bucket(ts: float) -> int:
+    return int(ts // PRESENCE_BUCKET_SEC)
+
+
+def _window(now: float) -> range:
     """
-    Tracks live attendance per event using Redis when available, otherwise an
-    in-process cache. Presence is defined as a heartbeat within the timeout window.
+    Buckets that overlap the presence window ending at ``now``. Presence is
+    therefore rounded up to the bucket width.
     """
+    return range(_bucket(now - PRESENCE_TIMEOUT_SEC), _bucket(now) + 1)
+
+
+def _zset_key(event_id: int) -> str:
+    return f"presence:event:{event_id}"
+
+
+def _hll_keys(event_id: int, now: float) -> List[str]:
+    return [f"presence:event:{event_id}:hll:{bucket}" for bucket in _window(now)]
+
+
+class _EventBuckets:
+    __slots__ = ("members", "buckets")
 
     def __init__(self):
-        self.redis_url = os.environ.get("REDIS_URL") or getattr(settings, "REDIS_URL", None)
-        self._client = None
+        # voter -> bucket of their latest heartbeat; bucket -> voters
+        self.members: Dict[str, int] = {}
+        self.buckets: Dict[int, Set[str]] = {}
+
+
+class LocalPresenceStore:
+    """
+    Single-node presence store made of time-bucketed sets. Each voter sits in
+    the bucket of their latest heartbeat, so a heartbeat or leave is O(1),
+    counting sums the few buckets in the window, and expiry drops whole
+    buckets at once.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events: Dict[int, _EventBuckets] = {}
+
+    def heartbeat(self, event_id: int, voter_id: str, now: float) -> int:
+        bucket = _bucket(now)
+        with self._lock:
+            state = self._events.setdefault(event_id, _EventBuckets())
+            previous = state.members.get(voter_id)
+            if previous != bucket:
+                if previous is not None:
+                    state.buckets.get(previous, set()).discard(voter_id)
+                state.members[voter_id] = bucket
+                state.buckets.setdefault(bucket, set()).add(voter_id)
+            return self._count(state, now)
+
+    def remove(self, event_id: int, voter_id: str):
+        with self._lock:
+            state = self._events.get(event_id)
+            if state is None:
+                return
+            bucket = state.members.pop(voter_id, None)
+            if bucket is not None:
+                state.buckets.get(bucket, set()).discard(voter_id)
+
+    def count(self, event_id: int, now: float) -> int:
+        with self._lock:
+            state = self._events.get(event_id)
+            return self._count(state, now) if state else 0
+
+    def prune(self, event_id: int, now: float) -> int:
+        first = _bucket(now - PRESENCE_TIMEOUT_SEC)
+        with self._lock:
+            state = self._events.get(event_id)
+            if state is None:
+                return 0
+            for bucket in [b for b in state.buckets if b < first]:
+                for voter_id in state.buckets.pop(bucket):
+                    if state.members.get(voter_id) == bucket:
+                        del state.members[voter_id]
+            if not state.members:
+                del self._events[event_id]
+                return 0
+            return self._count(state, now)
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+
+    @staticmethod
+    def _count(state: _EventBuckets, now: float) -> int:
+        first = _bucket(now - PRESENCE_TIMEOUT_SEC)
+        return sum(len(voters) for bucket, voters in state.buckets.items() if bucket >= first)
+
+
+local_store = LocalPresenceStore()
+
+
+class PresenceTracker:
+    """
+    Tracks live attendance per event. With Redis, "exact" mode keeps a sorted
+    set of last-heartbeat times and "hll" mode adds voters to one HyperLogLog
+    per time bucket (approximate, for very large events; leaving is only
+    noticed when the bucket ages out). Without Redis, the process-local
+    bucketed store is used. Heartbeats only record and count; expired members
+    are removed by ``prune``, which the presence ticker runs off the hot path.
+    """
+
+    def __init__(self, store: Optional[LocalPresenceStore] = None):
+        self.local = store or local_store
 
     def _key(self, event_id: int) -> str:
-        return f"presence:event:{event_id}"
+        return _zset_key(event_id)
 
-    def _get_client(self):
-        if self._client or not (self.redis_url and redis):
-            return self._client
-        try:
-            self._client = redis.from_url(self.redis_url, decode_responses=True)
-        except Exception as exc:  # pragma: no cover - best-effort fallback
-            logger.warning("PresenceTracker: redis unavailable, falling back to cache (%s)", exc)
-            self._client = None
-        return self._client
+    def _bucket_keys(self, event_id: int, now: float) -> List[str]:
+        return _hll_keys(event_id, now)
 
-    def _fallback_store(self, key: str) -> Dict[str, int]:
-        return cache.get(key, {}) or {}
+    def _get_client(self):
+        return get_redis()
 
     def heartbeat(self, event_id: int, voter_id: str) -> int:
-        now = int(time.time())
+        now = time.time()
         client = self._get_client()
-        key = self._key(event_id)
 
         if client:
             try:
-                client.zadd(key, {voter_id: now})
-                client.zremrangebyscore(key, 0, now - PRESENCE_TIMEOUT_SEC)
-                client.expire(key, max(PRESENCE_TIMEOUT_SEC * 2, 120))
-                return int(client.zcard(key))
+                pipe = client.pipeline(transaction=False)
+                if presence_mode() == PRESENCE_MODE_HLL:
+                    keys = self._bucket_keys(event_id, now)
+                    pipe.pfadd(keys[-1], voter_id)
+                    pipe.expire(keys[-1], PRESENCE_TIMEOUT_SEC + 2 * PRESENCE_BUCKET_SEC)
+                    pipe.pfcount(*keys)
+                else:
+                    key = self._key(event_id)
+                    pipe.zadd(key, {voter_id: int(now)})
+                    pipe.expire(key, max(PRESENCE_TIMEOUT_SEC * 2, 120))
+                    pipe.zcount(key, f"({int(now) - PRESENCE_TIMEOUT_SEC}", "+inf")
+                return int(pipe.execute()[-1])
             except Exception as exc:  # pragma: no cover - fallback on runtime failure
-                logger.warning("PresenceTracker: redis heartbeat failed, using cache (%s)", exc)
+                record_failure(exc)
+                logger.warning("PresenceTracker: redis heartbeat failed, using local store (%s)", exc)
 
-        store = self._fallback_store(key)
-        store[voter_id] = now
-        cutoff = now - PRESENCE_TIMEOUT_SEC
-        store = {k: ts for k, ts in store.items() if ts >= cutoff}
-        cache.set(key, store, timeout=PRESENCE_TIMEOUT_SEC * 2)
-        return len(store)
+        return self.local.heartbeat(event_id, voter_id, now)
 
     def count(self, event_id: int) -> int:
-        now = int(time.time())
+        now = time.time()
         client = self._get_client()
-        key = self._key(event_id)
-        cutoff = now - PRESENCE_TIMEOUT_SEC
         if client:
             try:
-                client.zremrangebyscore(key, 0, cutoff)
-                return int(client.zcard(key))
+                if presence_mode() == PRESENCE_MODE_HLL:
+                    return int(client.pfcount(*self._bucket_keys(event_id, now)))
+                cutoff = int(now) - PRESENCE_TIMEOUT_SEC
+                return int(client.zcount(self._key(event_id), f"({cutoff}", "+inf"))
             except Exception as exc:  # pragma: no cover
-                logger.warning("PresenceTracker: redis count failed, using cache (%s)", exc)
-        store = self._fallback_store(key)
-        store = {k: ts for k, ts in store.items() if ts >= cutoff}
-        cache.set(key, store, timeout=PRESENCE_TIMEOUT_SEC * 2)
-        return len(store)
+                record_failure(exc)
+                logger.warning("PresenceTracker: redis count failed, using local store (%s)", exc)
+        return self.local.count(event_id, now)
+
+    def prune(self, event_id: int) -> int:
+        """
+        Drop members whose last heartbeat is older than the timeout and return
+        the live count. HyperLogLog buckets expire on their own.
+        """
+        now = time.time()
+        client = self._get_client()
+        if client:
+            try:
+                if presence_mode() == PRESENCE_MODE_HLL:
+                    return int(client.pfcount(*self._bucket_keys(event_id, now)))
+                pipe = client.pipeline(transaction=False)
+                pipe.zremrangebyscore(self._key(event_id), 0, int(now) - PRESENCE_TIMEOUT_SEC)
+                pipe.zcard(self._key(event_id))
+                return int(pipe.execute()[-1])
+            except Exception as exc:  # pragma: no cover
+                record_failure(exc)
+                logger.warning("PresenceTracker: redis prune failed, using local store (%s)", exc)
+        return self.local.prune(event_id, now)
 
     def mark_gone(self, event_id: int, voter_id: str):
         client = self._get_client()
-        key = self._key(event_id)
         if client:
+            if presence_mode() == PRESENCE_MODE_HLL:
+                return
             try:
-                client.zrem(key, voter_id)
+                client.zrem(self._key(event_id), voter_id)
                 return
-            except Exception:  # pragma: no cover
+            except Exception as exc:  # pragma: no cover
+                record_failure(exc)
                 logger.debug("PresenceTracker: redis mark_gone fallback")
-        store = self._fallback_store(key)
-        if voter_id in store:
-            store.pop(voter_id, None)
-            cache.set(key, store, timeout=PRESENCE_TIMEOUT_SEC * 2)
+        self.local.remove(event_id, voter_id)
+
+
+class AsyncPresenceTracker:
+    """
+    Coroutine version of ``PresenceTracker`` for the Channels consumers, on
+    ``redis.asyncio`` so heartbeats do not take a slot in the sync thread
+    pool. Uses the same keys and the same process-local fallback store.
+    """
+
+    def __init__(self, store: Optional[LocalPresenceStore] = None):
+        self.local = store or local_store
+
+    async def heartbeat(self, event_id: int, voter_id: str) -> int:
+        now = time.time()
+        client = get_async_redis()
+        if client:
+            try:
+                async with client.pipeline(transaction=False) as pipe:
+                    if presence_mode() == PRESENCE_MODE_HLL:
+                        keys = _hll_keys(event_id, now)
+                        pipe.pfadd(keys[-1], voter_id)
+                        pipe.expire(keys[-1], PRESENCE_TIMEOUT_SEC + 2 * PRESENCE_BUCKET_SEC)
+                        pipe.pfcount(*keys)
+                    else:
+                        key = _zset_key(event_id)
+                        pipe.zadd(key, {voter_id: int(now)})
+                        pipe.expire(key, max(PRESENCE_TIMEOUT_SEC * 2, 120))
+                        pipe.zcount(key, f"({int(now) - PRESENCE_TIMEOUT_SEC}", "+inf")
+                    return int((await pipe.execute())[-1])
+            except Exception as exc:  # pragma: no cover - fallback on runtime failure
+                record_failure(exc)
+                logger.warning("AsyncPresenceTracker: redis heartbeat failed, using local store (%s)", exc)
+        return self.local.heartbeat(event_id, voter_id, now)
+
+    async def count(self, event_id: int) -> int:
+        now = time.time()
+        client = get_async_redis()
+        if client:
+            try:
+                if presence_mode() == PRESENCE_MODE_HLL:
+                    return int(await client.pfcount(*_hll_keys(event_id, now)))
+                cutoff = int(now) - PRESENCE_TIMEOUT_SEC
+                return int(await client.zcount(_zset_key(event_id), f"({cutoff}", "+inf"))
+            except Exception as exc:  # pragma: no cover
+                record_failure(exc)
+                logger.warning("AsyncPresenceTracker: redis count failed, using local store (%s)", exc)
+        return self.local.count(event_id, now)
+
+    async def mark_gone(self, event_id: int, voter_id: str):
+        client = get_async_redis()
+        if client:
+            if presence_mode() == PRESENCE_MODE_HLL:
+                return
+            try:
+                await client.zrem(_zset_key(event_id), voter_id)
+                return
+            except Exception as exc:  # pragma: no cover
+                record_failure(exc)
+                logger.debug("AsyncPresenceTracker: redis mark_gone fallback")
+        self.local.remove(event_id, voter_id)
+
+
+class PresenceAudience:
+    """
+    Publish policy for one audience: send when the count moved by at least
+    ``change_pct`` percent since the last frame (0 means any change), or
+    when it changed at all and ``interval`` seconds have passed.
+    """
+
+    def __init__(self, name: str, interval: float, change_pct: float, send: Callable[[int, int], None]):
+        self.name = name
+        self.interval = interval
+        self.change_pct = change_pct
+        self.send = send
+        self.emitted = 0
+
+    def due(self, count: int, last: Optional[Tuple[int, float]], now: float) -> bool:
+        if last is None:
+            return True
+        last_count, sent_at = last
+        if count == last_count:
+            return False
+        if now - sent_at >= self.interval:
+            return True
+        change = abs(count - last_count) * 100.0 / max(last_count, 1)
+        return change >= self.change_pct
+
+
+def _send_presence(broadcast_name: str) -> Callable[[int, int], None]:
+    def send(event_id: int, count: int):
+        from . import realtime
+
+        getattr(realtime, broadcast_name)(event_id, "presence_update", {"count": count})
+
+    return send
+
+
+def default_audiences() -> List[PresenceAudience]:
+    return [
+        PresenceAudience(
+            "admins", PRESENCE_ADMIN_SEC, PRESENCE_ADMIN_CHANGE_PCT, _send_presence("broadcast_to_admins")
+        ),
+        PresenceAudience(
+            "voters", PRESENCE_VOTER_SEC, PRESENCE_VOTER_CHANGE_PCT, _send_presence("broadcast_to_voters")
+        ),
+    ]
+
+
+class PresenceTicker:
+    """
+    Publishes attendance per event instead of once per heartbeat. Consumers
+    ``touch`` an event when someone connects, beats or leaves; the ticker
+    wakes at the fastest audience's interval, prunes each active event and
+    lets every audience decide whether the count is worth a frame. Admins
+    get near-real-time quorum, voters an occasional refresh. With Redis, one
+    process per event wins each tick so workers do not repeat the frame, and
+    the count and time last sent to each audience are kept next to the tick
+    claim so the cadence holds whichever process wins.
+    """
+
+    def __init__(
+        self,
+        audiences: Optional[List[PresenceAudience]] = None,
+        tracker: Optional[PresenceTracker] = None,
+        interval: Optional[float] = None,
+    ):
+        self.audiences = audiences if audiences is not None else default_audiences()
+        self.interval = interval or min(audience.interval for audience in self.audiences)
+        self.tracker = tracker or PresenceTracker()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # event_id -> monotonic time of the last touch
+        self._active: Dict[int, float] = {}
+        # (audience, event_id) -> (count, time sent); used without Redis
+        self._published: Dict[Tuple[str, int], Tuple[int, float]] = {}
+        self.touched = 0
+        self.ticks = 0
+
+    def touch(self, event_id: int):
+        with self._lock:
+            self.touched += 1
+            self._active[event_id] = time.monotonic()
+        self.ensure_started()
+
+    def _claim(self, event_id: int) -> bool:
+        client = get_redis()
+        if not client:
+            return True
+        try:
+            return bool(
+                client.set(
+                    f"presence:event:{event_id}:tick", "1", nx=True, px=max(1, int(self.interval * 900))
+                )
+            )
+        except Exception as exc:  # pragma: no cover
+            record_failure(exc)
+            return True
+
+    def _last_published(self, event_id: int) -> Dict[str, Tuple[int, float]]:
+        client = get_redis()
+        if client:
+            try:
+                raw = client.hgetall(f"presence:event:{event_id}:published")
+                published = {}
+                for name, value in raw.items():
+                    name = name.decode() if isinstance(name, bytes) else name
+                    value = value.decode() if isinstance(value, bytes) else value
+                    count, sent_at = value.split(":", 1)
+                    published[name] = (int(count), float(sent_at))
+                return published
+            except Exception as exc:  # pragma: no cover
+                record_failure(exc)
+        return {
+            audience.name: self._published[(audience.name, event_id)]
+            for audience in self.audiences
+            if (audience.name, event_id) in self._published
+        }
+
+    def _mark_published(self, event_id: int, audience: str, count: int, now: float):
+        self._published[(audience, event_id)] = (count, now)
+        client = get_redis()
+        if client:
+            try:
+                key = f"presence:event:{event_id}:published"
+                pipe = client.pipeline()
+                pipe.hset(key, audience, f"{count}:{now}")
+                pipe.expire(key, PUBLISHED_TTL_SEC)
+                pipe.execute()
+            except Exception as exc:  # pragma: no cover
+                record_failure(exc)
+
+    def tick(self) -> int:
+        """
+        Prune every active event once and publish to the audiences that are
+        due; returns frames sent.
+        """
+        now = time.monotonic()
+        # Send times are shared between processes, so use the wall clock.
+        wall = time.time()
+        with self._lock:
+            self.ticks += 1
+            events = list(self._active.items())
+        sent = 0
+        for event_id, touched_at in events:
+            if not self._claim(event_id):
+                continue
+            count = self.tracker.prune(event_id)
+            attendance.record(event_id, count)
+            if count == 0 and now - touched_at > PRESENCE_TIMEOUT_SEC:
+                # Nobody left and nothing heard for a full window: stop ticking.
+                with self._lock:
+                    if self._active.get(event_id) == touched_at:
+                        self._active.pop(event_id, None)
+            published = self._last_published(event_id)
+            for audience in self.audiences:
+                if not audience.due(count, published.get(audience.name), wall):
+                    continue
+                try:
+                    audience.send(event_id, count)
+                except Exception:
+                    logger.debug(
+                        "Presence broadcast to %s failed for event %s", audience.name, event_id, exc_info=True
+                    )
+                    continue
+                self._mark_published(event_id, audience.name, count, wall)
+                audience.emitted += 1
+                sent += 1
+        return sent
+
+    def run_forever(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.tick()
+            except Exception:  # pragma: no cover - keep the loop alive
+                logger.exception("Presence tick failed")
+
+    def ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self.run_forever, name="motion-presence-ticker", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "interval_sec": self.interval,
+                "events": len(self._active),
+                "touched": self.touched,
+                "ticks": self.ticks,
+                "emitted": {audience.name: audience.emitted for audience in self.audiences},
+            }
+
+
+presence_ticker = PresenceTicker()
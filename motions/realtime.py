@@ -1,8 +1,24 @@
+import asyncio
+import logging
 import re
-from typing import Any, Dict
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.conf import settings
+
+from .channel_registry import voter_channels
+from .payloads import motion_payload
+from .replay import AUDIENCE_ADMINS, AUDIENCE_VOTERS, event_stream
+from .wire import encode_binary, encode_text, state_key
+
+logger = logging.getLogger(__name__)
+
+TALLY_BROADCAST_HZ = float(getattr(settings, "MOTION_TALLY_BROADCAST_HZ", 4))
+OUTBOX_ENABLED = bool(getattr(settings, "MOTION_BROADCAST_OUTBOX", True))
+OUTBOX_TICK_SEC = float(getattr(settings, "MOTION_BROADCAST_TICK_MS", 10)) / 1000.0
 
 
 def voter_group(event_id: int) -> str:
@@ -14,31 +30,304 @@ def admin_group(event_id: int) -> str:
 
 
 def user_group(event_id: int, voter_token: str) -> str:
+    """
+    Former per-voter group; direct frames now go through ``voter_channels``.
+    Kept for ``motion_channel_benchmark``.
+    """
     safe = re.sub(r"[^a-zA-Z0-9_-]", "-", str(voter_token))[:120]
     return f"motions_user_{event_id}_{safe}"
 
 
-def _send(group: str, event: str, payload: Dict[str, Any]):
+def _frame(event: str, payload: Dict[str, Any], seq: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Channel-layer message for one frame, encoded here once for every
+    recipient in both wire formats.
+    """
+    frame = {
+        "type": "push.event",
+        "event": event,
+        "seq": seq,
+        "state_key": state_key(event, payload),
+        "text": encode_text(event, payload, seq),
+    }
+    packed = encode_binary(event, payload, seq)
+    if packed is not None:
+        frame["packed"] = packed
+    return frame
+
+
+# Outbox targets: (layer method, group or channel name).
+Target = Tuple[str, str]
+
+
+async def _send_batches(batches: List[Tuple[Target, List[Dict[str, Any]]]]):
+    layer = get_channel_layer()
+    if not layer:
+        return
+    for (method, name), frames in batches:
+        if len(frames) == 1:
+            message = frames[0]
+        else:
+            message = {"type": "push.batch", "frames": frames}
+        try:
+            await getattr(layer, method)(name, message)
+        except Exception:
+            logger.warning("Broadcast to %s failed", name, exc_info=True)
+
+
+class BroadcastOutbox:
+    """
+    Queue for events sent from sync code. ``put`` returns at once; a sender
+    thread with its own event loop drains the queue every ``tick`` seconds
+    and merges the frames for each group (or channel, with ``direct``) into
+    one message (a ``push.batch`` when there is more than one), keeping their
+    order.
+    """
+
+    def __init__(self, tick: float = OUTBOX_TICK_SEC, send: Optional[Callable] = None):
+        self.tick = tick
+        self._send = send or _send_batches
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending: Dict[Target, List[Dict[str, Any]]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self.queued = 0
+        self.sends = 0
+
+    def put(
+        self,
+        name: str,
+        event: str,
+        payload: Dict[str, Any],
+        direct: bool = False,
+        seq: Optional[int] = None,
+    ):
+        target = ("send" if direct else "group_send", name)
+        frame = _frame(event, payload, seq)
+        with self._lock:
+            self._pending.setdefault(target, []).append(frame)
+            self.queued += 1
+        self._wake.set()
+        self._ensure_started()
+
+    def drain(self) -> List[Tuple[Target, List[Dict[str, Any]]]]:
+        with self._lock:
+            batches = list(self._pending.items())
+            self._pending = {}
+            self.sends += len(batches)
+        return batches
+
+    def flush(self):
+        """
+        Deliver everything queued from the calling thread.
+        """
+        batches = self.drain()
+        if batches:
+            async_to_sync(self._send)(batches)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tick_ms": round(self.tick * 1000, 1),
+                "queued": self.queued,
+                "sends": self.sends,
+                "pending_targets": len(self._pending),
+            }
+
+    def _ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="motion-broadcast-outbox", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        # One long-lived loop so the channel layer keeps its connections.
+        loop = asyncio.new_event_loop()
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self.tick:
+                time.sleep(self.tick)
+            batches = self.drain()
+            if not batches:
+                continue
+            try:
+                loop.run_until_complete(self._send(batches))
+            except Exception:  # pragma: no cover - keep the sender alive
+                logger.exception("Broadcast outbox delivery failed")
+
+
+outbox = BroadcastOutbox()
+
+
+def _use_outbox(layer) -> bool:
+    # The in-memory layer's queues belong to the consumers' event loop and
+    # must not be fed from another loop; send inline there.
+    return OUTBOX_ENABLED and not isinstance(layer, InMemoryChannelLayer)
+
+
+def _send(
+    name: str,
+    event: str,
+    payload: Dict[str, Any],
+    direct: bool = False,
+    seq: Optional[int] = None,
+):
     layer = get_channel_layer()
     if not layer:
         return
-    async_to_sync(layer.group_send)(
-        group,
-        {
-            "type": "push.event",
-            "event": event,
-            "payload": payload,
-        },
-    )
+    if _use_outbox(layer):
+        outbox.put(name, event, payload, direct=direct, seq=seq)
+        return
+    method = layer.send if direct else layer.group_send
+    async_to_sync(method)(name, _frame(event, payload, seq))
 
 
 def broadcast_to_voters(event_id: int, event: str, payload: Dict[str, Any]):
-    _send(voter_group(event_id), event, payload)
+    seq = event_stream.publish(event_id, AUDIENCE_VOTERS, event, payload)
+    _send(voter_group(event_id), event, payload, seq=seq)
 
 
 def broadcast_to_admins(event_id: int, event: str, payload: Dict[str, Any]):
-    _send(admin_group(event_id), event, payload)
+    seq = event_stream.publish(event_id, AUDIENCE_ADMINS, event, payload)
+    _send(admin_group(event_id), event, payload, seq=seq)
 
 
 def notify_voter(event_id: int, voter_token: str, event: str, payload: Dict[str, Any]):
-    _send(user_group(event_id, voter_token), event, payload)
+    for channel_name in voter_channels.channels(event_id, voter_token):
+        _send(channel_name, event, payload, direct=True)
+
+
+def announce_motion_closed(motion, counts: Dict[str, int]):
+    """
+    Push the closing frames for a motion: final tally to admins, then
+    ``motion_closed`` to everyone and the results if they are revealed.
+    """
+    event_id = motion.event_id
+    flush_tally_update(event_id, motion.id, counts)
+    payload = motion_payload(motion)
+    payload["counts"] = counts
+    broadcast_to_voters(event_id, "motion_closed", payload)
+    broadcast_to_admins(event_id, "motion_closed", payload)
+    if motion.reveal_results:
+        broadcast_to_voters(event_id, "results_revealed", {"motion_id": motion.id, "counts": counts})
+
+
+def _emit_tally(event_id: int, motion_id: int, counts: Optional[Dict[str, int]] = None):
+    if counts is None:
+        from .services import get_live_counts
+
+        counts = get_live_counts(motion_id)
+    broadcast_to_admins(event_id, "admin_vote_update", {"motion_id": motion_id, "counts": counts})
+
+
+class TallyBroadcaster:
+    """
+    Coalesces admin tally frames per motion. Votes only mark a motion dirty;
+    a background thread emits the latest counts at most ``rate_hz`` times per
+    second per motion, so a burst of N votes costs a handful of frames.
+    """
+
+    def __init__(self, rate_hz: float = TALLY_BROADCAST_HZ, emit: Optional[Callable] = None):
+        self.interval = 1.0 / rate_hz if rate_hz > 0 else 0.0
+        self._emit = emit or _emit_tally
+        self._cond = threading.Condition()
+        # Serialises emits so a final frame cannot be overtaken by a stale one.
+        self._emit_lock = threading.Lock()
+        self._due: Dict[int, Tuple[float, int]] = {}
+        self._last: Dict[int, float] = {}
+        # Bumped by flush_final so frames picked up before the close are dropped.
+        self._epoch: Dict[int, int] = {}
+        self._thread: Optional[threading.Thread] = None
+        self.marked = 0
+        self.emitted = 0
+
+    def mark(self, event_id: int, motion_id: int):
+        now = time.monotonic()
+        with self._cond:
+            self.marked += 1
+            if motion_id in self._due:
+                return
+            due_at = max(now, self._last.get(motion_id, 0.0) + self.interval)
+            self._due[motion_id] = (due_at, event_id)
+            self._cond.notify()
+        self._ensure_started()
+
+    def flush_final(self, event_id: int, motion_id: int, counts: Dict[str, int]):
+        """
+        Emit the closing tally right away and drop any frame still pending.
+        """
+        with self._cond:
+            self._due.pop(motion_id, None)
+            self._last.pop(motion_id, None)
+            self._epoch[motion_id] = self._epoch.get(motion_id, 0) + 1
+        self._send(event_id, motion_id, counts)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "rate_hz": round(1.0 / self.interval, 3) if self.interval else None,
+                "marked": self.marked,
+                "emitted": self.emitted,
+                "pending": len(self._due),
+            }
+
+    def _send(
+        self,
+        event_id: int,
+        motion_id: int,
+        counts: Optional[Dict[str, int]] = None,
+        epoch: Optional[int] = None,
+    ):
+        with self._emit_lock:
+            if epoch is not None and self._epoch.get(motion_id, 0) != epoch:
+                return
+            try:
+                self._emit(event_id, motion_id, counts)
+            except Exception:
+                logger.debug("Tally broadcast failed for motion %s", motion_id, exc_info=True)
+            self.emitted += 1
+
+    def _ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="motion-tally-broadcaster", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._due:
+                    self._cond.wait()
+                now = time.monotonic()
+                ready = [
+                    (mid, ev, self._epoch.get(mid, 0))
+                    for mid, (due_at, ev) in self._due.items()
+                    if due_at <= now
+                ]
+                if not ready:
+                    next_due = min(due_at for due_at, _ in self._due.values())
+                    self._cond.wait(next_due - now)
+                    continue
+                for motion_id, _, _ in ready:
+                    self._due.pop(motion_id, None)
+                    self._last[motion_id] = now
+            for motion_id, event_id, epoch in ready:
+                self._send(event_id, motion_id, epoch=epoch)
+
+
+tally_broadcaster = TallyBroadcaster()
+
+
+def queue_tally_update(event_id: int, motion_id: int):
+    tally_broadcaster.mark(event_id, motion_id)
+
+
+def flush_tally_update(event_id: int, motion_id: int, counts: Dict[str, int]):
+    tally_broadcaster.flush_final(event_id, motion_id, counts)
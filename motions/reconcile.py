@@ -0,0 +1,208 @@
+"""
+Background reconciliation of live motion tallies.
+
+Live counts come from ``motion:{id}:tally`` (or the Django cache fallback) and
+can drift from ``MotionVote`` after a failed pipeline, an expired key or a
+per-worker cache. For each open motion the reconciler compares the live
+counters with the authoritative source and repairs drift that is still present
+on the next pass, so votes in flight between the two reads are never
+"corrected" away.
+"""
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count
+
+from . import ingest
+from .models import Motion, MotionVote
+from .redis_registry import get_redis, record_failure
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_INTERVAL_SEC = float(getattr(settings, "MOTION_RECONCILE_INTERVAL_SEC", 5))
+LOCK_KEY = "motions:reconcile:lock"
+
+WORKER_THREAD = "thread"
+WORKER_COMMAND = "command"
+
+CHOICES = (MotionVote.CHOICE_YES, MotionVote.CHOICE_NO, MotionVote.CHOICE_ABSTAIN)
+
+
+def worker_mode() -> str:
+    return getattr(settings, "MOTION_RECONCILE_WORKER", WORKER_THREAD)
+
+
+def _normalise(counts: Dict[str, int]) -> Dict[str, int]:
+    return {choice: int(counts.get(choice, 0) or 0) for choice in CHOICES}
+
+
+def expected_counts(motion_id: int) -> Dict[str, int]:
+    """
+    Authoritative counts for an open motion: the write-behind choices hash
+    when that mode is on, otherwise a GROUP BY on the (motion, choice) index.
+    """
+    if ingest.write_behind_enabled():
+        client = get_redis()
+        if client:
+            try:
+                counts: Dict[str, int] = {}
+                for choice in client.hvals(ingest.choices_key(motion_id)):
+                    counts[choice] = counts.get(choice, 0) + 1
+                return _normalise(counts)
+            except Exception as exc:  # pragma: no cover
+                record_failure(exc)
+    rows = (
+        MotionVote.objects.filter(motion_id=motion_id)
+        .values("choice")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    return _normalise({row["choice"]: row["count"] for row in rows})
+
+
+def _repair(motion_id: int, observed: Dict[str, int], expected: Dict[str, int]) -> bool:
+    """
+    Overwrite the live counters with ``expected`` unless they moved since
+    ``observed`` was read.
+    """
+    from .services import _set_counts, _tally_key
+
+    client = get_redis()
+    if not client:
+        _set_counts(motion_id, expected)
+        return True
+    key = _tally_key(motion_id)
+    try:
+        with client.pipeline() as pipe:
+            pipe.watch(key)
+            current = _normalise({k: int(v) for k, v in pipe.hgetall(key).items()})
+            if current != observed:
+                pipe.unwatch()
+                return False
+            pipe.multi()
+            pipe.delete(key)
+            pipe.hset(key, mapping=expected)
+            pipe.expire(key, 86400)
+            pipe.execute()
+        return True
+    except Exception as exc:
+        # WatchError lands here too: a vote arrived, try again next pass.
+        logger.debug("Tally repair for motion %s skipped (%s)", motion_id, exc)
+        return False
+
+
+class TallyReconciler:
+    def __init__(self, interval: float = RECONCILE_INTERVAL_SEC):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # motion_id -> (live, expected) seen on the previous pass
+        self._suspect: Dict[int, Tuple[Dict[str, int], Dict[str, int]]] = {}
+        self.passes = 0
+        self.checked = 0
+        self.drift_detected = 0
+        self.repairs = 0
+        self.max_abs_drift = 0
+        self.last_drift: Dict[int, Dict[str, int]] = {}
+
+    def _acquire_pass(self) -> bool:
+        client = get_redis()
+        if not client:
+            return True
+        try:
+            return bool(client.set(LOCK_KEY, "1", nx=True, px=max(1, int(self.interval * 900))))
+        except Exception as exc:  # pragma: no cover
+            record_failure(exc)
+            return True
+
+    def check_motion(self, motion: Motion) -> bool:
+        """
+        Compare one motion; returns True when a repair was written.
+        """
+        from .realtime import queue_tally_update
+        from .services import get_live_counts
+
+        self.checked += 1
+        live = _normalise(get_live_counts(motion.id))
+        expected = expected_counts(motion.id)
+        if live == expected:
+            self._suspect.pop(motion.id, None)
+            return False
+        drift = {choice: live[choice] - expected[choice] for choice in CHOICES}
+        self.last_drift[motion.id] = drift
+        previous = self._suspect.get(motion.id)
+        if previous != (live, expected):
+            # First sighting, or still moving: confirm on the next pass.
+            self._suspect[motion.id] = (live, expected)
+            return False
+        self._suspect.pop(motion.id, None)
+        self.drift_detected += 1
+        self.max_abs_drift = max(self.max_abs_drift, max(abs(v) for v in drift.values()))
+        if not _repair(motion.id, live, expected):
+            return False
+        self.repairs += 1
+        logger.warning("Repaired tally drift on motion %s: %s", motion.id, drift)
+        queue_tally_update(motion.event_id, motion.id)
+        return True
+
+    def run_once(self) -> int:
+        if not self._acquire_pass():
+            return 0
+        self.passes += 1
+        repaired = 0
+        open_motions = list(Motion.objects.filter(status=Motion.STATUS_OPEN).only("id", "event_id"))
+        open_ids = {motion.id for motion in open_motions}
+        for motion_id in list(self._suspect):
+            if motion_id not in open_ids:
+                self._suspect.pop(motion_id, None)
+        self.last_drift = {k: v for k, v in self.last_drift.items() if k in open_ids}
+        for motion in open_motions:
+            try:
+                repaired += int(self.check_motion(motion))
+            except Exception:
+                logger.exception("Tally reconcile failed for motion %s", motion.id)
+        return repaired
+
+    def run_forever(self):
+        while not self._stop.wait(self.interval):
+            close_old_connections()
+            try:
+                self.run_once()
+            except Exception:  # pragma: no cover - keep the loop alive
+                logger.exception("Tally reconcile pass failed")
+            finally:
+                close_old_connections()
+
+    def ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self.run_forever, name="motion-tally-reconciler", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> Dict:
+        return {
+            "worker": worker_mode(),
+            "passes": self.passes,
+            "checked": self.checked,
+            "drift_detected": self.drift_detected,
+            "repairs": self.repairs,
+            "max_abs_drift": self.max_abs_drift,
+            "suspect": len(self._suspect),
+            "last_drift": {str(k): v for k, v in self.last_drift.items()},
+        }
+
+
+reconciler = TallyReconciler()
@@ -0,0 +1,335 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Dict, Optional
+
+from django.conf import settings
+
+try:  # Redis is optional; callers fall back to the Django cache
+    import redis  # type: ignore
+except Exception:  # pragma: no cover - handled by fallback
+    redis = None
+
+try:
+    import redis.asyncio as aioredis  # type: ignore
+except Exception:  # pragma: no cover - handled by fallback
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+MAX_CONNECTIONS = int(getattr(settings, "REDIS_POOL_MAX_CONNECTIONS", 50))
+POOL_TIMEOUT_SEC = float(getattr(settings, "REDIS_POOL_TIMEOUT_SEC", 2.0))
+HEALTH_CHECK_INTERVAL_SEC = int(getattr(settings, "REDIS_HEALTH_CHECK_INTERVAL_SEC", 30))
+# A Redis that hangs instead of refusing must still fail fast enough to trip
+# the breaker; keep the read timeout above the scheduler's 1 s pubsub wait.
+SOCKET_TIMEOUT_SEC = float(getattr(settings, "REDIS_SOCKET_TIMEOUT_SEC", 2.0))
+SOCKET_CONNECT_TIMEOUT_SEC = float(getattr(settings, "REDIS_SOCKET_CONNECT_TIMEOUT_SEC", 1.0))
+BREAKER_THRESHOLD = int(getattr(settings, "REDIS_BREAKER_THRESHOLD", 5))
+BREAKER_COOLDOWN_SEC = float(getattr(settings, "REDIS_BREAKER_COOLDOWN_SEC", 10.0))
+
+
+# Django cache backends whose entries live inside the current process.
+_PROCESS_LOCAL_CACHES = ("django.core.cache.backends.locmem.", "django.core.cache.backends.dummy.")
+
+
+def redis_url() -> Optional[str]:
+    return os.environ.get("REDIS_URL") or getattr(settings, "REDIS_URL", None)
+
+
+def cache_is_shared() -> bool:
+    """
+    True when the default Django cache is seen by every worker process
+    (memcached, database, ...); False for LocMem and the dummy cache, where
+    a cache fallback would hand each process its own copy.
+    """
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    return not backend.startswith(_PROCESS_LOCAL_CACHES)
+
+
+class PoolStats:
+    """
+    Thread-safe counters for connection checkouts from the shared pool.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            if seconds > self.wait_max:
+                self.wait_max = seconds
+            if timed_out:
+                self.timeouts += 1
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            avg = self.wait_total / self.checkouts if self.checkouts else 0.0
+            return {
+                "checkouts": self.checkouts,
+                "wait_avg_ms": round(avg * 1000, 3),
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+                "timeouts": self.timeouts,
+            }
+
+
+if redis is not None:
+
+    class _InstrumentedPool(redis.BlockingConnectionPool):
+        """
+        Bounded pool that blocks (up to ``timeout``) when exhausted instead of
+        opening unbounded sockets, and records how long each checkout waited.
+        """
+
+        def __init__(self, *args, **kwargs):
+            self.stats = PoolStats()
+            super().__init__(*args, **kwargs)
+
+        def get_connection(self, *args, **kwargs):
+            start = time.monotonic()
+            try:
+                conn = super().get_connection(*args, **kwargs)
+            except redis.ConnectionError:
+                self.stats.record_wait(time.monotonic() - start, timed_out=True)
+                raise
+            self.stats.record_wait(time.monotonic() - start)
+            return conn
+
+        def in_use(self) -> int:
+            return len(getattr(self, "_connections", [])) - self.pool.qsize() + self.pool.queue.count(None)
+
+else:  # pragma: no cover - redis not installed
+    _InstrumentedPool = None
+
+
+class CircuitBreaker:
+    """
+    Opens after ``threshold`` failures inside ``cooldown`` seconds. While open,
+    callers are told Redis is unavailable so they use their fallback without
+    paying a connect timeout. After the cooldown one probe is allowed through.
+    """
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN_SEC):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = []
+        self.opened_at: Optional[float] = None
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def record_failure(self):
+        now = time.monotonic()
+        with self._lock:
+            if self.opened_at is not None:
+                # A failed probe re-opens the breaker for another cooldown.
+                self.opened_at = now
+                return
+            self._failures = [ts for ts in self._failures if now - ts < self.cooldown]
+            self._failures.append(now)
+            if len(self._failures) >= self.threshold:
+                self.opened_at = now
+                self.trips += 1
+                self._failures = []
+                logger.warning("Redis circuit breaker opened for %.1fs", self.cooldown)
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("Redis circuit breaker closed")
+            self.opened_at = None
+            self._failures = []
+
+
+class RedisRegistry:
+    """
+    Process-wide owner of the Redis connection pool. Tallies, presence, the
+    preview cache and rate limiting all borrow connections from here so a vote
+    burst reuses sockets instead of dialling Redis per call.
+    """
+
+    def __init__(self, url: Optional[str] = None):
+        self._url = url
+        self._lock = threading.Lock()
+        self._pool = None
+        self._client = None
+        # Held by the one caller probing a half-open breaker.
+        self._probe_lock = threading.Lock()
+        # asyncio clients are bound to the loop that created their sockets.
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._async_probes = weakref.WeakKeyDictionary()
+        self.breaker = CircuitBreaker()
+
+    @property
+    def url(self) -> Optional[str]:
+        return self._url or redis_url()
+
+    def _build(self):
+        pool = _InstrumentedPool.from_url(
+            self.url,
+            max_connections=MAX_CONNECTIONS,
+            timeout=POOL_TIMEOUT_SEC,
+            health_check_interval=HEALTH_CHECK_INTERVAL_SEC,
+            socket_timeout=SOCKET_TIMEOUT_SEC,
+            socket_connect_timeout=SOCKET_CONNECT_TIMEOUT_SEC,
+            socket_keepalive=True,
+            decode_responses=True,
+        )
+        return pool, redis.Redis(connection_pool=pool)
+
+    def get_client(self):
+        if not (self.url and redis):
+            return None
+        state = self.breaker.state
+        if state == "open":
+            return None
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    try:
+                        self._pool, self._client = self._build()
+                    except Exception as exc:  # pragma: no cover - bad URL etc.
+                        logger.warning("Redis registry: could not build pool (%s)", exc)
+                        self.breaker.record_failure()
+                        return None
+        if state == "half_open":
+            # One caller probes; the rest stay on their fallback meanwhile.
+            if not self._probe_lock.acquire(blocking=False):
+                return None
+            try:
+                self._client.ping()
+            except Exception as exc:
+                logger.debug("Redis registry: probe failed (%s)", exc)
+                self.breaker.record_failure()
+                return None
+            finally:
+                self._probe_lock.release()
+            self.breaker.record_success()
+        return self._client
+
+    def get_async_client(self):
+        """
+        ``redis.asyncio`` client for the running event loop, sharing the
+        breaker with the sync client. Must be called from a coroutine.
+        """
+        if not (self.url and aioredis):
+            return None
+        state = self.breaker.state
+        if state == "open":
+            return None
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            try:
+                pool = aioredis.BlockingConnectionPool.from_url(
+                    self.url,
+                    max_connections=MAX_CONNECTIONS,
+                    timeout=POOL_TIMEOUT_SEC,
+                    health_check_interval=HEALTH_CHECK_INTERVAL_SEC,
+                    socket_timeout=SOCKET_TIMEOUT_SEC,
+                    socket_connect_timeout=SOCKET_CONNECT_TIMEOUT_SEC,
+                    socket_keepalive=True,
+                    decode_responses=True,
+                )
+            except Exception as exc:  # pragma: no cover - bad URL etc.
+                logger.warning("Redis registry: could not build async pool (%s)", exc)
+                self.breaker.record_failure()
+                return None
+            client = aioredis.Redis(connection_pool=pool)
+            self._async_clients[loop] = client
+        if state == "half_open":
+            # Callers cannot await a ping here: probe in the background and
+            # keep them on their fallback until it closes the breaker.
+            probe = self._async_probes.get(loop)
+            if probe is None or probe.done():
+                self._async_probes[loop] = loop.create_task(self._probe_async(client))
+            return None
+        return client
+
+    async def _probe_async(self, client):
+        try:
+            await client.ping()
+        except Exception as exc:
+            logger.debug("Redis registry: async probe failed (%s)", exc)
+            self.breaker.record_failure()
+            return
+        self.breaker.record_success()
+
+    def record_failure(self, exc: Optional[BaseException] = None):
+        if exc is not None:
+            logger.debug("Redis registry: command failed (%s)", exc)
+        self.breaker.record_failure()
+
+    def stats(self) -> Dict:
+        data = {
+            "configured": bool(self.url and redis),
+            "breaker": self.breaker.state,
+            "breaker_trips": self.breaker.trips,
+            "max_connections": MAX_CONNECTIONS,
+            "in_use": 0,
+            "created": 0,
+        }
+        pool = self._pool
+        if pool is not None:
+            data["created"] = len(getattr(pool, "_connections", []))
+            try:
+                data["in_use"] = pool.in_use()
+            except Exception:  # pragma: no cover - introspection only
+                pass
+            data.update(pool.stats.as_dict())
+        return data
+
+    def reset(self):
+        with self._lock:
+            if self._pool is not None:
+                try:
+                    self._pool.disconnect()
+                except Exception:  # pragma: no cover
+                    pass
+            self._pool = None
+            self._client = None
+            self._async_clients = weakref.WeakKeyDictionary()
+            self._async_probes = weakref.WeakKeyDictionary()
+            self.breaker = CircuitBreaker()
+
+
+registry = RedisRegistry()
+
+
+def get_redis():
+    """
+    Shared Redis client, or None when Redis is not configured or the circuit
+    breaker is open. Callers must keep their cache fallback.
+    """
+    return registry.get_client()
+
+
+def get_async_redis():
+    """
+    Shared ``redis.asyncio`` client for the current event loop, or None like
+    ``get_redis``.
+    """
+    return registry.get_async_client()
+
+
+def record_failure(exc: Optional[BaseException] = None):
+    registry.record_failure(exc)
+
+
+def pool_stats() -> Dict:
+    return registry.stats()
@@ -0,0 +1,158 @@
+"""
+Sequence-numbered replay buffer for broadcast frames.
+
+Every frame broadcast to an event's voters or admins gets the next sequence
+number of that (event, audience) stream and is kept in a ring of the last
+``REPLAY_BUFFER_SIZE`` frames: a Redis sorted set scored by sequence, or a
+process-local deque without Redis. A socket that reconnects with
+``last_seq`` is sent only the frames it missed; when the ring no longer
+reaches back that far the client is told to reload the snapshot instead.
+
+In Redis the sequence number is allocated and the frame buffered by one
+script, so a reader never sees a head whose frame is not yet in the ring.
+"""
+import json
+import logging
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .redis_registry import get_async_redis, get_redis, record_failure
+
+logger = logging.getLogger(__name__)
+
+REPLAY_BUFFER_SIZE = max(1, int(getattr(settings, "MOTION_REPLAY_BUFFER_SIZE", 500)))
+STREAM_TTL_SEC = 86400
+
+# KEYS: seq, frames; ARGV: frame JSON without "seq", ring size, ttl.
+# Splices the sequence number into the JSON object as its first member.
+_PUBLISH_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+local entry = '{"seq": ' .. seq .. ', ' .. string.sub(ARGV[1], 2)
+redis.call('ZADD', KEYS[2], seq, entry)
+redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -(tonumber(ARGV[2]) + 1))
+redis.call('EXPIRE', KEYS[2], tonumber(ARGV[3]))
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3]))
+return seq
+"""
+
+AUDIENCE_VOTERS = "voters"
+AUDIENCE_ADMINS = "admins"
+
+
+def _seq_key(event_id: int, audience: str) -> str:
+    return f"motions:stream:{event_id}:{audience}:seq"
+
+
+def _buffer_key(event_id: int, audience: str) -> str:
+    return f"motions:stream:{event_id}:{audience}:frames"
+
+
+def _missed(
+    head: int, oldest: Optional[int], entries: List[Dict[str, Any]], last_seq: int
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    ``entries`` (the buffered frames after ``last_seq``) when the buffer
+    covers the gap, or None when it does not or ``last_seq`` is ahead of the
+    stream (e.g. after a Redis flush).
+    """
+    if last_seq > head:
+        return None
+    if last_seq == head:
+        return []
+    if oldest is None or oldest > last_seq + 1:
+        return None
+    return entries
+
+
+class _LocalStream:
+    __slots__ = ("seq", "frames")
+
+    def __init__(self):
+        self.seq = 0
+        self.frames: Deque[Dict[str, Any]] = deque(maxlen=REPLAY_BUFFER_SIZE)
+
+
+class EventStream:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local: Dict[Tuple[int, str], _LocalStream] = {}
+
+    def publish(self, event_id: int, audience: str, event: str, payload: Dict[str, Any]) -> int:
+        """
+        Assign the next sequence number to a frame and buffer it.
+        """
+        client = get_redis()
+        if client:
+            try:
+                frame = json.dumps({"event": event, "payload": payload})
+                return int(
+                    client.register_script(_PUBLISH_SCRIPT)(
+                        keys=[_seq_key(event_id, audience), _buffer_key(event_id, audience)],
+                        args=[frame, REPLAY_BUFFER_SIZE, STREAM_TTL_SEC],
+                    )
+                )
+            except Exception as exc:  # pragma: no cover - fallback on runtime failure
+                record_failure(exc)
+                logger.debug("Event stream publish fallback to local buffer")
+        with self._lock:
+            stream = self._local.setdefault((event_id, audience), _LocalStream())
+            stream.seq += 1
+            stream.frames.append({"seq": stream.seq, "event": event, "payload": payload})
+            return stream.seq
+
+    async def since(
+        self, event_id: int, audience: str, last_seq: Optional[int]
+    ) -> Tuple[int, Optional[List[Dict[str, Any]]]]:
+        """
+        Current head of the stream and the frames after ``last_seq``; the
+        list is None when the client has to reload the snapshot.
+        """
+        client = get_async_redis()
+        if client:
+            try:
+                if last_seq is None:
+                    return int(await client.get(_seq_key(event_id, audience)) or 0), None
+                key = _buffer_key(event_id, audience)
+                # MULTI: head and ring are read at the same point in the stream.
+                async with client.pipeline(transaction=True) as pipe:
+                    pipe.get(_seq_key(event_id, audience))
+                    pipe.zrange(key, 0, 0, withscores=True)
+                    pipe.zrangebyscore(key, f"({last_seq}", "+inf")
+                    head, oldest, raw = await pipe.execute()
+                head = int(head or 0)
+                oldest_seq = int(oldest[0][1]) if oldest else None
+                return head, _missed(head, oldest_seq, [json.loads(item) for item in raw], last_seq)
+            except Exception as exc:  # pragma: no cover
+                record_failure(exc)
+                logger.debug("Event stream replay fallback to local buffer")
+        with self._lock:
+            stream = self._local.get((event_id, audience))
+            head = stream.seq if stream else 0
+            frames = list(stream.frames) if stream else []
+        if last_seq is None:
+            return head, None
+        oldest_seq = frames[0]["seq"] if frames else None
+        return head, _missed(head, oldest_seq, [f for f in frames if f["seq"] > last_seq], last_seq)
+
+    def clear(self, event_id: int):
+        with self._lock:
+            for audience in (AUDIENCE_VOTERS, AUDIENCE_ADMINS):
+                self._local.pop((event_id, audience), None)
+        client = get_redis()
+        if client:
+            try:
+                client.delete(
+                    *(
+                        key
+                        for audience in (AUDIENCE_VOTERS, AUDIENCE_ADMINS)
+                        for key in (_seq_key(event_id, audience), _buffer_key(event_id, audience))
+                    )
+                )
+            except Exception as exc:  # pragma: no cover
+                record_failure(exc)
+
+
+event_stream = EventStream()
@@ -0,0 +1,299 @@
+"""
+Server-side auto-close for motions with ``auto_close_seconds``.
+
+Deadlines live in an indexed queue: a Redis sorted set shared by every
+process, or an in-process heap when Redis is not configured. ``open_motion``
+and ``api_set_timer`` upsert the deadline and wake the worker, so extensions
+are picked up without scanning motion rows. The worker sleeps until the
+earliest deadline, claims it and closes the motion. The close itself is
+claimed in the database too, since per-process heaps all hold the deadline.
+"""
+import heapq
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import Motion
+from .payloads import closes_at
+from .redis_registry import get_redis, record_failure
+
+logger = logging.getLogger(__name__)
+
+DEADLINES_KEY = "motions:deadlines"
+WAKE_CHANNEL = "motions:deadlines:wake"
+# Upper bound on a single sleep so a lost wake-up is recovered quickly.
+MAX_SLEEP_SEC = 1.0
+# A close that raised is requeued after RETRY_BASE_SEC, doubling per failure.
+RETRY_BASE_SEC = float(getattr(settings, "MOTION_AUTOCLOSE_RETRY_BASE_SEC", 1.0))
+RETRY_MAX_SEC = float(getattr(settings, "MOTION_AUTOCLOSE_RETRY_MAX_SEC", 30.0))
+
+WORKER_THREAD = "thread"
+WORKER_COMMAND = "command"
+
+
+def worker_mode() -> str:
+    return getattr(settings, "MOTION_AUTOCLOSE_WORKER", WORKER_THREAD)
+
+
+class _LocalDeadlines:
+    """
+    Min-heap of (deadline, motion_id) with lazy deletion; ``_current`` holds
+    the live deadline for each motion so superseded heap entries are skipped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap: List[Tuple[float, int]] = []
+        self._current: Dict[int, float] = {}
+
+    def upsert(self, motion_id: int, deadline: float):
+        with self._lock:
+            self._current[motion_id] = deadline
+            heapq.heappush(self._heap, (deadline, motion_id))
+
+    def add(self, motion_id: int, deadline: float):
+        """Queue ``motion_id`` unless it already has a deadline."""
+        with self._lock:
+            if motion_id in self._current:
+                return
+            self._current[motion_id] = deadline
+            heapq.heappush(self._heap, (deadline, motion_id))
+
+    def remove(self, motion_id: int):
+        with self._lock:
+            self._current.pop(motion_id, None)
+
+    def _prune(self):
+        while self._heap and self._current.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def next_deadline(self) -> Optional[float]:
+        with self._lock:
+            self._prune()
+            return self._heap[0][0] if self._heap else None
+
+    def claim_due(self, now: float) -> List[int]:
+        claimed = []
+        with self._lock:
+            self._prune()
+            while self._heap and self._heap[0][0] <= now:
+                _, motion_id = heapq.heappop(self._heap)
+                self._current.pop(motion_id, None)
+                claimed.append(motion_id)
+                self._prune()
+        return claimed
+
+
+class AutoCloseScheduler:
+    def __init__(self):
+        self.local = _LocalDeadlines()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self.closed = 0
+        self.retries = 0
+        self.last_lag_ms: Optional[float] = None
+        # motion_id -> consecutive failed closes
+        self._failures: Dict[int, int] = {}
+
+    # -- queue maintenance -------------------------------------------------
+    def schedule(self, motion: Motion, start_worker: bool = True):
+        """
+        Register (or move) the deadline for an open motion. Motions without a
+        timer are removed from the queue.
+        """
+        deadline = closes_at(motion) if motion.status == Motion.STATUS_OPEN else None
+        if deadline is None:
+            self.unschedule(motion.id)
+            return
+        score = deadline.timestamp()
+        client = get_redis()
+        if client:
+            try:
+                pipe = client.pipeline()
+                pipe.zadd(DEADLINES_KEY, {str(motion.id): score})
+                pipe.publish(WAKE_CHANNEL, motion.id)
+                pipe.execute()
+            except Exception as exc:
+                record_failure(exc)
+                logger.warning("Auto-close: could not queue motion %s in Redis (%s)", motion.id, exc)
+                self.local.upsert(motion.id, score)
+        else:
+            self.local.upsert(motion.id, score)
+        self._wake.set()
+        if start_worker and worker_mode() == WORKER_THREAD:
+            self.ensure_started()
+
+    def unschedule(self, motion_id: int):
+        self._failures.pop(motion_id, None)
+        self.local.remove(motion_id)
+        client = get_redis()
+        if client:
+            try:
+                client.zrem(DEADLINES_KEY, str(motion_id))
+            except Exception as exc:  # pragma: no cover
+                record_failure(exc)
+        self._wake.set()
+
+    def bootstrap(self):
+        """
+        Rebuild the queue from open timed motions after a restart. Uses the
+        status index; only open motions are read.
+        """
+        for motion in Motion.objects.filter(
+            status=Motion.STATUS_OPEN, auto_close_seconds__isnull=False
+        ).exclude(opened_at=None):
+            self.schedule(motion, start_worker=False)
+
+    def _next_deadline(self, client) -> Optional[float]:
+        local = self.local.next_deadline()
+        if client:
+            try:
+                head = client.zrange(DEADLINES_KEY, 0, 0, withscores=True)
+                if head:
+                    remote = float(head[0][1])
+                    return remote if local is None else min(local, remote)
+            except Exception as exc:
+                record_failure(exc)
+        return local
+
+    def _claim_due(self, client, now: float) -> List[int]:
+        claimed = self.local.claim_due(now)
+        if client:
+            try:
+                for member in client.zrangebyscore(DEADLINES_KEY, "-inf", now):
+                    # ZREM succeeds for exactly one worker across processes.
+                    if client.zrem(DEADLINES_KEY, member):
+                        claimed.append(int(member))
+            except Exception as exc:
+                record_failure(exc)
+        return claimed
+
+    def _retry(self, client, motion_id: int, now: float) -> float:
+        """
+        Requeue a claimed deadline whose close raised. Uses ZADD NX / a local
+        add so a deadline moved meanwhile by ``schedule`` is left alone.
+        """
+        failures = self._failures.get(motion_id, 0) + 1
+        self._failures[motion_id] = failures
+        delay = min(RETRY_MAX_SEC, RETRY_BASE_SEC * 2 ** (failures - 1))
+        if client:
+            try:
+                client.zadd(DEADLINES_KEY, {str(motion_id): now + delay}, nx=True)
+                self.retries += 1
+                return delay
+            except Exception as exc:
+                record_failure(exc)
+        self.local.add(motion_id, now + delay)
+        self.retries += 1
+        return delay
+
+    # -- closing -----------------------------------------------------------
+    def close_due(self, motion_id: int, now: float) -> bool:
+        from .realtime import announce_motion_closed
+        from .services import close_motion
+        from .snapshot import rebuild_snapshot
+
+        motion = Motion.objects.filter(pk=motion_id).first()
+        if not motion or motion.status != Motion.STATUS_OPEN:
+            return False
+        deadline = closes_at(motion)
+        if deadline is None:
+            return False
+        if deadline.timestamp() > now:
+            # Extended in a process whose wake-up we missed; requeue.
+            self.schedule(motion, start_worker=False)
+            return False
+        # Without Redis every process holds its own queue; the database
+        # decides which of them closes and announces the motion.
+        counts = close_motion(motion, if_open=True)
+        if counts is None:
+            return False
+        rebuild_snapshot(motion.event_id)
+        announce_motion_closed(motion, counts)
+        self.closed += 1
+        self.last_lag_ms = round((time.time() - deadline.timestamp()) * 1000, 1)
+        logger.info("Auto-closed motion %s (%.1f ms after deadline)", motion_id, self.last_lag_ms)
+        return True
+
+    def run_pending(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        client = get_redis()
+        closed = 0
+        for motion_id in self._claim_due(client, now):
+            close_old_connections()
+            try:
+                closed += int(self.close_due(motion_id, now))
+            except Exception:
+                delay = self._retry(client, motion_id, now)
+                logger.exception("Auto-close failed for motion %s; retrying in %.0fs", motion_id, delay)
+            else:
+                self._failures.pop(motion_id, None)
+        return closed
+
+    # -- worker loop -------------------------------------------------------
+    def _sleep(self, pubsub, timeout: float):
+        timeout = max(0.0, min(timeout, MAX_SLEEP_SEC))
+        if pubsub is not None:
+            try:
+                pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+                return
+            except Exception as exc:
+                record_failure(exc)
+        if self._wake.wait(timeout):
+            self._wake.clear()
+
+    def run_forever(self):
+        close_old_connections()
+        try:
+            self.bootstrap()
+        except Exception:
+            logger.exception("Auto-close bootstrap failed")
+        pubsub = None
+        client = get_redis()
+        if client:
+            try:
+                pubsub = client.pubsub()
+                pubsub.subscribe(WAKE_CHANNEL)
+            except Exception as exc:
+                record_failure(exc)
+                pubsub = None
+        while not self._stop.is_set():
+            self.run_pending()
+            next_deadline = self._next_deadline(get_redis())
+            timeout = MAX_SLEEP_SEC if next_deadline is None else next_deadline - time.time()
+            self._sleep(pubsub, timeout)
+        if pubsub is not None:
+            pubsub.close()
+
+    def ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self.run_forever, name="motion-autoclose", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def stats(self) -> Dict:
+        return {
+            "worker": worker_mode(),
+            "closed": self.closed,
+            "retries": self.retries,
+            "last_lag_ms": self.last_lag_ms,
+        }
+
+
+scheduler = AutoCloseScheduler()
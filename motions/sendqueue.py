@@ -0,0 +1,148 @@
+"""
+Bounded per-connection send queues for the motion consumers.
+
+Consumers hand encoded frames to a ``SendQueue`` and return at once; a writer
+task drains it to the socket. When the queue reaches ``SEND_QUEUE_DEPTH``,
+queued state frames that a newer frame supersedes (an older
+``presence_update`` or tally for the same motion) are dropped. If that does
+not make room, or the oldest frame has waited longer than
+``SEND_STALL_SEC``, ``put`` returns False and the consumer disconnects the
+client with ``CLOSE_SLOW_CONSUMER``; it can reconnect and catch up through
+the replay buffer.
+"""
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, Union
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SEND_QUEUE_DEPTH = max(1, int(getattr(settings, "MOTION_SEND_QUEUE_DEPTH", 64)))
+SEND_STALL_SEC = float(getattr(settings, "MOTION_SEND_STALL_SEC", 30))
+
+# Application close code (4000-4999) for a client that cannot keep up.
+CLOSE_SLOW_CONSUMER = 4408
+
+Frame = Union[str, bytes]
+
+
+class SendQueueStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queues: "weakref.WeakSet[SendQueue]" = weakref.WeakSet()
+        self.frames = 0
+        self.superseded = 0
+        self.slow_disconnects = 0
+        self.max_depth = 0
+
+    def track(self, queue: "SendQueue"):
+        with self._lock:
+            self._queues.add(queue)
+
+    def add(self, frames: int = 0, superseded: int = 0, depth: int = 0):
+        with self._lock:
+            self.frames += frames
+            self.superseded += superseded
+            if depth > self.max_depth:
+                self.max_depth = depth
+
+    def disconnected(self):
+        with self._lock:
+            self.slow_disconnects += 1
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            depths = [len(queue) for queue in self._queues if not queue.closed]
+            return {
+                "limit": SEND_QUEUE_DEPTH,
+                "open": len(depths),
+                "queued": sum(depths),
+                "deepest": max(depths, default=0),
+                "max_depth": self.max_depth,
+                "frames": self.frames,
+                "superseded": self.superseded,
+                "slow_disconnects": self.slow_disconnects,
+            }
+
+
+queue_stats = SendQueueStats()
+
+
+class SendQueue:
+    def __init__(
+        self,
+        send: Callable[[Frame], Awaitable[None]],
+        max_depth: int = SEND_QUEUE_DEPTH,
+        stall: float = SEND_STALL_SEC,
+    ):
+        self._send = send
+        self.max_depth = max_depth
+        self.stall = stall
+        # (queued at, state key, frame)
+        self._items: Deque[Tuple[float, Optional[str], Frame]] = deque()
+        self._ready = asyncio.Event()
+        self.closed = False
+        queue_stats.track(self)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def put(self, frame: Frame, state_key: Optional[str] = None) -> bool:
+        """
+        Queue a frame; False means the client is too slow and must be closed.
+        """
+        if self.closed:
+            return True
+        now = time.monotonic()
+        if self._items and now - self._items[0][0] > self.stall:
+            return self._give_up("stalled")
+        if len(self._items) >= self.max_depth:
+            self._drop_superseded(state_key)
+            if len(self._items) >= self.max_depth:
+                return self._give_up("full")
+        self._items.append((now, state_key, frame))
+        self._ready.set()
+        queue_stats.add(frames=1, depth=len(self._items))
+        return True
+
+    def _drop_superseded(self, incoming: Optional[str]):
+        seen = {incoming} if incoming is not None else set()
+        kept: Deque[Tuple[float, Optional[str], Frame]] = deque()
+        for item in reversed(self._items):
+            key = item[1]
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+            kept.appendleft(item)
+        dropped = len(self._items) - len(kept)
+        if dropped:
+            self._items = kept
+            queue_stats.add(superseded=dropped)
+
+    def _give_up(self, reason: str) -> bool:
+        logger.info("Disconnecting slow consumer (%s, %d frames queued)", reason, len(self._items))
+        self.close()
+        queue_stats.disconnected()
+        return False
+
+    def close(self):
+        self.closed = True
+        self._items.clear()
+        self._ready.set()
+
+    async def run(self):
+        while True:
+            await self._ready.wait()
+            if self.closed:
+                return
+            if not self._items:
+                self._ready.clear()
+                continue
+            _, _, frame = self._items.popleft()
+            await self._send(frame)
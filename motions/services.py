@@ -1,18 +1,14 @@
 import logging
-import os
 from typing import Dict, Optional, Tuple
 
-from django.conf import settings
-from django.db import transaction
+from django.db import connection, transaction
 from django.db.models import Count
 from django.utils import timezone as tz
 
-try:
-    import redis  # type: ignore
-except Exception:  # pragma: no cover
-    redis = None
-
-from .models import Motion, MotionVote
+from . import ingest, reconcile
+from .models import Motion, MotionResult, MotionVote
+from .redis_registry import get_redis, record_failure, redis_url
+from .scheduler import scheduler
 
 logger = logging.getLogger(__name__)
 
@@ -24,14 +20,7 @@ CHOICE_KEYS = {
 
 
 def _redis_client():
-    url = os.environ.get("REDIS_URL") or getattr(settings, "REDIS_URL", None)
-    if not (url and redis):
-        return None
-    try:
-        return redis.from_url(url, decode_responses=True)
-    except Exception as exc:  # pragma: no cover
-        logger.warning("Redis unavailable for motion tallies (%s)", exc)
-        return None
+    return get_redis()
 
 
 def _tally_key(motion_id: int) -> str:
@@ -50,6 +39,7 @@ def _apply_delta(motion_id: int, delta: Dict[str, int]):
             pipe.execute()
             return
         except Exception as exc:  # pragma: no cover
+            record_failure(exc)
             logger.warning("Redis delta apply failed, falling back to memory (%s)", exc)
     # Fallback: keep a local cache dict in settings-level cache
     from django.core.cache import cache
@@ -65,12 +55,15 @@ def _set_counts(motion_id: int, counts: Dict[str, int]):
     key = _tally_key(motion_id)
     if client:
         try:
-            client.delete(key)
+            pipe = client.pipeline()
+            pipe.delete(key)
             if counts:
-                client.hset(key, mapping={k: int(v) for k, v in counts.items()})
-                client.expire(key, 86400)
+                pipe.hset(key, mapping={k: int(v) for k, v in counts.items()})
+                pipe.expire(key, 86400)
+            pipe.execute()
             return
-        except Exception:  # pragma: no cover
+        except Exception as exc:  # pragma: no cover
+            record_failure(exc)
             logger.debug("Redis set_counts fallback to cache")
     from django.core.cache import cache
 
@@ -84,7 +77,8 @@ def get_live_counts(motion_id: int) -> Dict[str, int]:
         try:
             raw = client.hgetall(key) or {}
             return {k: int(v) for k, v in raw.items()}
-        except Exception:  # pragma: no cover
+        except Exception as exc:  # pragma: no cover
+            record_failure(exc)
             logger.debug("Redis live counts fallback to cache")
     from django.core.cache import cache
 
@@ -106,46 +100,236 @@ def recompute_counts(motion: Motion) -> Dict[str, int]:
     return counts
 
 
-@transaction.atomic
+def freeze_result(motion: Motion) -> Dict[str, int]:
+    """
+    Aggregate the votes once and store them as the motion's final result.
+    """
+    counts = recompute_counts(motion)
+    MotionResult.objects.update_or_create(
+        motion=motion,
+        defaults={
+            "yes_count": counts.get(MotionVote.CHOICE_YES, 0),
+            "no_count": counts.get(MotionVote.CHOICE_NO, 0),
+            "abstain_count": counts.get(MotionVote.CHOICE_ABSTAIN, 0),
+            "frozen_at": tz.now(),
+        },
+    )
+    return counts
+
+
+def final_counts(motion: Motion) -> Dict[str, int]:
+    """
+    Counts for a closed motion from its frozen result; motions closed before
+    results were stored are frozen on first read.
+    """
+    result = MotionResult.objects.filter(motion_id=motion.id).first()
+    if result:
+        return result.as_counts()
+    if motion.status == Motion.STATUS_CLOSED:
+        return freeze_result(motion)
+    return recompute_counts(motion)
+
+
+# Vote outcomes shared by the write-behind script and the database upsert.
+VOTE_LOCKED = 0
+VOTE_UNCHANGED = 1
+VOTE_CREATED = 2
+VOTE_CHANGED = 3
+# Write-behind only: the motion was closed in Redis before the cast landed.
+VOTE_CLOSED = ingest.CAST_CLOSED
+
+
+def _vote_result(status: int, choice: str, previous: Optional[str]) -> Tuple[bool, Dict]:
+    if status == ingest.CAST_NOT_SEEDED:
+        return False, {"error": "vote_unavailable"}
+    if status == VOTE_CLOSED:
+        return False, {"error": "motion_closed"}
+    if status == VOTE_LOCKED:
+        return False, {"error": "vote_locked", "choice": previous}
+    if status == VOTE_UNCHANGED:
+        return True, {"choice": choice, "changed": False, "created": False}
+    if status == VOTE_CHANGED:
+        return True, {"choice": choice, "previous": previous, "changed": True, "created": False}
+    return True, {"choice": choice, "created": True, "changed": False}
+
+
+def _record_vote_write_behind(motion: Motion, voter_id: str, choice: str) -> Tuple[bool, Dict]:
+    """
+    Cast through the Redis buffer. Never falls back to the database: votes
+    written there while Redis holds the motion's choices would disagree with
+    the buffer and be overwritten by the next flush. The voter retries.
+    """
+    client = _redis_client()
+    if not client:
+        return False, {"error": "vote_unavailable"}
+    try:
+        status, previous = ingest.cast(client, motion, voter_id, choice, _tally_key(motion.id))
+        if status == ingest.CAST_NOT_SEEDED:
+            # Redis was unreachable when the motion opened.
+            stored = dict(MotionVote.objects.filter(motion=motion).values_list("voter_id", "choice"))
+            ingest.seed_choices(motion.id, stored, force=False)
+            status, previous = ingest.cast(client, motion, voter_id, choice, _tally_key(motion.id))
+    except Exception as exc:
+        record_failure(exc)
+        logger.warning("Write-behind cast failed (%s)", exc)
+        return False, {"error": "vote_unavailable"}
+    return _vote_result(status, choice, previous)
+
+
 def record_vote(motion: Motion, voter_id: str, choice: str) -> Tuple[bool, Dict]:
     if motion.status != Motion.STATUS_OPEN:
         return False, {"error": "motion_closed"}
     if choice not in CHOICE_KEYS:
         return False, {"error": "invalid_choice"}
+    if ingest.write_behind_enabled() and redis_url():
+        return _record_vote_write_behind(motion, voter_id, choice)
+    return _record_vote_db(motion, voter_id, choice)
+
+
+# One statement: lock and read the previous choice, then insert the vote or
+# change it. The update is conditioned on ``prev`` having found the row, so
+# it depends on that read rather than on the order sibling CTEs run in: when
+# a concurrent first vote by the same voter commits after this statement's
+# snapshot, ``prev`` is empty, the conflicting row is left alone and nothing
+# is written. Both CTEs lock the same row, so ``prev`` is the choice replaced.
+_UPSERT_VOTE_SQL = """
+WITH prev AS (
+    SELECT choice FROM {table}
+    WHERE motion_id = %s AND voter_id = %s
+    FOR UPDATE
+), written AS (
+    INSERT INTO {table} (motion_id, voter_id, choice, created_at, updated_at)
+    VALUES (%s, %s, %s, %s, %s)
+    ON CONFLICT (motion_id, voter_id) DO UPDATE
+        SET choice = EXCLUDED.choice, updated_at = EXCLUDED.updated_at
+        WHERE %s AND {table}.choice <> EXCLUDED.choice AND EXISTS (SELECT 1 FROM prev)
+    RETURNING (xmax = 0) AS inserted
+)
+SELECT (SELECT choice FROM prev), (SELECT inserted FROM written)
+"""
+
+
+def _upsert_vote_returning(motion: Motion, voter_id: str, choice: str) -> Optional[Tuple[int, Optional[str]]]:
+    """
+    PostgreSQL upsert in a single statement and round trip. Returns None,
+    having written nothing, when a concurrent first vote by the same voter
+    hides the previous choice; the caller then uses the locking path.
+    """
+    table = connection.ops.quote_name(MotionVote._meta.db_table)
+    now = tz.now()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            _UPSERT_VOTE_SQL.format(table=table),
+            [motion.id, voter_id, motion.id, voter_id, choice, now, now, motion.allow_vote_change],
+        )
+        previous, inserted = cursor.fetchone()
+    if inserted is True:
+        return VOTE_CREATED, None
+    if previous is None:
+        return None
+    if inserted is False:
+        return VOTE_CHANGED, previous
+    if not motion.allow_vote_change:
+        return VOTE_LOCKED, previous
+    if previous == choice:
+        return VOTE_UNCHANGED, previous
+    return None
 
+
+@transaction.atomic
+def _upsert_vote_locked(motion: Motion, voter_id: str, choice: str) -> Tuple[int, Optional[str]]:
+    """
+    Portable upsert: lock the row, then create or change it. Used on SQLite
+    and when a concurrent first vote hides the previous choice from the
+    PostgreSQL upsert.
+    """
     existing = (
         MotionVote.objects.select_for_update().filter(motion=motion, voter_id=voter_id).first()
     )
-    if existing:
-        if not motion.allow_vote_change:
-            return False, {"error": "vote_locked", "choice": existing.choice}
-        if existing.choice == choice:
-            return True, {
-                "choice": choice,
-                "changed": False,
-                "created": False,
-            }
-        prev_choice = existing.choice
-        existing.choice = choice
-        existing.save(update_fields=["choice", "updated_at"])
-        _apply_delta(motion.id, {CHOICE_KEYS[choice]: 1, CHOICE_KEYS[prev_choice]: -1})
-        return True, {
-            "choice": choice,
-            "previous": prev_choice,
-            "changed": True,
-            "created": False,
-        }
-
-    MotionVote.objects.create(motion=motion, voter_id=voter_id, choice=choice)
-    _apply_delta(motion.id, {CHOICE_KEYS[choice]: 1})
-    return True, {"choice": choice, "created": True, "changed": False}
+    if existing is None:
+        MotionVote.objects.create(motion=motion, voter_id=voter_id, choice=choice)
+        return VOTE_CREATED, None
+    if not motion.allow_vote_change:
+        return VOTE_LOCKED, existing.choice
+    if existing.choice == choice:
+        return VOTE_UNCHANGED, existing.choice
+    previous = existing.choice
+    existing.choice = choice
+    existing.save(update_fields=["choice", "updated_at"])
+    return VOTE_CHANGED, previous
+
+
+def upsert_vote(motion: Motion, voter_id: str, choice: str) -> Tuple[int, Optional[str]]:
+    """
+    Insert or change the voter's MotionVote row. Returns ``(status, previous
+    choice)`` using the ``VOTE_*`` codes.
+    """
+    if connection.vendor == "postgresql":
+        outcome = _upsert_vote_returning(motion, voter_id, choice)
+        if outcome is not None:
+            return outcome
+    return _upsert_vote_locked(motion, voter_id, choice)
+
+
+def _record_vote_db(motion: Motion, voter_id: str, choice: str) -> Tuple[bool, Dict]:
+    status, previous = upsert_vote(motion, voter_id, choice)
+    if status == VOTE_CREATED:
+        _apply_delta(motion.id, {CHOICE_KEYS[choice]: 1})
+    elif status == VOTE_CHANGED:
+        _apply_delta(motion.id, {CHOICE_KEYS[choice]: 1, CHOICE_KEYS[previous]: -1})
+    return _vote_result(status, choice, previous)
+
+
+def get_selection(motion: Motion, voter_id: str) -> Optional[str]:
+    """
+    The voter's current choice on a motion, including votes still waiting in
+    the write-behind buffer.
+    """
+    if ingest.write_behind_enabled() and motion.status == Motion.STATUS_OPEN:
+        pending = ingest.get_choice(motion.id, voter_id)
+        if pending:
+            return pending
+    return (
+        MotionVote.objects.filter(motion=motion, voter_id=voter_id)
+        .values_list("choice", flat=True)
+        .first()
+    )
+
+
+def get_selections(voter_id: str, open_motion_id: Optional[int] = None, *motion_ids: int) -> Dict[int, str]:
+    """
+    The voter's choices on several motions in one query. The open motion is
+    answered from the write-behind buffer first when that mode is on.
+    """
+    selections: Dict[int, str] = {}
+    lookup = [mid for mid in motion_ids if mid]
+    if open_motion_id:
+        pending = ingest.get_choice(open_motion_id, voter_id) if ingest.write_behind_enabled() else None
+        if pending:
+            selections[open_motion_id] = pending
+        else:
+            lookup.append(open_motion_id)
+    if lookup:
+        selections.update(
+            MotionVote.objects.filter(motion_id__in=lookup, voter_id=voter_id).values_list(
+                "motion_id", "choice"
+            )
+        )
+    return selections
 
 
 def ensure_only_one_open(event, target_motion: Motion):
     now = tz.now()
-    Motion.objects.filter(event=event, status=Motion.STATUS_OPEN).exclude(pk=target_motion.pk).update(
-        status=Motion.STATUS_CLOSED, closed_at=now
-    )
+    others = Motion.objects.filter(event=event, status=Motion.STATUS_OPEN).exclude(pk=target_motion.pk)
+    other_ids = list(others.values_list("id", flat=True))
+    if ingest.write_behind_enabled():
+        for other_id in other_ids:
+            ingest.mark_closed(other_id)
+            ingest.drain(other_id)
+    others.update(status=Motion.STATUS_CLOSED, closed_at=now)
+    for other in Motion.objects.filter(pk__in=other_ids):
+        freeze_result(other)
+        scheduler.unschedule(other.id)
 
 
 def open_motion(motion: Motion):
@@ -155,23 +339,62 @@ def open_motion(motion: Motion):
         Motion.objects.filter(pk=motion.pk).update(
             status=Motion.STATUS_OPEN, opened_at=now, closed_at=None
         )
+        MotionResult.objects.filter(motion=motion).delete()
         motion.refresh_from_db()
         # Reset counters for a fresh open, seeding from DB if votes exist
         counts = recompute_counts(motion)
         _set_counts(motion.id, counts)
+    if ingest.write_behind_enabled():
+        ingest.seed_choices(
+            motion.id,
+            dict(MotionVote.objects.filter(motion=motion).values_list("voter_id", "choice")),
+        )
+    scheduler.schedule(motion)
+    if reconcile.worker_mode() == reconcile.WORKER_THREAD:
+        reconcile.reconciler.ensure_started()
     return motion
 
 
-def close_motion(motion: Motion) -> Dict[str, int]:
+def close_motion(motion: Motion, if_open: bool = False) -> Optional[Dict[str, int]]:
+    """
+    Close and freeze the motion. In write-behind mode raises
+    ``ingest.DrainError`` and leaves the motion open if buffered votes could
+    not all be written; closing again retries the drain.
+
+    With ``if_open`` the close is claimed in the database: only a motion
+    still open is closed, and None is returned when another process got
+    there first, so exactly one caller announces it.
+    """
     now = tz.now()
+    if ingest.write_behind_enabled():
+        # Stop accepting buffered votes, then make the database authoritative.
+        ingest.mark_closed(motion.id)
+        ingest.drain(motion.id)
     with transaction.atomic():
-        Motion.objects.filter(pk=motion.pk).update(status=Motion.STATUS_CLOSED, closed_at=now)
+        motions = Motion.objects.filter(pk=motion.pk)
+        if if_open:
+            motions = motions.filter(status=Motion.STATUS_OPEN)
+        if not motions.update(status=Motion.STATUS_CLOSED, closed_at=now):
+            return None
         motion.refresh_from_db()
-        counts = recompute_counts(motion)
+        counts = freeze_result(motion)
+    scheduler.unschedule(motion.id)
     return counts
 
 
 def reset_motion_votes(motion: Motion):
+    if not ingest.write_behind_enabled():
+        _delete_votes(motion)
+        return
+    # Buffer first, and under the flush lease: a flush that already read
+    # buffered votes would otherwise write them back after the delete.
+    with ingest.flush_paused(motion.id):
+        ingest.clear(motion.id)
+        _delete_votes(motion)
+
+
+def _delete_votes(motion: Motion):
     with transaction.atomic():
         MotionVote.objects.filter(motion=motion).delete()
+        MotionResult.objects.filter(motion=motion).delete()
         _set_counts(motion.id, {})
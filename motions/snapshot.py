@@ -0,0 +1,229 @@
+"""
+Versioned per-event snapshot of the voter-facing motion state.
+
+The snapshot holds the open motion, the latest revealed closed motion and the
+preview payload. It is rebuilt by the moderator actions that change that state
+(open, close, reveal, hide, preview, timer) and served as-is to
+``voter_portal`` and ``api_current_motion``; only the voter's own selection is
+looked up per request.
+
+The snapshot is stored in Redis, or in the Django cache when that is shared
+between processes. With neither, a stored copy would only be rebuilt in the
+process that handled the moderator action, so every read is built from the
+database instead.
+"""
+import json
+import logging
+from typing import Dict, Optional
+
+from django.core.cache import cache
+from django.utils import timezone as tz
+
+from .models import Motion
+from .payloads import closes_at, motion_payload
+from .redis_registry import cache_is_shared, get_redis, record_failure
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_CACHE_TIMEOUT = 3600
+SNAPSHOT_TIMEOUT = 86400
+# Cache fallback: how many versions below the latest to look for a finished build.
+CACHE_VERSION_LOOKBACK = 4
+
+# KEYS: snapshot hash; ARGV: version, data, ttl. Never overwrite a newer build.
+_STORE_SCRIPT = """
+local cur = redis.call('HGET', KEYS[1], 'version')
+if cur and tonumber(cur) >= tonumber(ARGV[1]) then
+  return 0
+end
+redis.call('HSET', KEYS[1], 'version', ARGV[1], 'data', ARGV[2])
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3]))
+return 1
+"""
+
+
+def _preview_cache_key(event_id: int) -> str:
+    return f"motions_preview_{event_id}"
+
+
+def _snapshot_key(event_id: int) -> str:
+    return f"motions:snapshot:{event_id}"
+
+
+def _version_key(event_id: int) -> str:
+    return f"motions:snapshot:{event_id}:version"
+
+
+def _cache_snapshot_key(event_id: int, version: int) -> str:
+    return f"motions:snapshot:{event_id}:v{version}"
+
+
+def set_preview(event_id: int, payload: Dict):
+    key = _preview_cache_key(event_id)
+    client = get_redis()
+    if client:
+        try:
+            client.set(key, json.dumps(payload), ex=PREVIEW_CACHE_TIMEOUT)
+            return
+        except Exception as exc:  # pragma: no cover
+            record_failure(exc)
+            logger.debug("Redis preview set fallback to cache")
+    cache.set(key, payload, timeout=PREVIEW_CACHE_TIMEOUT)
+
+
+def clear_preview(event_id: int):
+    key = _preview_cache_key(event_id)
+    client = get_redis()
+    if client:
+        try:
+            client.delete(key)
+        except Exception as exc:  # pragma: no cover
+            record_failure(exc)
+    cache.delete(key)
+
+
+def get_preview(event_id: int) -> Optional[Dict]:
+    key = _preview_cache_key(event_id)
+    client = get_redis()
+    if client:
+        try:
+            raw = client.get(key)
+            return json.loads(raw) if raw else None
+        except Exception as exc:  # pragma: no cover
+            record_failure(exc)
+            logger.debug("Redis preview get fallback to cache")
+    cached = cache.get(key)
+    if not cached:
+        return None
+    return cached.copy()
+
+
+def _preview_payload(event_id: int) -> Optional[Dict]:
+    """
+    Resolve the cached preview against the current motion row so edits and
+    reveals since the preview was pushed are reflected.
+    """
+    from .services import final_counts
+
+    preview = get_preview(event_id)
+    if not preview or "id" not in preview:
+        return None
+    motion = Motion.objects.filter(pk=preview["id"], event_id=event_id).first()
+    if motion is None:
+        clear_preview(event_id)
+        return None
+    payload = motion_payload(motion)
+    payload["preview"] = motion.status == Motion.STATUS_DRAFT
+    if motion.status == Motion.STATUS_CLOSED and motion.reveal_results:
+        payload["counts"] = final_counts(motion)
+    return payload
+
+
+def build_snapshot(event_id: int) -> Dict:
+    from .services import final_counts
+
+    open_motion = (
+        Motion.objects.filter(event_id=event_id, status=Motion.STATUS_OPEN)
+        .order_by("display_order", "id")
+        .first()
+    )
+    latest_closed = (
+        Motion.objects.filter(event_id=event_id, status=Motion.STATUS_CLOSED)
+        .order_by("-closed_at", "-id")
+        .first()
+    )
+    data: Dict[str, Optional[Dict]] = {"open": None, "latest_closed": None, "preview": None}
+    if open_motion:
+        data["open"] = motion_payload(open_motion)
+        deadline = closes_at(open_motion)
+        data["open"]["closes_at"] = deadline.isoformat() if deadline else None
+        clear_preview(event_id)
+    else:
+        data["preview"] = _preview_payload(event_id)
+    if latest_closed and latest_closed.reveal_results:
+        data["latest_closed"] = motion_payload(latest_closed)
+        data["latest_closed"]["counts"] = final_counts(latest_closed)
+    return data
+
+
+def _next_version(event_id: int, client) -> int:
+    if client:
+        try:
+            return int(client.incr(_version_key(event_id)))
+        except Exception as exc:  # pragma: no cover
+            record_failure(exc)
+    key = _version_key(event_id)
+    cache.add(key, 0, timeout=None)
+    try:
+        return int(cache.incr(key))
+    except ValueError:  # pragma: no cover - evicted between add and incr
+        cache.set(key, 1, timeout=None)
+        return 1
+
+
+def rebuild_snapshot(event_id: int) -> Dict:
+    """
+    Rebuild and store the snapshot with a new version. Call after any
+    moderator action that changes what voters see.
+    """
+    client = get_redis()
+    version = _next_version(event_id, client)
+    data = build_snapshot(event_id)
+    data["version"] = version
+    encoded = json.dumps(data)
+    if client:
+        try:
+            client.register_script(_STORE_SCRIPT)(
+                keys=[_snapshot_key(event_id)], args=[version, encoded, SNAPSHOT_TIMEOUT]
+            )
+            return data
+        except Exception as exc:  # pragma: no cover
+            record_failure(exc)
+            logger.debug("Redis snapshot store fallback to cache")
+    if cache_is_shared():
+        # One key per version: a slow build can never overwrite a newer one.
+        cache.add(_cache_snapshot_key(event_id, version), data, timeout=SNAPSHOT_TIMEOUT)
+    return data
+
+
+def _cached_snapshot(event_id: int) -> Optional[Dict]:
+    """Newest finished build among the last few versions in the Django cache."""
+    latest = cache.get(_version_key(event_id))
+    if not latest:
+        return None
+    versions = range(int(latest), max(0, int(latest) - CACHE_VERSION_LOOKBACK), -1)
+    found = cache.get_many([_cache_snapshot_key(event_id, version) for version in versions])
+    for version in versions:
+        data = found.get(_cache_snapshot_key(event_id, version))
+        if data is not None:
+            return data
+    return None
+
+
+def get_snapshot(event_id: int) -> Dict:
+    """
+    Current snapshot for an event, built on first use. Returns a fresh copy
+    whose open payload carries the current ``server_now``.
+    """
+    data = None
+    shared = cache_is_shared()
+    client = get_redis()
+    if client:
+        try:
+            raw = client.hget(_snapshot_key(event_id), "data")
+            data = json.loads(raw) if raw else None
+            shared = True
+        except Exception as exc:  # pragma: no cover
+            record_failure(exc)
+    if data is None and not shared:
+        # Rebuilds in other processes are invisible here; read the database.
+        data = build_snapshot(event_id)
+        data["version"] = cache.get(_version_key(event_id), 0)
+    if data is None:
+        # Django caches hand back an unpickled copy.
+        data = _cached_snapshot(event_id)
+    if data is None:
+        data = rebuild_snapshot(event_id)
+    if data.get("open"):
+        data["open"]["server_now"] = tz.now().isoformat()
+    return data
@@ -0,0 +1,176 @@
+"""
+Server-Sent Events stream of voter broadcasts for read-only displays.
+
+Projector screens and kiosks only consume events, so they get an SSE stream
+instead of a voter WebSocket: no heartbeats, no presence, no channel-layer
+registration per client. Each process holds one feed per event: a single
+channel joined to ``voter_group`` whose frames are fanned out to the
+in-process queues of every open stream. Streams resume from
+``Last-Event-ID`` through the replay buffer, or start from the snapshot.
+"""
+import asyncio
+import json
+import logging
+import weakref
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .realtime import voter_group
+from .replay import AUDIENCE_VOTERS, event_stream
+from .snapshot import get_snapshot
+from .wire import encode_text
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_SEC = float(getattr(settings, "MOTION_SSE_KEEPALIVE_SEC", 15))
+QUEUE_SIZE = int(getattr(settings, "MOTION_SSE_QUEUE_SIZE", 256))
+
+# Queued in place of a frame to end a stream that fell too far behind; the
+# browser reconnects with Last-Event-ID and catches up from the replay buffer.
+_OVERFLOW = None
+
+
+def _sse(event: str, data: str, seq: Optional[int] = None) -> str:
+    lines = [f"event: {event}"]
+    if seq is not None:
+        lines.append(f"id: {seq}")
+    lines.extend(f"data: {line}" for line in data.splitlines() or [""])
+    return "\n".join(lines) + "\n\n"
+
+
+def _frame_text(frame: Dict[str, Any]) -> str:
+    return frame.get("text") or encode_text(frame.get("event"), frame.get("payload"), frame.get("seq"))
+
+
+class _EventFeed:
+    __slots__ = ("channel_name", "queues", "reader")
+
+    def __init__(self):
+        self.channel_name: Optional[str] = None
+        self.queues: Set[asyncio.Queue] = set()
+        self.reader: Optional[asyncio.Task] = None
+
+
+class DisplayHub:
+    """
+    Per-event-loop owner of the display feeds.
+    """
+
+    def __init__(self, layer):
+        self.layer = layer
+        self._feeds: Dict[int, _EventFeed] = {}
+        self.delivered = 0
+        self.overflows = 0
+
+    async def subscribe(self, event_id: int) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        feed = self._feeds.get(event_id)
+        if feed is None:
+            feed = self._feeds[event_id] = _EventFeed()
+            feed.queues.add(queue)
+            feed.channel_name = await self.layer.new_channel("motions.display.")
+            await self.layer.group_add(voter_group(event_id), feed.channel_name)
+            feed.reader = asyncio.ensure_future(self._read(feed))
+        else:
+            feed.queues.add(queue)
+        return queue
+
+    async def unsubscribe(self, event_id: int, queue: asyncio.Queue):
+        feed = self._feeds.get(event_id)
+        if feed is None:
+            return
+        feed.queues.discard(queue)
+        if feed.queues:
+            return
+        del self._feeds[event_id]
+        if feed.reader:
+            feed.reader.cancel()
+        if feed.channel_name:
+            try:
+                await self.layer.group_discard(voter_group(event_id), feed.channel_name)
+            except Exception:  # pragma: no cover
+                logger.debug("Display feed group_discard failed", exc_info=True)
+
+    async def _read(self, feed: _EventFeed):
+        while True:
+            message = await self.layer.receive(feed.channel_name)
+            if message.get("type") == "push.batch":
+                frames = message.get("frames") or []
+            else:
+                frames = [message]
+            for queue in list(feed.queues):
+                for frame in frames:
+                    try:
+                        queue.put_nowait(frame)
+                        self.delivered += 1
+                    except asyncio.QueueFull:
+                        self.overflows += 1
+                        while not queue.empty():
+                            queue.get_nowait()
+                        queue.put_nowait(_OVERFLOW)
+                        break
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "feeds": len(self._feeds),
+            "streams": sum(len(feed.queues) for feed in self._feeds.values()),
+            "delivered": self.delivered,
+            "overflows": self.overflows,
+        }
+
+
+_hubs: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, DisplayHub]" = weakref.WeakKeyDictionary()
+
+
+def get_hub() -> DisplayHub:
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = DisplayHub(get_channel_layer())
+    return hub
+
+
+def display_stats() -> Dict[str, int]:
+    totals = {"feeds": 0, "streams": 0, "delivered": 0, "overflows": 0}
+    for hub in list(_hubs.values()):
+        for key, value in hub.stats().items():
+            totals[key] += value
+    return totals
+
+
+async def display_stream(event_id: int, last_seq: Optional[int]) -> AsyncIterator[str]:
+    """
+    SSE body for one display: missed frames after ``last_seq`` (or a
+    ``snapshot`` event when they cannot be replayed), then live frames.
+    """
+    hub = get_hub()
+    queue = await hub.subscribe(event_id)
+    try:
+        head, missed = await event_stream.since(event_id, AUDIENCE_VOTERS, last_seq)
+        replayed: Set[int] = set()
+        if missed is None:
+            snapshot = await sync_to_async(get_snapshot)(event_id)
+            yield _sse("snapshot", json.dumps(snapshot), head)
+        else:
+            for entry in missed:
+                seq = entry["seq"]
+                replayed.add(seq)
+                yield _sse(entry["event"], encode_text(entry["event"], entry["payload"], seq), seq)
+        while True:
+            try:
+                frame = await asyncio.wait_for(queue.get(), KEEPALIVE_SEC)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if frame is _OVERFLOW:
+                return
+            seq = frame.get("seq")
+            if seq in replayed:
+                replayed.discard(seq)
+                continue
+            yield _sse(frame.get("event"), _frame_text(frame), seq)
+    finally:
+        await hub.unsubscribe(event_id, queue)
@@ -5,6 +5,7 @@
   const sessionUuid = configEl.dataset.session;
   const wsPath = configEl.dataset.ws;
   const tallyUrl = configEl.dataset.tallyUrl;
+  const attendanceUrl = configEl.dataset.attendanceUrl;
   const closeBase = configEl.dataset.closeBase;
   const revealBase = configEl.dataset.revealBase;
   const hideBase = configEl.dataset.hideBase;
@@ -12,6 +13,7 @@
   const previewBase = configEl.dataset.previewBase;
 
   const presenceEl = document.getElementById("presence");
+  const presencePeakEl = document.getElementById("presence-peak");
   const votesEl = document.getElementById("votes-count");
   const tallyYes = document.getElementById("tally-yes");
   const tallyNo = document.getElementById("tally-no");
@@ -40,6 +42,9 @@
   let selectedMotionId = null;
   let openMotionId = null;
   let lastPreviewBroadcastId = null;
+  // Highest broadcast sequence seen; sent on reconnect so the server replays
+  // the admin frames that were missed while the socket was down.
+  let lastSeq = null;
 
   const motionMap = new Map();
   const motionCounts = new Map();
@@ -259,7 +264,8 @@
 
   function connectSocket() {
     const scheme = location.protocol === "https:" ? "wss" : "ws";
-    socket = new WebSocket(`${scheme}://${location.host}${wsPath}`);
+    const resume = lastSeq === null ? "" : `?last_seq=${lastSeq}`;
+    socket = new WebSocket(`${scheme}://${location.host}${wsPath}${resume}`);
     socket.onopen = () => {
       reconnectAttempts = 0;
       startHeartbeat();
@@ -277,6 +283,9 @@
     socket.onmessage = (event) => {
       try {
         const data = JSON.parse(event.data);
+        if (typeof data.seq === "number" && (lastSeq === null || data.seq > lastSeq)) {
+          lastSeq = data.seq;
+        }
         handleEvent(data.event, data.payload || {});
       } catch (err) {
         console.error("Bad WS payload", err);
@@ -286,6 +295,18 @@
 
   function handleEvent(event, payload) {
     switch (event) {
+      case "connection":
+        // Missed frames follow unless the server could not replay them all.
+        // The motion list is rendered server-side, so a gap after a
+        // reconnect reloads the page; on first connect the page is current.
+        if (payload.resync) {
+          if (lastSeq !== null) {
+            window.location.reload();
+            break;
+          }
+          if (typeof payload.seq === "number") lastSeq = payload.seq;
+        }
+        break;
       case "motion_opened":
         if (payload && payload.id) {
           const merged = { ...(motionMap.get(payload.id) || {}), ...payload, status: "open", closed_at: null };
@@ -477,6 +498,18 @@
     tallyTimer = null;
   }
 
+  function fetchAttendance() {
+    if (!attendanceUrl || !presencePeakEl) return;
+    const since = Math.floor(Date.now() / 1000) - 3600;
+    fetch(`${attendanceUrl}?resolution=minute&since=${since}`, { headers: { "Cache-Control": "no-cache" } })
+      .then((res) => (res.ok ? res.json() : null))
+      .then((data) => {
+        if (!data || !Array.isArray(data.points) || !data.points.length) return;
+        presencePeakEl.textContent = Math.max(...data.points.map((point) => point.max));
+      })
+      .catch(() => {});
+  }
+
   async function setTimer(seconds, extend) {
     if (!selectedMotionId) return;
     const url = `${timerBase}${selectedMotionId}/timer/`;
@@ -641,4 +674,6 @@
 
   connectSocket();
   startPollingTallies();
+  fetchAttendance();
+  setInterval(fetchAttendance, 60000);
 })();
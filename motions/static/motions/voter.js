@@ -61,8 +61,14 @@
   const helpClose = document.getElementById("help-close");
 
   let socket = null;
+  const pendingCasts = new Map();
+  const CAST_TIMEOUT_MS = 4000;
+  let castSeq = 0;
   let heartbeatTimer = null;
   let reconnectAttempts = 0;
+  // Highest broadcast sequence seen; sent on reconnect so the server replays
+  // only what was missed instead of the page reloading state.
+  let lastSeq = null;
   let pollTimer = null;
   let staleCheckTimer = null;
   let lastMessageAt = Date.now();
@@ -282,7 +288,8 @@
 
   function connectSocket() {
     const scheme = location.protocol === "https:" ? "wss" : "ws";
-    socket = new WebSocket(`${scheme}://${location.host}${wsPath}`);
+    const resume = lastSeq === null ? "" : `?last_seq=${lastSeq}`;
+    socket = new WebSocket(`${scheme}://${location.host}${wsPath}${resume}`);
     socket.onopen = () => {
       setStatus("connected", "Connected");
       reconnectAttempts = 0;
@@ -290,27 +297,33 @@
       startStaleCheck();
       startResync();
       stopPolling();
-      fetchState();
     };
-    socket.onclose = () => {
+    socket.onclose = (event) => {
       setStatus("reconnecting", "Reconnecting…");
       stopHeartbeat();
       stopStaleCheck();
       stopResync();
-      startPolling();
+      if (event.code === 4429) {
+        // Server is admitting a reconnect storm; come back when told to.
+        const match = /retry_after_ms=(\d+)/.exec(event.reason || "");
+        setTimeout(() => connectSocket(), match ? Number(match[1]) : 2000);
+        return;
+      }
       scheduleReconnect();
     };
     socket.onerror = () => {
       setStatus("reconnecting", "Reconnecting…");
       stopStaleCheck();
       stopResync();
-      startPolling();
       socket.close();
     };
     socket.onmessage = (event) => {
       try {
         const data = JSON.parse(event.data);
         markActivity();
+        if (typeof data.seq === "number" && (lastSeq === null || data.seq > lastSeq)) {
+          lastSeq = data.seq;
+        }
         handleEvent(data.event, data.payload || {});
       } catch (err) {
         console.error("Bad WS payload", err);
@@ -494,23 +507,60 @@
     lastClosedMotionId = null;
   }
 
+  function castOverSocket(motionId, choice) {
+    return new Promise((resolve, reject) => {
+      if (!socket || socket.readyState !== WebSocket.OPEN) {
+        reject(new Error("Socket not open"));
+        return;
+      }
+      castSeq += 1;
+      const ref = castSeq;
+      const timer = setTimeout(() => {
+        pendingCasts.delete(ref);
+        reject(new Error("Cast timed out"));
+      }, CAST_TIMEOUT_MS);
+      pendingCasts.set(ref, { resolve, timer });
+      socket.send(JSON.stringify({ type: "cast", motion_id: motionId, choice, ref }));
+    });
+  }
+
+  function settleCast(payload, ok) {
+    if (!payload || payload.ref === undefined) return;
+    const pending = pendingCasts.get(payload.ref);
+    if (!pending) return;
+    clearTimeout(pending.timer);
+    pendingCasts.delete(payload.ref);
+    pending.resolve({ ...payload, ok });
+  }
+
+  async function castOverHttp(motionId, choice) {
+    const res = await fetch(`${voteBase}${motionId}/vote/`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/x-www-form-urlencoded",
+        "X-CSRFToken": getCsrfToken(),
+      },
+      body: `choice=${encodeURIComponent(choice)}`,
+    });
+    const data = await res.json();
+    return { ...data, ok: res.ok && !!data.ok };
+  }
+
   async function submitVote(choice) {
     if (!currentMotion || currentMotion.status !== "open") return;
-    const voteUrl = `${voteBase}${currentMotion.id}/vote/`;
+    const motionId = currentMotion.id;
     disableVoting(true);
     feedbackEl.textContent = "Submitting…";
     feedbackEl.className = "feedback";
     try {
-      const res = await fetch(voteUrl, {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/x-www-form-urlencoded",
-          "X-CSRFToken": getCsrfToken(),
-        },
-        body: `choice=${encodeURIComponent(choice)}`,
-      });
-      const data = await res.json();
-      if (!res.ok || !data.ok) {
+      let data;
+      try {
+        data = await castOverSocket(motionId, choice);
+      } catch (err) {
+        // Socket down or slow: the HTTP endpoint is idempotent for a repeat cast.
+        data = await castOverHttp(motionId, choice);
+      }
+      if (!data.ok) {
         const message =
           data.error === "vote_locked"
             ? "Vote already recorded."
@@ -531,6 +581,13 @@
 
   function handleEvent(event, payload) {
     switch (event) {
+      case "connection":
+        // Missed frames follow unless the server could not replay them all.
+        if (payload.resync) {
+          if (typeof payload.seq === "number") lastSeq = payload.seq;
+          fetchState();
+        }
+        break;
       case "motion_opened":
         previewMotion = null;
         currentMotion = payload;
@@ -614,7 +671,11 @@
         disableVoting(true);
         setClosedAlert(true, "Please wait for the moderator to open voting for the next motion.");
         break;
+      case "vote_error":
+        settleCast(payload, false);
+        break;
       case "vote_ack":
+        settleCast(payload, true);
         if (payload.choice) {
           selection = payload.choice;
           updateSelectionUI();
@@ -0,0 +1,33 @@
+from django.test import SimpleTestCase
+
+from motions.admission import MIN_RETRY_SEC, AdmissionBucket
+
+
+class AdmissionBucketTests(SimpleTestCase):
+    def test_burst_then_deferred_until_refilled(self):
+        bucket = AdmissionBucket(rate=10, burst=2)
+        now = bucket._updated
+        self.assertIsNone(bucket.admit(now))
+        self.assertIsNone(bucket.admit(now))
+        self.assertFalse(bucket.storm(now))
+
+        retry = bucket.admit(now)
+        self.assertGreaterEqual(retry, MIN_RETRY_SEC)
+        self.assertTrue(bucket.storm(now))
+
+        # One token back after 0.1s, and the turned-away client has drained.
+        self.assertIsNone(bucket.admit(now + 0.1))
+        self.assertFalse(bucket.storm(now + 0.1))
+        self.assertEqual((bucket.admitted, bucket.deferred), (3, 1))
+
+    def test_retry_spreads_with_the_backlog(self):
+        bucket = AdmissionBucket(rate=10, burst=0)
+        now = bucket._updated
+        retries = [bucket.admit(now) for _ in range(50)]
+        self.assertLessEqual(max(retries), 5.0)
+        self.assertGreater(max(retries), 2.0)
+
+    def test_zero_rate_disables(self):
+        bucket = AdmissionBucket(rate=0, burst=0)
+        self.assertIsNone(bucket.admit())
+        self.assertFalse(bucket.storm())
@@ -0,0 +1,225 @@
+from unittest import mock
+
+import msgpack
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.test import TransactionTestCase
+
+from motions.admission import CLOSE_TRY_AGAIN, AdmissionBucket
+from motions.models import Motion, MotionVote
+from motions.channel_registry import voter_channels
+from motions.realtime import broadcast_to_admins, broadcast_to_voters, notify_voter, voter_group
+from motions.replay import event_stream
+from motions.routing import websocket_urlpatterns
+from motions.wire import SUBPROTOCOL_MSGPACK, decode_binary
+from voters.models import VotingSession
+
+
+class MotionVoterConsumerTests(TransactionTestCase):
+    def setUp(self):
+        self.admin = admin = User.objects.create_user(username="admin", password="pass", is_staff=True)
+        self.session = VotingSession.objects.create(
+            title="AGM", admin=admin, is_active=True, unique_url="http://example.com"
+        )
+        self.motion = Motion.objects.create(
+            event=self.session, title="Budget", status=Motion.STATUS_OPEN
+        )
+        event_stream.clear(self.session.id)
+
+    async def _connect(self, identity="voter-1", query=""):
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns),
+            f"/ws/motions/{self.session.session_uuid}/voter/{query}",
+        )
+        communicator.scope["session"] = {"ANON_ID": identity}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        while True:
+            message = await communicator.receive_json_from()
+            if message["event"] == "connection":
+                communicator.resume = message["payload"]
+                return communicator
+
+    async def _receive(self, communicator, event):
+        while True:
+            message = await communicator.receive_json_from()
+            if message["event"] == event:
+                return message["payload"]
+
+    def test_cast_over_socket(self):
+        async def run():
+            communicator = await self._connect()
+            other_tab = await self._connect()
+            await communicator.send_json_to(
+                {"type": "cast", "motion_id": self.motion.id, "choice": "yes", "ref": 7}
+            )
+            ack = await self._receive(communicator, "vote_ack")
+            other_ack = await self._receive(other_tab, "vote_ack")
+            await communicator.send_json_to(
+                {"type": "cast", "motion_id": self.motion.id, "choice": "maybe"}
+            )
+            error = await self._receive(communicator, "vote_error")
+            self.assertTrue(await other_tab.receive_nothing())
+            await communicator.disconnect()
+            await other_tab.disconnect()
+            return ack, other_ack, error
+
+        ack, other_ack, error = async_to_sync(run)()
+        self.assertEqual(ack["ref"], 7)
+        self.assertTrue(ack["created"])
+        self.assertEqual(other_ack, ack)
+        self.assertEqual(error["error"], "invalid_choice")
+        vote = MotionVote.objects.get(motion=self.motion)
+        self.assertEqual((vote.voter_id, vote.choice), ("voter-1", "yes"))
+
+    def test_cast_refused_after_session_deactivated(self):
+        async def run():
+            communicator = await self._connect()
+            self.session.is_active = False
+            await sync_to_async(self.session.save)()
+            await communicator.send_json_to(
+                {"type": "cast", "motion_id": self.motion.id, "choice": "yes"}
+            )
+            error = await self._receive(communicator, "vote_error")
+            await communicator.disconnect()
+            return error
+
+        error = async_to_sync(run)()
+        self.assertEqual(error["error"], "inactive_session")
+        self.assertFalse(MotionVote.objects.filter(motion=self.motion).exists())
+
+    def test_batched_frames_are_unpacked(self):
+        async def run():
+            communicator = await self._connect()
+            await get_channel_layer().group_send(
+                voter_group(self.session.id),
+                {
+                    "type": "push.batch",
+                    "frames": [
+                        {"type": "push.event", "event": "motion_timer", "payload": {"id": 1}},
+                        {"type": "push.event", "event": "motion_closed", "payload": {"id": 1}},
+                    ],
+                },
+            )
+            timer = await self._receive(communicator, "motion_timer")
+            closed = await self._receive(communicator, "motion_closed")
+            await communicator.disconnect()
+            return timer, closed
+
+        timer, closed = async_to_sync(run)()
+        self.assertEqual((timer["id"], closed["id"]), (1, 1))
+
+    def test_direct_frames_reach_registered_channel(self):
+        async def run():
+            communicator = await self._connect()
+            registered = voter_channels._local_channels(self.session.id, "voter-1")
+            await sync_to_async(notify_voter)(self.session.id, "voter-1", "vote_ack", {"motion_id": 9})
+            ack = await self._receive(communicator, "vote_ack")
+            await communicator.disconnect()
+            return registered, ack
+
+        registered, ack = async_to_sync(run)()
+        self.assertEqual(len(registered), 1)
+        self.assertEqual(ack["motion_id"], 9)
+        self.assertEqual(voter_channels._local_channels(self.session.id, "voter-1"), [])
+
+    def test_msgpack_subprotocol(self):
+        async def run():
+            communicator = WebsocketCommunicator(
+                URLRouter(websocket_urlpatterns),
+                f"/ws/motions/{self.session.session_uuid}/voter/",
+                subprotocols=[SUBPROTOCOL_MSGPACK],
+            )
+            communicator.scope["session"] = {"ANON_ID": "voter-1"}
+            connected, subprotocol = await communicator.connect()
+            frames = [decode_binary(await communicator.receive_from())]
+            await communicator.send_to(
+                bytes_data=msgpack.packb({"type": "cast", "motion_id": self.motion.id, "choice": "no"})
+            )
+            await sync_to_async(broadcast_to_voters)(self.session.id, "results_hidden", {"motion_id": 5})
+            while not {"vote_ack", "results_hidden"} <= {frame["event"] for frame in frames}:
+                frames.append(decode_binary(await communicator.receive_from()))
+            await communicator.disconnect()
+            return connected, subprotocol, frames
+
+        connected, subprotocol, frames = async_to_sync(run)()
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, SUBPROTOCOL_MSGPACK)
+        by_event = {frame["event"]: frame["payload"] for frame in frames}
+        self.assertEqual(by_event["connection"]["status"], "connected")
+        self.assertEqual(by_event["vote_ack"]["choice"], "no")
+        self.assertEqual(by_event["results_hidden"], {"motion_id": 5})
+
+    def test_handshake_deferred_when_bucket_empty(self):
+        async def run():
+            communicator = WebsocketCommunicator(
+                URLRouter(websocket_urlpatterns),
+                f"/ws/motions/{self.session.session_uuid}/voter/",
+            )
+            communicator.scope["session"] = {"ANON_ID": "voter-1"}
+            await communicator.connect()
+            # Frames sent before the client has processed the close are ignored.
+            await communicator.send_json_to({"type": "heartbeat"})
+            await communicator.send_json_to({"type": "cast", "motion_id": self.motion.id, "choice": "yes"})
+            closed = await communicator.receive_output()
+            self.assertTrue(await communicator.receive_nothing())
+            await communicator.disconnect()
+            return closed
+
+        with mock.patch("motions.consumers.admission", AdmissionBucket(rate=1, burst=0)):
+            closed = async_to_sync(run)()
+        self.assertEqual(closed["type"], "websocket.close")
+        self.assertEqual(closed["code"], CLOSE_TRY_AGAIN)
+        self.assertTrue(closed["reason"].startswith("retry_after_ms="))
+        self.assertEqual(voter_channels._local_channels(self.session.id, "voter-1"), [])
+        self.assertFalse(MotionVote.objects.filter(motion=self.motion).exists())
+
+    def test_reconnect_replays_missed_frames(self):
+        for motion_id in (1, 2, 3):
+            broadcast_to_voters(self.session.id, "results_hidden", {"motion_id": motion_id})
+
+        async def run():
+            resumed = await self._connect(query="?last_seq=1")
+            replayed = [await resumed.receive_json_from() for _ in range(2)]
+            await resumed.disconnect()
+            ahead = await self._connect(query="?last_seq=10")
+            await ahead.disconnect()
+            return resumed.resume, replayed, ahead.resume
+
+        resume, replayed, ahead = async_to_sync(run)()
+        self.assertEqual(resume, {"status": "connected", "seq": 3, "resync": False, "replayed": 2})
+        self.assertEqual([(m["seq"], m["payload"]["motion_id"]) for m in replayed], [(2, 2), (3, 3)])
+        self.assertTrue(ahead["resync"])
+
+    def test_admin_reconnect_reports_position_and_replays(self):
+        for motion_id in (1, 2):
+            broadcast_to_admins(self.session.id, "admin_vote_update", {"motion_id": motion_id})
+
+        async def connect(query=""):
+            communicator = WebsocketCommunicator(
+                URLRouter(websocket_urlpatterns),
+                f"/ws/motions/{self.session.session_uuid}/admin/{query}",
+            )
+            communicator.scope["user"] = self.admin
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            connection = await self._receive(communicator, "connection")
+            return communicator, connection
+
+        async def run():
+            fresh, first = await connect()
+            await fresh.disconnect()
+            resumed, resume = await connect("?last_seq=1")
+            replayed = await resumed.receive_json_from()
+            await resumed.disconnect()
+            return first, resume, replayed
+
+        first, resume, replayed = async_to_sync(run)()
+        self.assertEqual(first, {"status": "connected", "role": "moderator", "seq": 2, "resync": True})
+        self.assertEqual(
+            resume, {"status": "connected", "role": "moderator", "seq": 2, "resync": False, "replayed": 1}
+        )
+        self.assertEqual((replayed["seq"], replayed["payload"]["motion_id"]), (2, 2))
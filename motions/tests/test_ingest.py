@@ -0,0 +1,134 @@
+from unittest import mock
+
+import fakeredis
+from django.contrib.auth.models import User
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+
+from motions import ingest
+from motions.models import Motion, MotionResult, MotionVote
+from motions.redis_registry import registry
+from motions.services import (
+    close_motion,
+    get_live_counts,
+    get_selection,
+    open_motion,
+    record_vote,
+    reset_motion_votes,
+)
+from voters.models import VotingSession
+
+
+@override_settings(
+    REDIS_URL="redis://fake:6379/0",
+    MOTION_VOTE_INGEST_MODE="write_behind",
+    MOTION_RECONCILE_WORKER="command",
+)
+class WriteBehindTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        for patcher in (
+            mock.patch.object(registry, "get_client", return_value=self.redis),
+            # Flushes are driven by the tests, not the background thread.
+            mock.patch.object(ingest._flusher, "ensure_started"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        admin = User.objects.create_user(username="admin", password="pass", is_staff=True)
+        self.session = VotingSession.objects.create(title="AGM", admin=admin, is_active=True)
+
+    def _open(self, **fields):
+        return open_motion(Motion.objects.create(event=self.session, title="Budget", **fields))
+
+    def test_votes_buffer_in_redis_until_close_drains(self):
+        motion = self._open(allow_vote_change=True)
+        self.assertTrue(record_vote(motion, "v1", "yes")[1]["created"])
+        self.assertTrue(record_vote(motion, "v2", "no")[1]["created"])
+        ok, data = record_vote(motion, "v1", "abstain")
+        self.assertEqual((ok, data["previous"]), (True, "yes"))
+
+        self.assertFalse(MotionVote.objects.filter(motion=motion).exists())
+        self.assertEqual(get_live_counts(motion.id), {"yes": 0, "no": 1, "abstain": 1})
+        self.assertEqual(get_selection(motion, "v1"), "abstain")
+
+        counts = close_motion(motion)
+        self.assertEqual((counts["yes"], counts["no"], counts["abstain"]), (0, 1, 1))
+        self.assertEqual(
+            dict(MotionVote.objects.filter(motion=motion).values_list("voter_id", "choice")),
+            {"v1": "abstain", "v2": "no"},
+        )
+        self.assertEqual(self.redis.hlen(ingest.pending_key(motion.id)), 0)
+        self.assertFalse(record_vote(Motion.objects.get(pk=motion.pk), "v3", "yes")[0])
+
+    def test_locked_vote_judged_against_seeded_choices(self):
+        motion = Motion.objects.create(event=self.session, title="Locked", allow_vote_change=False)
+        MotionVote.objects.create(motion=motion, voter_id="v1", choice="yes")
+        motion = open_motion(motion)
+        ok, data = record_vote(motion, "v1", "no")
+        self.assertEqual((ok, data["error"], data["choice"]), (False, "vote_locked", "yes"))
+
+    def test_unseeded_motion_is_seeded_on_first_cast(self):
+        # Opened while Redis was unreachable: nothing was loaded then.
+        motion = Motion.objects.create(
+            event=self.session, title="Late", status=Motion.STATUS_OPEN, allow_vote_change=False
+        )
+        MotionVote.objects.create(motion=motion, voter_id="v1", choice="yes")
+        ok, data = record_vote(motion, "v1", "no")
+        self.assertEqual((ok, data["error"]), (False, "vote_locked"))
+        self.assertTrue(record_vote(motion, "v2", "no")[0])
+
+    def test_close_refuses_to_freeze_with_votes_pending(self):
+        motion = self._open()
+        record_vote(motion, "v1", "yes")
+        record_vote(motion, "v2", "yes")
+        with mock.patch.object(ingest, "_upsert", side_effect=DatabaseError("db down")), \
+                mock.patch.object(ingest, "DRAIN_BACKOFF_SEC", 0):
+            with self.assertRaises(ingest.DrainError) as raised:
+                close_motion(motion)
+        self.assertEqual(raised.exception.pending, 2)
+        self.assertEqual(Motion.objects.get(pk=motion.pk).status, Motion.STATUS_OPEN)
+        self.assertFalse(MotionResult.objects.filter(motion=motion).exists())
+
+        self.assertEqual(close_motion(motion)["yes"], 2)
+
+    def test_cast_is_refused_rather_than_written_to_database_when_redis_fails(self):
+        motion = self._open()
+        with mock.patch.object(ingest, "cast", side_effect=ConnectionError("gone")), \
+                mock.patch("motions.services.record_failure"):
+            ok, data = record_vote(motion, "v1", "yes")
+        self.assertEqual((ok, data["error"]), (False, "vote_unavailable"))
+        self.assertFalse(MotionVote.objects.filter(motion=motion).exists())
+        self.assertIsNone(self.redis.hget(ingest.choices_key(motion.id), "v1"))
+
+    def test_interleaved_flushes_never_store_an_older_choice(self):
+        motion = self._open(allow_vote_change=True)
+        record_vote(motion, "v1", "yes")
+        upsert = ingest._upsert
+        overlapped = []
+
+        def slow_upsert(motion_id, batch):
+            # While this flush holds "yes", the voter changes their mind and
+            # another process's flusher runs.
+            with mock.patch.object(ingest, "_upsert", upsert):
+                record_vote(motion, "v1", "no")
+                overlapped.append(ingest.flush_motion(motion.id))
+            upsert(motion_id, batch)
+
+        with mock.patch.object(ingest, "_upsert", side_effect=slow_upsert):
+            ingest.flush_motion(motion.id)
+        self.assertEqual(overlapped, [0])
+        self.assertEqual(self.redis.hget(ingest.pending_key(motion.id), "v1"), "no")
+
+        ingest.flush_motion(motion.id)
+        self.assertEqual(MotionVote.objects.get(motion=motion, voter_id="v1").choice, "no")
+        self.assertIsNone(self.redis.get(ingest.flushing_key(motion.id)))
+
+    def test_reset_discards_buffered_votes(self):
+        motion = self._open()
+        record_vote(motion, "v1", "yes")
+        ingest.flush_motion(motion.id)
+        record_vote(motion, "v2", "no")
+        reset_motion_votes(motion)
+        ingest.flush_motion(motion.id)
+        self.assertFalse(MotionVote.objects.filter(motion=motion).exists())
+        self.assertIsNone(get_selection(motion, "v2"))
@@ -1,13 +1,31 @@
+import threading
+from unittest import skipUnless
+
 from django.contrib.auth.models import User
-from django.test import Client, TestCase
+from django.db import connection, connections, transaction
+from django.test import Client, TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 
-from motions.models import Motion
+from motions.models import Motion, MotionResult, MotionVote
 from motions.presence import PresenceTracker
-from motions.services import open_motion, record_vote
+from motions.services import (
+    VOTE_CHANGED,
+    VOTE_CREATED,
+    VOTE_LOCKED,
+    VOTE_UNCHANGED,
+    _upsert_vote_returning,
+    close_motion,
+    final_counts,
+    get_selection,
+    open_motion,
+    record_vote,
+    reset_motion_votes,
+    upsert_vote,
+)
 from voters.models import VotingSession
 
 
+@override_settings(MOTION_RECONCILE_WORKER="command")
 class MotionFlowTests(TestCase):
     def setUp(self):
         self.admin = User.objects.create_user(username="admin", password="pass", is_staff=True)
@@ -47,6 +65,44 @@ class MotionFlowTests(TestCase):
         self.assertFalse(ok)
         self.assertEqual(data["error"], "vote_locked")
 
+    def test_upsert_vote_reports_previous_choice(self):
+        motion = Motion.objects.create(event=self.session, title="Upsert", allow_vote_change=True)
+        self.assertEqual(upsert_vote(motion, "v1", "yes"), (VOTE_CREATED, None))
+        self.assertEqual(upsert_vote(motion, "v1", "yes"), (VOTE_UNCHANGED, "yes"))
+        self.assertEqual(upsert_vote(motion, "v1", "no"), (VOTE_CHANGED, "yes"))
+        motion.allow_vote_change = False
+        self.assertEqual(upsert_vote(motion, "v1", "yes"), (VOTE_LOCKED, "no"))
+        self.assertEqual(MotionVote.objects.get(motion=motion, voter_id="v1").choice, "no")
+
+    @override_settings(MOTION_VOTE_INGEST_MODE="write_behind")
+    def test_write_behind_without_redis_uses_database(self):
+        motion = Motion.objects.create(event=self.session, title="Buffered")
+        motion = open_motion(motion)
+        ok, data = record_vote(motion, "v1", "yes")
+        self.assertTrue(ok)
+        self.assertTrue(data["created"])
+        self.assertEqual(get_selection(motion, "v1"), "yes")
+        counts = close_motion(motion)
+        self.assertEqual(counts["yes"], 1)
+
+    def test_close_freezes_result_until_reopen_or_reset(self):
+        motion = open_motion(Motion.objects.create(event=self.session, title="Frozen"))
+        record_vote(motion, "v1", "yes")
+        record_vote(motion, "v2", "no")
+        close_motion(motion)
+        self.assertEqual(MotionResult.objects.get(motion=motion).as_counts()["yes"], 1)
+        # Late rows do not change the frozen result.
+        MotionVote.objects.create(motion=motion, voter_id="v3", choice="yes")
+        self.assertEqual(final_counts(motion)["yes"], 1)
+
+        reset_motion_votes(motion)
+        self.assertFalse(MotionResult.objects.filter(motion=motion).exists())
+        close_motion(motion)
+        self.assertEqual(final_counts(motion), {"yes": 0, "no": 0, "abstain": 0})
+
+        open_motion(motion)
+        self.assertFalse(MotionResult.objects.filter(motion=motion).exists())
+
     def test_close_motion_blocks_vote(self):
         motion = Motion.objects.create(
             event=self.session,
@@ -84,3 +140,44 @@ class MotionFlowTests(TestCase):
         self.assertEqual(count, 1)
         tracker.mark_gone(self.session.id, "voter-1")
         self.assertEqual(tracker.count(self.session.id), 0)
+
+
+@skipUnless(connection.vendor == "postgresql", "single-statement upsert is PostgreSQL only")
+class PostgresUpsertTests(TransactionTestCase):
+    def setUp(self):
+        admin = User.objects.create_user(username="admin", password="pass", is_staff=True)
+        session = VotingSession.objects.create(title="AGM", admin=admin, is_active=True)
+        self.motion = Motion.objects.create(event=session, title="Upsert", allow_vote_change=True)
+
+    def test_single_statement_outcomes(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(_upsert_vote_returning(self.motion, "v1", "yes"), (VOTE_CREATED, None))
+        self.assertEqual(_upsert_vote_returning(self.motion, "v1", "yes"), (VOTE_UNCHANGED, "yes"))
+        self.assertEqual(_upsert_vote_returning(self.motion, "v1", "no"), (VOTE_CHANGED, "yes"))
+        self.motion.allow_vote_change = False
+        self.assertEqual(_upsert_vote_returning(self.motion, "v1", "yes"), (VOTE_LOCKED, "no"))
+        self.assertEqual(MotionVote.objects.get(motion=self.motion, voter_id="v1").choice, "no")
+
+    def test_concurrent_first_vote_is_not_overwritten_blind(self):
+        inserted = threading.Event()
+        release = threading.Event()
+
+        def first_vote():
+            try:
+                with transaction.atomic():
+                    MotionVote.objects.create(motion=self.motion, voter_id="v1", choice="no")
+                    inserted.set()
+                    release.wait(5)
+            finally:
+                connections.close_all()
+
+        other = threading.Thread(target=first_vote)
+        other.start()
+        inserted.wait(5)
+        # Commits while the upsert below waits on the conflicting row.
+        threading.Timer(0.3, release.set).start()
+        outcome = _upsert_vote_returning(self.motion, "v1", "yes")
+        other.join()
+        self.assertIsNone(outcome)
+        self.assertEqual(MotionVote.objects.get(motion=self.motion, voter_id="v1").choice, "no")
+        self.assertEqual(upsert_vote(self.motion, "v1", "yes"), (VOTE_CHANGED, "no"))
@@ -0,0 +1,127 @@
+from unittest import mock
+
+import fakeredis
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from motions.attendance import RESOLUTION_MINUTE, RESOLUTION_SECOND, AttendanceSeries
+from motions.presence import (
+    PRESENCE_BUCKET_SEC,
+    PRESENCE_TIMEOUT_SEC,
+    AsyncPresenceTracker,
+    LocalPresenceStore,
+    PresenceAudience,
+    PresenceTicker,
+    PresenceTracker,
+)
+from motions.redis_registry import registry
+
+
+class LocalPresenceStoreTests(SimpleTestCase):
+    def test_heartbeat_moves_voter_between_buckets(self):
+        store = LocalPresenceStore()
+        now = 1_000_000.0
+        self.assertEqual(store.heartbeat(1, "a", now), 1)
+        self.assertEqual(store.heartbeat(1, "b", now), 2)
+        later = now + PRESENCE_BUCKET_SEC * 2
+        self.assertEqual(store.heartbeat(1, "a", later), 2)
+        store.remove(1, "b")
+        self.assertEqual(store.count(1, later), 1)
+
+    def test_expired_buckets_are_not_counted_and_pruned(self):
+        store = LocalPresenceStore()
+        now = 1_000_000.0
+        store.heartbeat(1, "a", now)
+        expired = now + PRESENCE_TIMEOUT_SEC + PRESENCE_BUCKET_SEC * 2
+        self.assertEqual(store.count(1, expired), 0)
+        self.assertEqual(store.prune(1, expired), 0)
+        self.assertEqual(store.heartbeat(1, "a", expired), 1)
+
+
+class AsyncPresenceTrackerTests(SimpleTestCase):
+    def test_shares_local_store_with_sync_tracker(self):
+        store = LocalPresenceStore()
+        tracker = AsyncPresenceTracker(store=store)
+        self.assertEqual(async_to_sync(tracker.heartbeat)(1, "a"), 1)
+        self.assertEqual(PresenceTracker(store=store).heartbeat(1, "b"), 2)
+        async_to_sync(tracker.mark_gone)(1, "a")
+        self.assertEqual(async_to_sync(tracker.count)(1), 1)
+
+
+class PresenceTickerTests(SimpleTestCase):
+    def setUp(self):
+        self.sent = []
+        self.tracker = PresenceTracker(store=LocalPresenceStore())
+        self.ticker = self._ticker()
+
+    def _ticker(self):
+        return PresenceTicker(
+            audiences=[
+                PresenceAudience("admins", 0, 0, self._recorder("admins")),
+                PresenceAudience("voters", 3600, 20, self._recorder("voters")),
+            ],
+            tracker=self.tracker,
+            interval=60,
+        )
+
+    def _recorder(self, name):
+        return lambda event_id, count: self.sent.append((name, count))
+
+    def _join(self, *voters):
+        for voter in voters:
+            self.tracker.heartbeat(1, voter)
+            self.ticker.touch(1)
+
+    def test_heartbeats_are_published_once_per_tick(self):
+        self._join("a", "b", "c")
+        self.assertEqual(self.sent, [])
+        self.assertEqual(self.ticker.tick(), 2)
+        self.assertEqual(self.sent, [("admins", 3), ("voters", 3)])
+
+    def test_unchanged_count_is_not_republished(self):
+        self._join("a")
+        self.ticker.tick()
+        self._join("a")
+        self.assertEqual(self.ticker.tick(), 0)
+
+    def test_voters_only_hear_large_changes(self):
+        self._join(*[f"v{i}" for i in range(10)])
+        self.ticker.tick()
+        self._join("v10")
+        self.ticker.tick()
+        self._join("v11", "v12")
+        self.ticker.tick()
+        self.assertEqual(
+            self.sent,
+            [("admins", 10), ("voters", 10), ("admins", 11), ("admins", 13), ("voters", 13)],
+        )
+
+    def test_voter_cadence_is_shared_between_processes(self):
+        redis = fakeredis.FakeRedis(decode_responses=True)
+        with mock.patch.object(registry, "get_client", return_value=redis):
+            self._join(*[f"v{i}" for i in range(10)])
+            self.ticker.tick()
+            # The next tick is won by another worker process.
+            redis.delete("presence:event:1:tick")
+            other = self._ticker()
+            self.tracker.heartbeat(1, "v10")
+            other.touch(1)
+            other.tick()
+        self.assertEqual(self.sent, [("admins", 10), ("voters", 10), ("admins", 11)])
+
+
+class AttendanceSeriesTests(SimpleTestCase):
+    def test_seconds_roll_up_into_minutes(self):
+        series = AttendanceSeries()
+        start = 1_000_020
+        for offset, count in enumerate([5, 7, 6]):
+            series.record(1, count, now=start + offset)
+        series.record(1, 9, now=start + 60)
+        self.assertEqual(
+            series.history(1, RESOLUTION_SECOND)[-2:],
+            [{"t": start + 2, "count": 6}, {"t": start + 60, "count": 9}],
+        )
+        minutes = series.history(1, RESOLUTION_MINUTE)
+        self.assertEqual(minutes[0], {"t": start, "min": 5, "max": 7, "avg": 6.0, "last": 6})
+        self.assertEqual(minutes[1]["last"], 9)
+        self.assertEqual(series.history(1, RESOLUTION_MINUTE, since=start + 40), minutes[1:])
@@ -0,0 +1,109 @@
+import threading
+import time
+from unittest import mock
+
+import fakeredis
+import fakeredis.aioredis
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from motions import replay
+from motions.realtime import BroadcastOutbox, TallyBroadcaster
+from motions.redis_registry import registry
+from motions.replay import AUDIENCE_VOTERS, EventStream
+
+
+class TallyBroadcasterTests(SimpleTestCase):
+    def setUp(self):
+        self.frames = []
+        self.sent = threading.Event()
+
+        def emit(event_id, motion_id, counts=None):
+            self.frames.append((event_id, motion_id, counts))
+            self.sent.set()
+
+        self.broadcaster = TallyBroadcaster(rate_hz=5, emit=emit)
+
+    def test_burst_is_coalesced(self):
+        for _ in range(200):
+            self.broadcaster.mark(1, 10)
+        self.assertTrue(self.sent.wait(1))
+        time.sleep(0.5)
+        self.assertLessEqual(len(self.frames), 2)
+        self.assertEqual(self.broadcaster.stats()["marked"], 200)
+
+    def test_final_frame_is_flushed_immediately(self):
+        self.broadcaster.mark(1, 10)
+        self.broadcaster.mark(1, 10)
+        self.broadcaster.flush_final(1, 10, {"yes": 3})
+        self.assertEqual(self.frames[-1], (1, 10, {"yes": 3}))
+        time.sleep(0.3)
+        self.assertEqual(self.frames[-1], (1, 10, {"yes": 3}))
+
+
+class BroadcastOutboxTests(SimpleTestCase):
+    def test_frames_are_merged_per_group_in_order(self):
+        sent = []
+
+        async def send(batches):
+            sent.extend(batches)
+
+        outbox = BroadcastOutbox(tick=60, send=send)
+        # Queue without starting the sender thread; flush delivers inline.
+        outbox._ensure_started = lambda: None
+        outbox.put("event_1_voters", "motion_opened", {"id": 1})
+        outbox.put("event_1_admins", "tally_update", {"motion_id": 1})
+        outbox.put("event_1_voters", "motion_timer", {"id": 1})
+        outbox.put("event_1_voters", "motion_closed", {"id": 1})
+        outbox.put("specific.abc!1", "vote_ack", {"motion_id": 1}, direct=True)
+        outbox.flush()
+
+        self.assertEqual(len(sent), 3)
+        self.assertIn(("send", "specific.abc!1"), [target for target, _ in sent])
+        groups = {name: frames for (_, name), frames in sent}
+        self.assertEqual(
+            [frame["event"] for frame in groups["event_1_voters"]],
+            ["motion_opened", "motion_timer", "motion_closed"],
+        )
+        self.assertEqual(len(groups["event_1_admins"]), 1)
+        stats = outbox.stats()
+        self.assertEqual((stats["queued"], stats["sends"], stats["pending_targets"]), (5, 3, 0))
+
+
+class EventStreamTests(SimpleTestCase):
+    def test_gap_outside_buffer_needs_resync(self):
+        stream = EventStream()
+        for i in range(5):
+            stream.publish(1, AUDIENCE_VOTERS, "results_hidden", {"motion_id": i})
+        # Drop the two oldest frames as if the ring had wrapped.
+        frames = stream._local[(1, AUDIENCE_VOTERS)].frames
+        frames.popleft()
+        frames.popleft()
+
+        since = async_to_sync(stream.since)
+        self.assertEqual(since(1, AUDIENCE_VOTERS, 5), (5, []))
+        head, missed = since(1, AUDIENCE_VOTERS, 2)
+        self.assertEqual([frame["seq"] for frame in missed], [3, 4, 5])
+        self.assertEqual(since(1, AUDIENCE_VOTERS, 1), (5, None))
+        self.assertEqual(since(1, AUDIENCE_VOTERS, None), (5, None))
+
+    def test_redis_stream_buffers_each_frame_with_its_sequence(self):
+        server = fakeredis.FakeServer()
+        sync_client = fakeredis.FakeRedis(server=server, decode_responses=True)
+        async_client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+        stream = EventStream()
+        with mock.patch.object(registry, "get_client", return_value=sync_client), \
+                mock.patch.object(registry, "get_async_client", return_value=async_client), \
+                mock.patch.object(replay, "REPLAY_BUFFER_SIZE", 3):
+            seqs = [stream.publish(1, AUDIENCE_VOTERS, "motion_timer", {"id": i, "note": '{"x"}'}) for i in range(5)]
+            since = async_to_sync(stream.since)
+            head, missed = since(1, AUDIENCE_VOTERS, 2)
+            self.assertEqual(since(1, AUDIENCE_VOTERS, 1), (5, None))
+        self.assertEqual(seqs, [1, 2, 3, 4, 5])
+        self.assertEqual(stream._local, {})
+        self.assertEqual(sync_client.zcard(replay._buffer_key(1, AUDIENCE_VOTERS)), 3)
+        self.assertEqual(head, 5)
+        self.assertEqual(
+            missed,
+            [{"seq": i + 1, "event": "motion_timer", "payload": {"id": i, "note": '{"x"}'}} for i in (2, 3, 4)],
+        )
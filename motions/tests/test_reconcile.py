@@ -0,0 +1,46 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from motions.models import Motion
+from motions.reconcile import TallyReconciler
+from motions.services import _set_counts, get_live_counts, open_motion, record_vote
+from voters.models import VotingSession
+
+
+@override_settings(MOTION_AUTOCLOSE_WORKER="command", MOTION_RECONCILE_WORKER="command")
+class TallyReconcilerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        admin = User.objects.create_user(username="admin", password="pass", is_staff=True)
+        self.session = VotingSession.objects.create(
+            title="AGM", admin=admin, is_active=True, unique_url="http://example.com"
+        )
+        self.motion = open_motion(Motion.objects.create(event=self.session, title="Budget"))
+        record_vote(self.motion, "v1", "yes")
+        record_vote(self.motion, "v2", "no")
+
+    def test_drift_is_repaired_once_confirmed(self):
+        _set_counts(self.motion.id, {"yes": 5, "no": 1, "abstain": 0})
+        reconciler = TallyReconciler(interval=60)
+
+        self.assertEqual(reconciler.run_once(), 0)
+        self.assertEqual(get_live_counts(self.motion.id)["yes"], 5)
+
+        self.assertEqual(reconciler.run_once(), 1)
+        self.assertEqual(get_live_counts(self.motion.id), {"yes": 1, "no": 1, "abstain": 0})
+        self.assertEqual(reconciler.stats()["max_abs_drift"], 4)
+
+    def test_moving_counts_are_not_corrected(self):
+        reconciler = TallyReconciler(interval=60)
+        _set_counts(self.motion.id, {"yes": 3, "no": 1, "abstain": 0})
+        reconciler.run_once()
+        _set_counts(self.motion.id, {"yes": 4, "no": 1, "abstain": 0})
+        self.assertEqual(reconciler.run_once(), 0)
+        self.assertEqual(reconciler.stats()["repairs"], 0)
+
+    def test_consistent_tally_is_left_alone(self):
+        reconciler = TallyReconciler(interval=60)
+        reconciler.run_once()
+        reconciler.run_once()
+        self.assertEqual(reconciler.stats()["drift_detected"], 0)
@@ -0,0 +1,115 @@
+import asyncio
+import socket
+import threading
+import time
+from unittest import mock
+
+import fakeredis
+import redis
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from motions import redis_registry
+from motions.redis_registry import CircuitBreaker, RedisRegistry
+
+
+class RedisRegistryTests(SimpleTestCase):
+    def test_no_url_returns_none(self):
+        registry = RedisRegistry(url=None)
+        with self.settings(REDIS_URL=None):
+            self.assertIsNone(registry.get_client())
+
+    def test_client_is_shared(self):
+        registry = RedisRegistry(url="redis://127.0.0.1:6399/0")
+        first = registry.get_client()
+        self.assertIsNotNone(first)
+        self.assertIs(first, registry.get_client())
+        stats = registry.stats()
+        self.assertTrue(stats["configured"])
+        self.assertEqual(stats["breaker"], "closed")
+        registry.reset()
+
+    def test_hung_server_times_out(self):
+        # Accepts connections (via the backlog) but never answers.
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        self.addCleanup(server.close)
+        with mock.patch.object(redis_registry, "SOCKET_TIMEOUT_SEC", 0.2):
+            registry = RedisRegistry(url=f"redis://127.0.0.1:{server.getsockname()[1]}/0")
+            client = registry.get_client()
+        self.addCleanup(registry.reset)
+        started = time.monotonic()
+        with self.assertRaises(redis.exceptions.TimeoutError):
+            client.ping()
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_breaker_opens_after_threshold(self):
+        registry = RedisRegistry(url="redis://127.0.0.1:6399/0")
+        registry.breaker = CircuitBreaker(threshold=2, cooldown=60)
+        registry.record_failure()
+        self.assertIsNotNone(registry.get_client())
+        registry.record_failure()
+        self.assertEqual(registry.breaker.state, "open")
+        self.assertIsNone(registry.get_client())
+        self.assertEqual(registry.stats()["breaker_trips"], 1)
+        registry.reset()
+
+    def test_half_open_probe_failure_reopens(self):
+        registry = RedisRegistry(url="redis://127.0.0.1:6399/0")
+        registry.breaker = CircuitBreaker(threshold=1, cooldown=0)
+        registry.record_failure()
+        self.assertEqual(registry.breaker.state, "half_open")
+        # Nothing listens on the port, so the probe fails and the breaker re-opens.
+        self.assertIsNone(registry.get_client())
+        self.assertIsNotNone(registry.breaker.opened_at)
+
+    def test_half_open_lets_one_probe_through(self):
+        registry = RedisRegistry(url="redis://127.0.0.1:6399/0")
+        registry.breaker = CircuitBreaker(threshold=1, cooldown=0)
+        registry.record_failure()
+        probing = threading.Event()
+        release = threading.Event()
+        fake = mock.Mock()
+        fake.ping.side_effect = lambda: probing.set() or release.wait(5)
+        registry._client = fake
+        prober = threading.Thread(target=registry.get_client)
+        prober.start()
+        probing.wait(5)
+        self.assertIsNone(registry.get_client())
+        release.set()
+        prober.join()
+        self.assertEqual(fake.ping.call_count, 1)
+        self.assertEqual(registry.breaker.state, "closed")
+        self.assertIs(registry.get_client(), fake)
+
+    def test_async_half_open_probes_and_closes(self):
+        registry = RedisRegistry(url="redis://127.0.0.1:6399/0")
+        registry.breaker = CircuitBreaker(threshold=1, cooldown=0)
+        registry.record_failure()
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            fake = fakeredis.aioredis.FakeRedis()
+            registry._async_clients[loop] = fake
+            during = registry.get_async_client()
+            await registry._async_probes[loop]
+            return fake, during, registry.get_async_client()
+
+        fake, during, after = async_to_sync(run)()
+        self.assertIsNone(during)
+        self.assertEqual(registry.breaker.state, "closed")
+        self.assertIs(after, fake)
+
+    def test_async_half_open_probe_failure_reopens(self):
+        registry = RedisRegistry(url="redis://127.0.0.1:6399/0")
+        registry.breaker = CircuitBreaker(threshold=1, cooldown=0)
+        registry.record_failure()
+        opened = registry.breaker.opened_at
+
+        async def run():
+            self.assertIsNone(registry.get_async_client())
+            await registry._async_probes[asyncio.get_running_loop()]
+
+        async_to_sync(run)()
+        self.assertGreater(registry.breaker.opened_at, opened)
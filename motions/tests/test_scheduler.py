@@ -0,0 +1,108 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone as tz
+
+from motions.models import Motion
+from motions import reconcile
+from motions import scheduler as scheduler_module
+from motions.scheduler import AutoCloseScheduler
+from motions.services import open_motion
+from voters.models import VotingSession
+
+
+@override_settings(MOTION_AUTOCLOSE_WORKER="command", MOTION_RECONCILE_WORKER="command")
+class AutoCloseSchedulerTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_user(username="admin", password="pass", is_staff=True)
+        self.session = VotingSession.objects.create(
+            title="AGM", admin=admin, is_active=True, unique_url="http://example.com"
+        )
+        self.scheduler = AutoCloseScheduler()
+        # run_pending recycles connections between closes; keep the test's.
+        patcher = mock.patch.object(scheduler_module, "close_old_connections")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _open(self, seconds):
+        motion = Motion.objects.create(event=self.session, title="Timed", auto_close_seconds=seconds)
+        motion = open_motion(motion)
+        self.scheduler.schedule(motion)
+        return motion
+
+    def test_due_motion_is_closed(self):
+        motion = self._open(30)
+        self.assertEqual(self.scheduler.run_pending(now=time.time()), 0)
+        self.assertEqual(self.scheduler.run_pending(now=time.time() + 31), 1)
+        motion.refresh_from_db()
+        self.assertTrue(motion.is_closed)
+
+    def test_extension_moves_deadline(self):
+        motion = self._open(30)
+        Motion.objects.filter(pk=motion.pk).update(opened_at=tz.now() + timedelta(seconds=60))
+        motion.refresh_from_db()
+        self.scheduler.schedule(motion)
+        self.assertEqual(self.scheduler.run_pending(now=time.time() + 31), 0)
+        motion.refresh_from_db()
+        self.assertTrue(motion.is_open)
+        self.assertIsNotNone(self.scheduler.local.next_deadline())
+
+    def test_manually_closed_motion_is_skipped(self):
+        motion = self._open(30)
+        Motion.objects.filter(pk=motion.pk).update(status=Motion.STATUS_CLOSED)
+        self.assertEqual(self.scheduler.run_pending(now=time.time() + 31), 0)
+
+    def test_motion_closed_by_another_process_is_announced_once(self):
+        motion = self._open(30)
+        other = AutoCloseScheduler()
+        other.schedule(motion)
+        now = time.time() + 31
+        # The other process read the motion before this one's close committed.
+        stale = Motion.objects.get(pk=motion.pk)
+        reader = mock.Mock(STATUS_OPEN=Motion.STATUS_OPEN)
+        reader.objects.filter.return_value.first.return_value = stale
+        with mock.patch("motions.realtime.announce_motion_closed") as announce:
+            self.assertEqual(self.scheduler.run_pending(now=now), 1)
+            with mock.patch.object(scheduler_module, "Motion", reader):
+                self.assertEqual(other.run_pending(now=now), 0)
+        self.assertEqual(announce.call_count, 1)
+        self.assertEqual(other._failures, {})
+
+    def test_failed_close_is_retried_with_backoff(self):
+        motion = self._open(30)
+        now = time.time() + 31
+        with mock.patch("motions.services.close_motion", side_effect=RuntimeError("db down")):
+            self.assertEqual(self.scheduler.run_pending(now=now), 0)
+            self.assertEqual(self.scheduler.local.next_deadline(), now + 1)
+            self.assertEqual(self.scheduler.run_pending(now=now + 1), 0)
+            self.assertEqual(self.scheduler.local.next_deadline(), now + 3)
+        self.assertEqual(self.scheduler.run_pending(now=now + 3), 1)
+        motion.refresh_from_db()
+        self.assertTrue(motion.is_closed)
+        self.assertEqual(self.scheduler.stats()["retries"], 2)
+        self.assertEqual(self.scheduler._failures, {})
+
+
+class StartBackgroundWorkersTests(TestCase):
+    def _start(self):
+        from motions.workers import start_background_workers
+
+        with mock.patch.object(scheduler_module.scheduler, "ensure_started") as autoclose, \
+                mock.patch.object(reconcile.reconciler, "ensure_started") as reconciler:
+            start_background_workers()
+        return autoclose, reconciler
+
+    @override_settings(MOTION_AUTOCLOSE_WORKER="thread", MOTION_RECONCILE_WORKER="thread")
+    def test_thread_mode_starts_workers(self):
+        autoclose, reconciler = self._start()
+        autoclose.assert_called_once_with()
+        reconciler.assert_called_once_with()
+
+    @override_settings(MOTION_AUTOCLOSE_WORKER="command", MOTION_RECONCILE_WORKER="command")
+    def test_command_mode_leaves_workers_to_commands(self):
+        autoclose, reconciler = self._start()
+        autoclose.assert_not_called()
+        reconciler.assert_not_called()
@@ -0,0 +1,55 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from motions.sendqueue import SendQueue, queue_stats
+
+
+class SendQueueTests(SimpleTestCase):
+    def setUp(self):
+        self.sent = []
+
+        async def send(frame):
+            self.sent.append(frame)
+
+        self.send = send
+
+    def test_full_queue_drops_superseded_state_frames(self):
+        queue = SendQueue(self.send, max_depth=3)
+        superseded = queue_stats.superseded
+        self.assertTrue(queue.put("presence 1", "presence_update"))
+        self.assertTrue(queue.put("opened", None))
+        self.assertTrue(queue.put("tally 1", "admin_vote_update:1"))
+        # Full: the older presence frame makes way for the newer one.
+        self.assertTrue(queue.put("presence 2", "presence_update"))
+        self.assertEqual([item[2] for item in queue._items], ["opened", "tally 1", "presence 2"])
+        self.assertEqual(queue_stats.superseded - superseded, 1)
+
+    def test_full_queue_without_superseded_frames_gives_up(self):
+        queue = SendQueue(self.send, max_depth=2)
+        disconnects = queue_stats.slow_disconnects
+        self.assertTrue(queue.put("opened", None))
+        self.assertTrue(queue.put("closed", None))
+        self.assertFalse(queue.put("revealed", None))
+        self.assertTrue(queue.closed)
+        self.assertEqual(queue_stats.slow_disconnects - disconnects, 1)
+
+    def test_stalled_queue_gives_up(self):
+        queue = SendQueue(self.send, max_depth=10, stall=-1)
+        self.assertTrue(queue.put("opened", None))
+        self.assertFalse(queue.put("closed", None))
+
+    def test_writer_drains_in_order(self):
+        async def run():
+            queue = SendQueue(self.send)
+            queue.put("a")
+            queue.put(b"b")
+            task = asyncio.ensure_future(queue.run())
+            while len(self.sent) < 2:
+                await asyncio.sleep(0)
+            queue.close()
+            await task
+
+        async_to_sync(run)()
+        self.assertEqual(self.sent, ["a", b"b"])
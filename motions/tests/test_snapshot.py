@@ -0,0 +1,88 @@
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from motions import snapshot
+from motions.models import Motion
+from motions.services import close_motion, open_motion, record_vote
+from motions.snapshot import get_snapshot, rebuild_snapshot
+from voters.models import VotingSession
+
+
+@override_settings(MOTION_RECONCILE_WORKER="command")
+class MotionSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username="admin", password="pass", is_staff=True)
+        self.session = VotingSession.objects.create(
+            title="AGM", admin=self.admin, is_active=True, unique_url="http://example.com"
+        )
+        self.motion = Motion.objects.create(event=self.session, title="Budget", reveal_results=True)
+
+    def test_version_advances_on_rebuild(self):
+        first = rebuild_snapshot(self.session.pk)
+        open_motion(self.motion)
+        second = rebuild_snapshot(self.session.pk)
+        self.assertGreater(second["version"], first["version"])
+        self.assertEqual(get_snapshot(self.session.pk)["open"]["id"], self.motion.id)
+
+    def _shared_cache(self):
+        location = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": location,
+            }
+        }))
+
+    def test_snapshot_is_served_until_rebuilt(self):
+        self._shared_cache()
+        rebuild_snapshot(self.session.pk)
+        open_motion(self.motion)
+        self.assertIsNone(get_snapshot(self.session.pk)["open"])
+        rebuild_snapshot(self.session.pk)
+        self.assertIsNotNone(get_snapshot(self.session.pk)["open"]["server_now"])
+
+    def test_without_shared_store_snapshot_is_read_from_database(self):
+        # Rebuilt by "another process": nothing this process can see.
+        rebuild_snapshot(self.session.pk)
+        open_motion(self.motion)
+        self.assertEqual(get_snapshot(self.session.pk)["open"]["id"], self.motion.id)
+
+    def test_slow_build_does_not_replace_newer_one(self):
+        self._shared_cache()
+        build = snapshot.build_snapshot
+
+        def slow_build(event_id):
+            stale = build(event_id)
+            # A newer rebuild finishes while this one is still running.
+            with mock.patch.object(snapshot, "build_snapshot", build):
+                open_motion(self.motion)
+                rebuild_snapshot(event_id)
+            return stale
+
+        with mock.patch.object(snapshot, "build_snapshot", slow_build):
+            self.assertIsNone(rebuild_snapshot(self.session.pk)["open"])
+        self.assertEqual(get_snapshot(self.session.pk)["open"]["id"], self.motion.id)
+
+    def test_current_motion_adds_voter_selection(self):
+        client = Client()
+        url = reverse("motions:api_current_motion", args=[self.session.session_uuid])
+        client.get(url)
+        identity = client.session["MOTION_ANON_IDS"][str(self.session.session_uuid)]
+        motion = open_motion(self.motion)
+        rebuild_snapshot(self.session.pk)
+        record_vote(motion, identity, "yes")
+        data = client.get(url).json()
+        self.assertEqual(data["open"]["selection"], "yes")
+
+        close_motion(motion)
+        rebuild_snapshot(self.session.pk)
+        data = client.get(url).json()
+        self.assertIsNone(data["open"])
+        self.assertEqual(data["latest_closed"]["counts"]["yes"], 1)
+        self.assertEqual(data["latest_closed"]["selection"], "yes")
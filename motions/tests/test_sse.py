@@ -0,0 +1,60 @@
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.test import AsyncRequestFactory, TransactionTestCase
+
+from motions import views
+from motions.models import Motion
+from motions.realtime import broadcast_to_voters
+from motions.replay import event_stream
+from motions.sse import display_stats
+from voters.models import VotingSession
+
+
+class DisplayStreamTests(TransactionTestCase):
+    def setUp(self):
+        admin = User.objects.create_user(username="admin", password="pass", is_staff=True)
+        self.session = VotingSession.objects.create(
+            title="AGM", admin=admin, is_active=True, unique_url="http://example.com"
+        )
+        Motion.objects.create(event=self.session, title="Budget", status=Motion.STATUS_OPEN)
+        event_stream.clear(self.session.id)
+        self.factory = AsyncRequestFactory()
+
+    async def _open(self, headers=None):
+        request = self.factory.get(
+            f"/motions/session/{self.session.session_uuid}/api/events/", headers=headers
+        )
+        response = await views.api_display_stream(request, session_uuid=self.session.session_uuid)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        return response.streaming_content
+
+    def test_resume_from_last_event_id_then_live(self):
+        broadcast_to_voters(self.session.id, "results_hidden", {"motion_id": 1})
+        broadcast_to_voters(self.session.id, "results_hidden", {"motion_id": 2})
+
+        async def run():
+            stream = await self._open(headers={"Last-Event-ID": "1"})
+            replayed = (await stream.__anext__()).decode()
+            streams = display_stats()["streams"]
+            await sync_to_async(broadcast_to_voters)(self.session.id, "motion_previewed", {"id": 3})
+            live = (await stream.__anext__()).decode()
+            await stream.aclose()
+            return replayed, streams, live
+
+        replayed, streams, live = async_to_sync(run)()
+        self.assertIn("event: results_hidden\nid: 2\n", replayed)
+        self.assertIn('"motion_id": 2', replayed)
+        self.assertEqual(streams, 1)
+        self.assertIn("event: motion_previewed\nid: 3\n", live)
+        self.assertEqual(display_stats()["streams"], 0)
+
+    def test_new_display_starts_from_snapshot(self):
+        async def run():
+            stream = await self._open()
+            first = (await stream.__anext__()).decode()
+            await stream.aclose()
+            return first
+
+        first = async_to_sync(run)()
+        self.assertTrue(first.startswith("event: snapshot\nid: 0\n"))
+        self.assertIn('"title": "Budget"', first)
@@ -4,6 +4,7 @@ from . import views
 app_name = "motions"
 
 urlpatterns = [
+    path("api/metrics/", views.api_metrics, name="api_metrics"),
     path("entry/<uuid:session_uuid>/", views.gated_entry, name="gated_entry"),
     path(
         "session/<uuid:session_uuid>/voter/",
@@ -75,11 +76,21 @@ urlpatterns = [
         views.api_current_motion,
         name="api_current_motion",
     ),
+    path(
+        "session/<uuid:session_uuid>/api/events/",
+        views.api_display_stream,
+        name="api_display_stream",
+    ),
     path(
         "session/<uuid:session_uuid>/api/presence/",
         views.api_presence,
         name="api_presence",
     ),
+    path(
+        "session/<uuid:session_uuid>/api/attendance/",
+        views.api_attendance,
+        name="api_attendance",
+    ),
     path(
         "session/<uuid:session_uuid>/api/tallies/",
         views.api_tallies,
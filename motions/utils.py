@@ -1,19 +1,17 @@
 import secrets
+from typing import List, Optional
 
 from django.http import Http404
-from django.shortcuts import get_object_or_404
 
 
 def get_event_by_uuid(session_uuid):
     """
-    Fetch the VotingSession by canonical UUID, falling back to legacy unique_url substring.
+    Fetch the VotingSession by canonical (or pre-UUID share link) UUID through
+    the cached resolver; raises Http404.
     """
-    from voters.models import VotingSession
+    from voters.session_cache import get_session_or_404
 
-    try:
-        return VotingSession.objects.get(session_uuid=session_uuid)
-    except Exception:
-        return get_object_or_404(VotingSession, unique_url__contains=str(session_uuid))
+    return get_session_or_404(session_uuid)
 
 
 def _motion_identity(session, session_uuid, create=False):
@@ -96,3 +94,15 @@ def get_voter_identity_from_scope(scope, session_uuid=None):
     if token:
         return str(token)
     return None
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """
+    Nearest-rank percentile of ``values``, None when empty. Used by the load
+    and benchmark commands.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
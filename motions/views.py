@@ -1,7 +1,6 @@
 import logging
-from datetime import timedelta
-from typing import Dict, Optional
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
@@ -10,8 +9,8 @@ from django.http import (
     HttpResponseBadRequest,
     HttpResponseForbidden,
     JsonResponse,
+    StreamingHttpResponse,
 )
-from django.core.cache import cache
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.utils import timezone as tz
@@ -19,96 +18,51 @@ from django.views.decorators.csrf import csrf_protect, ensure_csrf_cookie
 from django.views.decorators.http import require_GET, require_POST
 
 from voters import bbs_views
-from voters.models import VotingSession
+from voters.session_cache import session_resolver
 
+from .admission import admission
+from .attendance import RESOLUTION_MINUTE, RESOLUTION_SECOND, attendance
+from .channel_registry import voter_channels
 from .forms import MotionForm
-from .models import Motion, MotionVote
-from .presence import PresenceTracker
-from .realtime import broadcast_to_admins, broadcast_to_voters, notify_voter
+from .ingest import DrainError
+from .models import Motion
+from .payloads import attach_timer_payload, motion_payload
+from .presence import PresenceTracker, presence_ticker
+from .realtime import (
+    announce_motion_closed,
+    broadcast_to_admins,
+    broadcast_to_voters,
+    notify_voter,
+    outbox,
+    queue_tally_update,
+    tally_broadcaster,
+)
+from .reconcile import reconciler
+from .redis_registry import pool_stats
+from .scheduler import scheduler
+from .sendqueue import queue_stats
 from .services import (
     close_motion as svc_close_motion,
+    final_counts,
     get_live_counts,
+    get_selections,
     open_motion as svc_open_motion,
     record_vote,
     recompute_counts,
     reset_motion_votes,
 )
+from .snapshot import clear_preview, get_snapshot, rebuild_snapshot, set_preview
+from .sse import display_stats, display_stream
 from .utils import get_event_by_uuid, get_voter_identity
 
 logger = logging.getLogger(__name__)
 
 
-PREVIEW_CACHE_TIMEOUT = 3600
-
-
-def _preview_cache_key(event_id: int) -> str:
-    return f"motions_preview_{event_id}"
-
-
-def _motion_payload(motion: Motion) -> Dict:
-    return {
-        "id": motion.id,
-        "title": motion.title,
-        "body": motion.body,
-        "status": motion.status,
-        "allow_vote_change": motion.allow_vote_change,
-        "reveal_results": motion.reveal_results,
-        "auto_close_seconds": motion.auto_close_seconds,
-        "opened_at": motion.opened_at.isoformat() if motion.opened_at else None,
-        "closed_at": motion.closed_at.isoformat() if motion.closed_at else None,
-    }
-
-
-def _attach_timer_payload(motion: Motion, payload: Dict) -> Dict:
-    payload["server_now"] = tz.now().isoformat()
-    closes_at = None
-    if motion and motion.opened_at and motion.auto_close_seconds:
-        closes_at = motion.opened_at + timedelta(seconds=motion.auto_close_seconds)
-    payload["closes_at"] = closes_at.isoformat() if closes_at else None
-    return payload
-
-
 def _ensure_staff(request):
     if not request.user.is_authenticated or not request.user.is_staff:
         return HttpResponseForbidden("Staff login required")
 
 
-def _set_preview(event_id: int, payload: Dict):
-    cache.set(_preview_cache_key(event_id), payload, timeout=PREVIEW_CACHE_TIMEOUT)
-
-
-def _clear_preview(event_id: int):
-    cache.delete(_preview_cache_key(event_id))
-
-
-def _get_preview(event_id: int) -> Optional[Dict]:
-    cached = cache.get(_preview_cache_key(event_id))
-    if not cached:
-        return None
-    return cached.copy()
-
-
-def _preview_payload_for_session(session: VotingSession) -> Optional[Dict]:
-    """
-    Retrieve the cached preview payload for a session, ensuring it still
-    references a valid motion.
-    """
-    preview = _get_preview(session.pk)
-    if not preview or "id" not in preview:
-        return None
-    try:
-        motion = Motion.objects.get(pk=preview["id"], event=session)
-    except Motion.DoesNotExist:
-        _clear_preview(session.pk)
-        return None
-    payload = _motion_payload(motion)
-    payload["preview"] = motion.status == Motion.STATUS_DRAFT
-    if motion.status == Motion.STATUS_CLOSED and motion.reveal_results:
-        payload["counts"] = recompute_counts(motion)
-    _set_preview(session.pk, payload)
-    return payload
-
-
 @require_GET
 def gated_entry(request, session_uuid):
     """
@@ -162,52 +116,33 @@ def voter_portal(request, session_uuid):
     if not identity:
         return redirect(reverse("motions:gated_entry", args=[session_uuid]))
 
-    open_motion = (
-        Motion.objects.filter(event=session, status=Motion.STATUS_OPEN)
-        .order_by("display_order", "id")
-        .first()
-    )
-    latest_closed = (
-        Motion.objects.filter(event=session, status=Motion.STATUS_CLOSED)
-        .order_by("-closed_at", "-id")
-        .first()
+    state = get_snapshot(session.pk)
+    open_payload = state["open"]
+    latest_closed_payload = state["latest_closed"]
+    preview_payload = state["preview"]
+    selections = get_selections(
+        identity,
+        open_payload["id"] if open_payload else None,
+        latest_closed_payload["id"] if latest_closed_payload else None,
     )
     selection = None
-    if open_motion:
-        selection = (
-            MotionVote.objects.filter(motion=open_motion, voter_id=identity)
-            .values_list("choice", flat=True)
-            .first()
-        )
-        _clear_preview(session.pk)
-    preview_payload = None if open_motion else _preview_payload_for_session(session)
+    if open_payload:
+        selection = selections.get(open_payload["id"])
+        if selection:
+            open_payload["selection"] = selection
     last_counts = {}
-    latest_closed_payload = None
-    if latest_closed and latest_closed.reveal_results:
-        last_counts = recompute_counts(latest_closed)
-        latest_closed_payload = _motion_payload(latest_closed)
-        latest_closed_payload["counts"] = last_counts
-        if identity:
-            latest_selection = (
-                MotionVote.objects.filter(motion=latest_closed, voter_id=identity)
-                .values_list("choice", flat=True)
-                .first()
-            )
-            if latest_selection:
-                latest_closed_payload["selection"] = latest_selection
-
-    open_payload = _motion_payload(open_motion) if open_motion else None
-    if open_payload and selection:
-        open_payload["selection"] = selection
-    if open_payload and open_motion and open_motion.status == Motion.STATUS_OPEN:
-        _attach_timer_payload(open_motion, open_payload)
+    if latest_closed_payload:
+        last_counts = latest_closed_payload["counts"]
+        latest_selection = selections.get(latest_closed_payload["id"])
+        if latest_selection:
+            latest_closed_payload["selection"] = latest_selection
 
     ws_path = f"/ws/motions/{session_uuid}/voter/"
     context = {
         "session": session,
-        "open_motion": open_motion,
+        "open_motion": open_payload,
         "open_payload": open_payload,
-        "latest_closed": latest_closed,
+        "latest_closed": latest_closed_payload,
         "latest_closed_payload": latest_closed_payload,
         "selection": selection,
         "preview_payload": preview_payload,
@@ -215,9 +150,9 @@ def voter_portal(request, session_uuid):
         "websocket_path": ws_path,
         "api_vote_url": reverse(
             "motions:api_cast_vote",
-            args=[session_uuid, open_motion.id if open_motion else 0],
+            args=[session_uuid, open_payload["id"]],
         )
-        if open_motion
+        if open_payload
         else None,
         "api_current_url": reverse("motions:api_current_motion", args=[session_uuid]),
         "api_presence_url": reverse("motions:api_presence", args=[session_uuid]),
@@ -275,7 +210,10 @@ def motion_edit(request, session_uuid, motion_id):
     motion = get_object_or_404(Motion, pk=motion_id, event=session)
     form = MotionForm(request.POST, instance=motion)
     if form.is_valid():
-        form.save()
+        motion = form.save()
+        if motion.status == Motion.STATUS_OPEN:
+            scheduler.schedule(motion)
+        rebuild_snapshot(session.pk)
         messages.success(request, "Motion updated.")
     else:
         messages.error(request, "Please correct the errors below.")
@@ -335,7 +273,7 @@ def presenter_console(request, session_uuid):
     ws_path = f"/ws/motions/{session_uuid}/admin/"
     counts = get_live_counts(open_motion.id) if open_motion else {}
     total_votes = sum(counts.values()) if counts else 0
-    open_payload = _motion_payload(open_motion) if open_motion else None
+    open_payload = motion_payload(open_motion) if open_motion else None
     context = {
         "session": session,
         "motions": motions,
@@ -349,6 +287,10 @@ def presenter_console(request, session_uuid):
     return render(request, "motions/presenter_console.html", context)
 
 
+def _pending_text(exc: DrainError) -> str:
+    return "buffered votes" if exc.pending is None else f"{exc.pending} buffered vote(s)"
+
+
 @login_required
 @require_POST
 @csrf_protect
@@ -359,10 +301,15 @@ def open_motion(request, session_uuid, motion_id):
     if not session.is_active:
         return HttpResponseForbidden("Session is not active.")
     motion = get_object_or_404(Motion, pk=motion_id, event=session)
-    motion = svc_open_motion(motion)
-    payload = _motion_payload(motion)
-    _attach_timer_payload(motion, payload)
-    _clear_preview(session.pk)
+    try:
+        motion = svc_open_motion(motion)
+    except DrainError as exc:
+        messages.error(request, f"The open motion still has {_pending_text(exc)} to record. Try again.")
+        return redirect(reverse("motions:presenter_console", args=[session_uuid]))
+    payload = motion_payload(motion)
+    attach_timer_payload(motion, payload)
+    clear_preview(session.pk)
+    rebuild_snapshot(session.pk)
     broadcast_to_voters(session.pk, "motion_opened", payload)
     broadcast_to_admins(session.pk, "motion_opened", payload)
     return redirect(reverse("motions:presenter_console", args=[session_uuid]))
@@ -386,11 +333,12 @@ def preview_motion(request, session_uuid, motion_id):
     if open_motion and open_motion.id != motion.id:
         return JsonResponse({"ok": False, "error": "motion_open"}, status=400)
 
-    payload = _motion_payload(motion)
+    payload = motion_payload(motion)
     payload["preview"] = motion.status == Motion.STATUS_DRAFT
     if motion.status == Motion.STATUS_CLOSED and motion.reveal_results:
-        payload["counts"] = recompute_counts(motion)
-    _set_preview(session.pk, payload)
+        payload["counts"] = final_counts(motion)
+    set_preview(session.pk, payload)
+    rebuild_snapshot(session.pk)
     broadcast_to_voters(session.pk, "motion_previewed", payload)
     return JsonResponse({"ok": True, "preview": payload})
 
@@ -405,13 +353,13 @@ def close_motion(request, session_uuid, motion_id):
     if not session.is_active:
         return HttpResponseForbidden("Session is not active.")
     motion = get_object_or_404(Motion, pk=motion_id, event=session)
-    counts = svc_close_motion(motion)
-    payload = _motion_payload(motion)
-    payload["counts"] = counts
-    broadcast_to_voters(session.pk, "motion_closed", payload)
-    broadcast_to_admins(session.pk, "motion_closed", payload)
-    if motion.reveal_results:
-        broadcast_to_voters(session.pk, "results_revealed", {"motion_id": motion.id, "counts": counts})
+    try:
+        counts = svc_close_motion(motion)
+    except DrainError as exc:
+        messages.error(request, f"Motion is still open: {_pending_text(exc)} to record. Close it again.")
+        return redirect(reverse("motions:presenter_console", args=[session_uuid]))
+    rebuild_snapshot(session.pk)
+    announce_motion_closed(motion, counts)
     return redirect(reverse("motions:presenter_console", args=[session_uuid]))
 
 
@@ -427,7 +375,8 @@ def reveal_motion_results(request, session_uuid, motion_id):
     motion = get_object_or_404(Motion, pk=motion_id, event=session)
     motion.reveal_results = True
     motion.save(update_fields=["reveal_results"])
-    counts = recompute_counts(motion)
+    counts = final_counts(motion) if motion.is_closed else recompute_counts(motion)
+    rebuild_snapshot(session.pk)
     broadcast_to_voters(session.pk, "results_revealed", {"motion_id": motion.id, "counts": counts})
     broadcast_to_admins(session.pk, "results_revealed", {"motion_id": motion.id, "counts": counts})
     return redirect(reverse("motions:presenter_console", args=[session_uuid]))
@@ -445,6 +394,7 @@ def hide_motion_results(request, session_uuid, motion_id):
     motion = get_object_or_404(Motion, pk=motion_id, event=session)
     motion.reveal_results = False
     motion.save(update_fields=["reveal_results"])
+    rebuild_snapshot(session.pk)
     broadcast_to_voters(session.pk, "results_hidden", {"motion_id": motion.id})
     return redirect(reverse("motions:presenter_console", args=[session_uuid]))
 
@@ -460,6 +410,7 @@ def reset_motion_votes_view(request, session_uuid, motion_id):
         return HttpResponseForbidden("Session is not active.")
     motion = get_object_or_404(Motion, pk=motion_id, event=session)
     reset_motion_votes(motion)
+    rebuild_snapshot(session.pk)
     payload = {"motion_id": motion.id, "counts": {"yes": 0, "no": 0, "abstain": 0}}
     broadcast_to_admins(session.pk, "admin_vote_update", payload)
     broadcast_to_voters(session.pk, "admin_vote_update", payload)
@@ -481,12 +432,11 @@ def api_cast_vote(request, session_uuid, motion_id):
     choice = (request.POST.get("choice") or "").lower()
     ok, data = record_vote(motion, identity, choice)
     if not ok:
-        status = 400 if data.get("error") in ("invalid_choice",) else 403
+        status = {"invalid_choice": 400, "vote_unavailable": 503}.get(data.get("error"), 403)
         return JsonResponse({"ok": False, **data}, status=status)
 
-    counts = get_live_counts(motion.id)
     notify_voter(session.pk, identity, "vote_ack", {"motion_id": motion.id, **data})
-    broadcast_to_admins(session.pk, "admin_vote_update", {"motion_id": motion.id, "counts": counts})
+    queue_tally_update(session.pk, motion.id)
     return JsonResponse({"ok": True, **data})
 
 
@@ -496,44 +446,42 @@ def api_current_motion(request, session_uuid):
     if not session.is_active:
         return JsonResponse({"ok": False, "error": "inactive_session"}, status=403)
     identity = get_voter_identity(request, session_uuid=session_uuid, create=True)
-    open_motion = (
-        Motion.objects.filter(event=session, status=Motion.STATUS_OPEN)
-        .order_by("display_order", "id")
-        .first()
-    )
-    closed_motion = (
-        Motion.objects.filter(event=session, status=Motion.STATUS_CLOSED)
-        .order_by("-closed_at", "-id")
-        .first()
-    )
-    payload: Dict[str, Optional[Dict]] = {"open": None, "latest_closed": None, "preview": None}
-    if open_motion:
-        payload["open"] = _motion_payload(open_motion)
-        if identity:
-            vote = (
-                MotionVote.objects.filter(motion=open_motion, voter_id=identity)
-                .values_list("choice", flat=True)
-                .first()
-            )
-            payload["open"]["selection"] = vote
-        _attach_timer_payload(open_motion, payload["open"])
-        _clear_preview(session.pk)
-    else:
-        payload["preview"] = _preview_payload_for_session(session)
-    if closed_motion and closed_motion.reveal_results:
-        payload["latest_closed"] = _motion_payload(closed_motion)
-        payload["latest_closed"]["counts"] = recompute_counts(closed_motion)
-        if identity:
-            last_vote = (
-                MotionVote.objects.filter(motion=closed_motion, voter_id=identity)
-                .values_list("choice", flat=True)
-                .first()
-            )
-            if last_vote:
-                payload["latest_closed"]["selection"] = last_vote
+    payload = get_snapshot(session.pk)
+    open_payload = payload["open"]
+    closed_payload = payload["latest_closed"]
+    if identity and (open_payload or closed_payload):
+        selections = get_selections(
+            identity,
+            open_payload["id"] if open_payload else None,
+            closed_payload["id"] if closed_payload else None,
+        )
+        if open_payload:
+            open_payload["selection"] = selections.get(open_payload["id"])
+        if closed_payload and selections.get(closed_payload["id"]):
+            closed_payload["selection"] = selections[closed_payload["id"]]
     return JsonResponse({"ok": True, **payload})
 
 
+@require_GET
+async def api_display_stream(request, session_uuid):
+    """
+    SSE stream of voter broadcasts for read-only displays; resumes from
+    ``Last-Event-ID`` (or ``?last_seq=``) and does not count as presence.
+    """
+    session = await sync_to_async(get_event_by_uuid)(session_uuid)
+    if not session.is_active:
+        return JsonResponse({"ok": False, "error": "inactive_session"}, status=403)
+    raw = request.headers.get("Last-Event-ID") or request.GET.get("last_seq")
+    try:
+        last_seq = int(raw) if raw else None
+    except ValueError:
+        last_seq = None
+    response = StreamingHttpResponse(display_stream(session.pk, last_seq), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 @require_GET
 def api_presence(request, session_uuid):
     session = get_event_by_uuid(session_uuid)
@@ -543,6 +491,29 @@ def api_presence(request, session_uuid):
     return JsonResponse({"ok": True, "count": count})
 
 
+@login_required
+@require_GET
+def api_attendance(request, session_uuid):
+    if not request.user.is_staff:
+        return HttpResponseForbidden("Staff login required")
+    session = get_event_by_uuid(session_uuid)
+    resolution = request.GET.get("resolution") or RESOLUTION_MINUTE
+    if resolution not in (RESOLUTION_MINUTE, RESOLUTION_SECOND):
+        return JsonResponse({"ok": False, "error": "invalid_resolution"}, status=400)
+    try:
+        since = int(request.GET["since"]) if request.GET.get("since") else None
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "invalid_since"}, status=400)
+    return JsonResponse(
+        {
+            "ok": True,
+            "resolution": resolution,
+            "points": attendance.history(session.pk, resolution, since),
+            "current": PresenceTracker().count(session.pk),
+        }
+    )
+
+
 @login_required
 @require_GET
 def api_tallies(request, session_uuid):
@@ -563,11 +534,34 @@ def api_tallies(request, session_uuid):
         )
     if not motion:
         return JsonResponse({"ok": True, "counts": {}, "motion_id": None})
-    counts = recompute_counts(motion) if motion.is_closed else get_live_counts(motion.id)
+    counts = final_counts(motion) if motion.is_closed else get_live_counts(motion.id)
     total = sum(counts.values()) if counts else 0
     return JsonResponse({"ok": True, "counts": counts, "motion_id": motion.id, "total": total})
 
 
+@login_required
+@require_GET
+def api_metrics(request):
+    if not request.user.is_staff:
+        return HttpResponseForbidden("Staff login required")
+    return JsonResponse(
+        {
+            "ok": True,
+            "redis": pool_stats(),
+            "tally_broadcast": tally_broadcaster.stats(),
+            "autoclose": scheduler.stats(),
+            "reconcile": reconciler.stats(),
+            "presence": presence_ticker.stats(),
+            "outbox": outbox.stats(),
+            "channel_registry": voter_channels.stats(),
+            "display_streams": display_stats(),
+            "send_queues": queue_stats.as_dict(),
+            "admission": admission.stats(),
+            "session_resolver": session_resolver.stats(),
+        }
+    )
+
+
 @login_required
 @require_POST
 @csrf_protect
@@ -608,8 +602,10 @@ def api_set_timer(request, session_uuid, motion_id):
 
     Motion.objects.filter(pk=motion.pk).update(opened_at=now, auto_close_seconds=target_seconds)
     motion.refresh_from_db(fields=["opened_at", "auto_close_seconds"])
-    payload = _motion_payload(motion)
-    _attach_timer_payload(motion, payload)
+    scheduler.schedule(motion)
+    rebuild_snapshot(session.pk)
+    payload = motion_payload(motion)
+    attach_timer_payload(motion, payload)
     broadcast_to_admins(session.pk, "timer_updated", payload)
     broadcast_to_voters(session.pk, "timer_updated", payload)
     return JsonResponse({"ok": True, "motion": payload})
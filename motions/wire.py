@@ -0,0 +1,127 @@
+"""
+Wire formats for motion WebSocket frames.
+
+Clients that offer the ``motions.msgpack.v1`` subprotocol get binary frames:
+a msgpack array ``[event, payload]`` (``[event, payload, seq]`` for
+sequenced broadcasts) where known event names are small integers and known
+payload keys are shortened (``EVENT_CODES`` and ``KEY_CODES`` are the
+contract). Everyone else gets the JSON text frame
+``{"event": ..., "payload": ..., "seq": ...}``. Broadcast frames are encoded
+in both formats once, when they are queued, and the consumers forward the
+encoded frame as-is.
+"""
+import json
+from typing import Any, Dict, Optional, Union
+
+try:  # msgpack is optional; without it only JSON is offered
+    import msgpack  # type: ignore
+except Exception:  # pragma: no cover - handled by fallback
+    msgpack = None
+
+SUBPROTOCOL_MSGPACK = "motions.msgpack.v1"
+
+# Append only: codes are part of the binary protocol.
+EVENT_CODES: Dict[str, int] = {
+    "connection": 1,
+    "heartbeat_ack": 2,
+    "error": 3,
+    "presence_update": 4,
+    "admin_vote_update": 5,
+    "vote_ack": 6,
+    "vote_error": 7,
+    "motion_opened": 8,
+    "motion_closed": 9,
+    "motion_previewed": 10,
+    "results_revealed": 11,
+    "results_hidden": 12,
+    "timer_updated": 13,
+}
+
+KEY_CODES: Dict[str, str] = {
+    "id": "i",
+    "motion_id": "m",
+    "title": "t",
+    "body": "b",
+    "status": "s",
+    "allow_vote_change": "avc",
+    "reveal_results": "rr",
+    "auto_close_seconds": "acs",
+    "opened_at": "oa",
+    "closed_at": "ca",
+    "closes_at": "cl",
+    "server_now": "sn",
+    "preview": "pv",
+    "counts": "c",
+    "count": "n",
+    "active_count": "ac",
+    "role": "r",
+    "choice": "ch",
+    "previous": "pr",
+    "created": "cr",
+    "changed": "cg",
+    "ref": "rf",
+    "error": "er",
+    "message": "ms",
+}
+
+_EVENT_NAMES = {code: name for name, code in EVENT_CODES.items()}
+_KEY_NAMES = {short: name for name, short in KEY_CODES.items()}
+
+
+def state_key(event: str, payload: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    Key for frames that only carry the latest value of something, so a newer
+    frame with the same key supersedes a queued older one; None otherwise.
+    """
+    if event == "presence_update":
+        return event
+    if event == "admin_vote_update" and payload:
+        return f"{event}:{payload.get('motion_id')}"
+    return None
+
+
+def binary_available() -> bool:
+    return msgpack is not None
+
+
+def _rekey(value: Any, table: Dict[str, str]) -> Any:
+    if isinstance(value, dict):
+        return {table.get(key, key): _rekey(item, table) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_rekey(item, table) for item in value]
+    return value
+
+
+def encode_text(event: str, payload: Optional[Dict[str, Any]], seq: Optional[int] = None) -> str:
+    frame = {"event": event, "payload": payload}
+    if seq is not None:
+        frame["seq"] = seq
+    return json.dumps(frame)
+
+
+def encode_binary(event: str, payload: Optional[Dict[str, Any]], seq: Optional[int] = None) -> Optional[bytes]:
+    if msgpack is None:
+        return None
+    frame = [EVENT_CODES.get(event, event), _rekey(payload, KEY_CODES)]
+    if seq is not None:
+        frame.append(seq)
+    return msgpack.packb(frame, use_bin_type=True)
+
+
+def decode_binary(data: bytes) -> Dict[str, Any]:
+    """
+    Inverse of ``encode_binary``, for tests and tooling.
+    """
+    event, payload, *seq = msgpack.unpackb(data, raw=False)
+    frame = {"event": _EVENT_NAMES.get(event, event), "payload": _rekey(payload, _KEY_NAMES)}
+    if seq:
+        frame["seq"] = seq[0]
+    return frame
+
+
+def decode_client(data: Union[bytes, bytearray]) -> Any:
+    """
+    Client messages on the binary subprotocol: the same object as the JSON
+    form (``{"type": "cast", ...}``), msgpack-encoded, with long keys.
+    """
+    return msgpack.unpackb(data, raw=False)
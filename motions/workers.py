@@ -0,0 +1,25 @@
+"""
+Start the in-process background workers when a server process boots.
+
+Called from ``voting_system.asgi`` and ``voting_system.wsgi`` once the app
+is loaded, rather than from ``AppConfig.ready()``, so ``migrate``, ``shell``
+and the test runner do not spawn threads. Workers configured to run as a
+management command (``MOTION_AUTOCLOSE_WORKER="command"``,
+``MOTION_RECONCILE_WORKER="command"``) are left to it.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def start_background_workers():
+    from . import reconcile, scheduler
+
+    if scheduler.worker_mode() == scheduler.WORKER_THREAD:
+        # run_forever reloads deadlines of open timed motions first.
+        scheduler.scheduler.ensure_started()
+        logger.info("Auto-close worker started")
+    if reconcile.worker_mode() == reconcile.WORKER_THREAD:
+        # Repairs tallies of motions left open across the restart.
+        reconcile.reconciler.ensure_started()
+        logger.info("Tally reconciler started")
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class VotersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'voters'
+
+    def ready(self):
+        from .models import VotingSession
+        from .session_cache import invalidate_session
+
+        post_save.connect(invalidate_session, sender=VotingSession, dispatch_uid='voters_session_cache_save')
+        post_delete.connect(invalidate_session, sender=VotingSession, dispatch_uid='voters_session_cache_delete')
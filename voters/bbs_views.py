@@ -1,4 +1,4 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from django.shortcuts import render, redirect
 from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseForbidden
 from django.views.decorators.http import require_http_methods, require_POST, require_GET
 from django.views.decorators.csrf import csrf_protect
@@ -13,7 +13,8 @@ try:
 except Exception:  # pragma: no cover
     requests = None
 
-from .models import VotingSession, VotingSegmentHeader, Candidate, Ballot, ManualCheckCard, log_event
+from .models import VotingSegmentHeader, Candidate, Ballot, ManualCheckCard, log_event
+from .session_cache import get_session_or_404, session_resolver
 
 
 def _host_ok(request, expect='vote'):
@@ -71,10 +72,7 @@ def ballot_entry(request, session_uuid):
     # Accept optional ?handoff=<code> for first entry and ?segment=<n> for navigation
     code = request.GET.get("handoff")
     seg_num = int(request.GET.get("segment", "1") or 1)
-    try:
-        session = VotingSession.objects.get(session_uuid=session_uuid)
-    except Exception:
-        session = get_object_or_404(VotingSession, unique_url__contains=f"{session_uuid}")
+    session = get_session_or_404(session_uuid)
     if not session.is_active:
         return HttpResponseForbidden("Session is not active.")
 
@@ -143,12 +141,9 @@ def api_cast(request):
     if not anon_id or str(session_uuid) != str(anon_session_uuid):
         return HttpResponseForbidden("Session expired or mismatched")
 
-    try:
-        session = VotingSession.objects.get(session_uuid=session_uuid)
-    except VotingSession.DoesNotExist:
-        session = VotingSession.objects.filter(unique_url__contains=f"{session_uuid}").first()
-        if not session:
-            return JsonResponse({"error": "session_not_found"}, status=404)
+    session = session_resolver.resolve(session_uuid)
+    if not session:
+        return JsonResponse({"error": "session_not_found"}, status=404)
     if not session.is_active:
         return JsonResponse({"error": "inactive_session"}, status=403)
 
@@ -236,10 +231,7 @@ def api_cast(request):
 
 @require_GET
 def results(request, session_uuid):
-    try:
-        session = VotingSession.objects.get(session_uuid=session_uuid)
-    except Exception:
-        session = get_object_or_404(VotingSession, unique_url__contains=f"{session_uuid}")
+    session = get_session_or_404(session_uuid)
     from django.db.models import Count
     segments = list(VotingSegmentHeader.objects.filter(session=session).order_by('order', 'id'))
     # Precompute ballot counts per (segment, candidate)
@@ -288,10 +280,7 @@ def thanks(request, session_uuid):
     """Neutral confirmation page after anonymous cast with optional receipt download.
     Uses segment/candidate metadata to help client render a PNG receipt locally.
     """
-    try:
-        session = VotingSession.objects.get(session_uuid=session_uuid)
-    except Exception:
-        session = get_object_or_404(VotingSession, unique_url__contains=f"{session_uuid}")
+    session = get_session_or_404(session_uuid)
 
     # Provide lightweight metadata for client-side receipt rendering
     segments = []
@@ -318,10 +307,7 @@ def thanks(request, session_uuid):
 def export_cvr(request, session_uuid):
     import csv
     from django.http import HttpResponse
-    try:
-        session = VotingSession.objects.get(session_uuid=session_uuid)
-    except Exception:
-        session = get_object_or_404(VotingSession, unique_url__contains=f"{session_uuid}")
+    session = get_session_or_404(session_uuid)
     rows = (Ballot.objects.filter(session=session)
             .select_related('segment', 'candidate')
             .order_by('created_at'))
@@ -1,4 +1,4 @@
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import render
 from django.http import JsonResponse, HttpResponseForbidden, HttpResponseBadRequest
 from django.views.decorators.http import require_POST, require_GET
 from django.views.decorators.csrf import csrf_protect, csrf_exempt
@@ -8,7 +8,8 @@ from django.db import transaction
 import secrets, base64, hmac, hashlib, json, os, logging
 from django.urls import reverse
 
-from .models import VotingSession, Voter, AnonSession, RedirectCode, log_event
+from .models import Voter, AnonSession, RedirectCode, log_event
+from .session_cache import get_session_or_404, session_resolver
 
 logger = logging.getLogger(__name__)
 
@@ -29,11 +30,8 @@ def _host_ok(request, expect='verify'):
 def verify_form(request, session_uuid):
     if not _host_ok(request, 'verify'):
         return HttpResponseForbidden("Wrong host")
-    # Support both future session_uuid field and legacy unique_url substring
-    try:
-        session = VotingSession.objects.get(session_uuid=session_uuid)
-    except Exception:
-        session = get_object_or_404(VotingSession, unique_url__contains=f"{session_uuid}")
+    # session_uuid, or the legacy_uuid of sessions linked before it existed
+    session = get_session_or_404(session_uuid)
     if not session.is_active:
         return HttpResponseForbidden("Session is not active.")
     return render(request, 'voters/voter_verification.html', {'session': session})
@@ -50,15 +48,12 @@ def api_verify(request):
     lname = (request.POST.get('Lname') or request.POST.get('lname') or request.POST.get('last_name') or '').strip()
     if not session_uuid or not fname or not lname:
         return HttpResponseBadRequest("Missing fields")
-    # Support both the new UUID field and legacy unique_url contains
-    try:
-        session = VotingSession.objects.get(session_uuid=session_uuid)
-    except Exception:
-        session = get_object_or_404(VotingSession, unique_url__contains=f"{session_uuid}")
+    # session_uuid, or the legacy_uuid of sessions linked before it existed
+    session = get_session_or_404(session_uuid)
     if not session.is_active:
         return JsonResponse({'ok': False, 'error': 'inactive_session'}, status=403)
 
-    voter = Voter.objects.filter(session=session, Fname__iexact=fname, Lname__iexact=lname).first()
+    voter = Voter.objects.filter(session=session).with_name(fname, lname).first()
     if not voter:
         return JsonResponse({'ok': False, 'error': 'Not found'}, status=404)
 
@@ -119,10 +114,7 @@ def api_redeem(request):
     if not code or not session_uuid:
         return HttpResponseBadRequest("Missing fields")
 
-    try:
-        session = VotingSession.objects.get(session_uuid=session_uuid)
-    except Exception:
-        session = get_object_or_404(VotingSession, unique_url__contains=f"{session_uuid}")
+    session = get_session_or_404(session_uuid)
     if not session.is_active:
         return JsonResponse({"ok": False, "error": "inactive_session"}, status=403)
 
@@ -156,12 +148,9 @@ def api_redeem(request):
 
 @transaction.atomic
 def _mark_spent(session_uuid, anon_id):
-    try:
-        session = VotingSession.objects.get(session_uuid=session_uuid)
-    except VotingSession.DoesNotExist:
-        session = VotingSession.objects.filter(unique_url__contains=f"{session_uuid}").first()
-        if not session:
-            return 404, {"ok": False, "error": "session_not_found"}
+    session = session_resolver.resolve(session_uuid)
+    if not session:
+        return 404, {"ok": False, "error": "session_not_found"}
     if not session.is_active:
         return 403, {"ok": False, "error": "inactive_session"}
 
@@ -223,10 +212,7 @@ def api_mark_spent(request):
 @require_GET
 def voter_status(request, session_uuid):
     # For your admin dashboard polling
-    try:
-        session = VotingSession.objects.get(session_uuid=session_uuid)
-    except Exception:
-        session = get_object_or_404(VotingSession, unique_url__contains=f"{session_uuid}")
+    session = get_session_or_404(session_uuid)
     total = Voter.objects.filter(session=session).count()
     verified = Voter.objects.filter(session=session, is_verified=True).count()
     finished = Voter.objects.filter(session=session, has_finished=True).count()
@@ -0,0 +1,36 @@
+import re
+import uuid
+
+from django.db import migrations, models
+
+UUID_RE = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', re.I)
+
+
+def populate_legacy_uuid(apps, schema_editor):
+    # Share URLs minted before session_uuid carried their own random UUID;
+    # keep it so those links resolve without a unique_url substring scan.
+    VotingSession = apps.get_model('voters', 'VotingSession')
+    for vs in VotingSession.objects.exclude(unique_url__isnull=True).exclude(unique_url=''):
+        found = UUID_RE.findall(vs.unique_url)
+        if not found:
+            continue
+        legacy = uuid.UUID(found[-1])
+        if legacy != vs.session_uuid:
+            vs.legacy_uuid = legacy
+            vs.save(update_fields=['legacy_uuid'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voters', '0018_voter_email_voter_phone_number_voter_registered_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='votingsession',
+            name='legacy_uuid',
+            field=models.UUIDField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_legacy_uuid, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations, models
+
+
+def _norm(value):
+    # Frozen copy of voters.models.normalize_name.
+    return ' '.join(str(value or '').split()).casefold()
+
+
+def populate_name_norms(apps, schema_editor):
+    Voter = apps.get_model('voters', 'Voter')
+    batch = []
+    for voter in Voter.objects.only('voter_id', 'Fname', 'Lname').iterator(chunk_size=2000):
+        voter.fname_norm = _norm(voter.Fname)
+        voter.lname_norm = _norm(voter.Lname)
+        batch.append(voter)
+        if len(batch) >= 2000:
+            Voter.objects.bulk_update(batch, ['fname_norm', 'lname_norm'])
+            batch = []
+    if batch:
+        Voter.objects.bulk_update(batch, ['fname_norm', 'lname_norm'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voters', '0019_votingsession_legacy_uuid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voter',
+            name='fname_norm',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='voter',
+            name='lname_norm',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        # Backfill before building the index so it is built once.
+        migrations.RunPython(populate_name_norms, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['session', 'lname_norm', 'fname_norm'], name='voters_voter_name_norm_idx'),
+        ),
+    ]
@@ -11,6 +11,25 @@ from django.urls import reverse
 # Create your models here.
 
 
+def normalize_name(value) -> str:
+    """
+    Case- and whitespace-folded form of a voter name, used for matching.
+    """
+    return ' '.join(str(value or '').split()).casefold()
+
+
+class VoterQuerySet(models.QuerySet):
+    def with_name(self, fname, lname):
+        # Served by the (session, lname_norm, fname_norm) index, unlike iexact.
+        return self.filter(lname_norm=normalize_name(lname), fname_norm=normalize_name(fname))
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.set_name_norms()
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Voter(models.Model):
     SOURCE_ADMIN = 'admin'
     SOURCE_IMPORT = 'import'
@@ -51,8 +70,28 @@ class Voter(models.Model):
         db_index=True,
     )
     registered_at = models.DateTimeField(default=tz.now)
+    # Folded copies of Fname/Lname for verification lookups; set on save and
+    # bulk_create, never edited directly
+    fname_norm = models.CharField(max_length=200, blank=True, default='', editable=False)
+    lname_norm = models.CharField(max_length=200, blank=True, default='', editable=False)
 
-    
+    objects = VoterQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['session', 'lname_norm', 'fname_norm'], name='voters_voter_name_norm_idx'),
+        ]
+
+    def set_name_norms(self):
+        self.fname_norm = normalize_name(self.Fname)
+        self.lname_norm = normalize_name(self.Lname)
+
+    def save(self, *args, **kwargs):
+        self.set_name_norms()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'Fname', 'Lname'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'fname_norm', 'lname_norm'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.Fname} {self.Lname}"
@@ -71,6 +110,9 @@ class VotingSession(models.Model):
     session_id = models.AutoField(primary_key=True)
     # New stable UUID for public entry and cross-host lookups
     session_uuid = models.UUIDField(default=uuid.uuid4, unique=True, db_index=True)
+    # UUID from the share URL of sessions created before session_uuid existed,
+    # so their printed QR codes still resolve
+    legacy_uuid = models.UUIDField(blank=True, null=True, db_index=True, editable=False)
     title = models.CharField(max_length=200)
     unique_url = models.URLField(unique=True, blank=True, null=True)
     is_active = models.BooleanField(default=False)
@@ -0,0 +1,244 @@
+"""
+Cached resolution of a VotingSession from the public UUID in a URL.
+
+Every public page, API call and motion WebSocket connect starts by turning
+the UUID in its path into a ``VotingSession``. ``session_resolver`` keeps the
+row's column values as an immutable tuple in a small per-process LRU, in
+front of a shared layer (Redis, or the Django cache when that is shared
+between processes), and builds a fresh model instance from them on each
+call, so a hit costs no query and callers are free to modify the instance
+they get back. Unknown UUIDs are cached as misses as well. With neither
+Redis nor a shared cache there is no shared layer: a process-local copy
+could not be invalidated from the process that saved the session.
+
+Shared entries are keyed by a per-UUID generation that a save or delete of
+the session bumps (again once the transaction commits), so a row read just
+before the save is written under a generation nobody reads any more. The
+save also drops this process's LRU entry; other processes' LRUs hold an
+entry for at most ``LOCAL_TTL_SEC``. Sessions created before
+``session_uuid`` existed are found through the indexed ``legacy_uuid``
+column, which replaces the old ``unique_url__contains`` scan.
+"""
+import datetime
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+from django.http import Http404
+
+from motions.redis_registry import cache_is_shared, get_redis, record_failure
+
+from .models import VotingSession
+
+logger = logging.getLogger(__name__)
+
+LOCAL_SIZE = int(getattr(settings, "SESSION_RESOLVER_LOCAL_SIZE", 512))
+LOCAL_TTL_SEC = float(getattr(settings, "SESSION_RESOLVER_LOCAL_TTL_SEC", 5))
+SHARED_TTL_SEC = int(getattr(settings, "SESSION_RESOLVER_TTL_SEC", 300))
+# Misses are kept briefly: enough to absorb a burst of junk UUIDs.
+MISS_TTL_SEC = 30
+
+# Column values in ``_FIELDS`` order, or None for a UUID with no session.
+Row = Optional[Tuple[Any, ...]]
+
+_FIELDS = list(VotingSession._meta.concrete_fields)
+
+
+def _gen_key(session_uuid: str) -> str:
+    return f"voters:session:{session_uuid}:gen"
+
+
+def _key(session_uuid: str, gen: int) -> str:
+    return f"voters:session:{session_uuid}:{gen}"
+
+
+def _canonical(session_uuid) -> Optional[str]:
+    try:
+        return str(session_uuid if isinstance(session_uuid, uuid.UUID) else uuid.UUID(str(session_uuid)))
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def _row(session: VotingSession) -> Tuple[Any, ...]:
+    return tuple(field.get_prep_value(getattr(session, field.attname)) for field in _FIELDS)
+
+
+def _encode(row: Row) -> str:
+    if row is None:
+        return "null"
+    values: List[Any] = []
+    for value in row:
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            value = value.isoformat()
+        elif isinstance(value, uuid.UUID):
+            value = str(value)
+        values.append(value)
+    return json.dumps(values)
+
+
+def _decode(raw: str) -> Row:
+    values = json.loads(raw)
+    if values is None:
+        return None
+    return tuple(field.to_python(value) for field, value in zip(_FIELDS, values))
+
+
+class SessionResolver:
+    def __init__(self, size: int = LOCAL_SIZE, ttl: float = LOCAL_TTL_SEC):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # canonical UUID -> (expires at, row)
+        self._local: "OrderedDict[str, Tuple[float, Row]]" = OrderedDict()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.queries = 0
+
+    def _local_get(self, key: str) -> Tuple[bool, Row]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return False, None
+            if entry[0] <= now:
+                del self._local[key]
+                return False, None
+            self._local.move_to_end(key)
+            self.local_hits += 1
+            return True, entry[1]
+
+    def _local_put(self, key: str, row: Row):
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.ttl, row)
+            self._local.move_to_end(key)
+            while len(self._local) > self.size:
+                self._local.popitem(last=False)
+
+    def _shared_get(self, session_uuid: str) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Current generation and cached row for a UUID; the generation is None
+        when there is no shared layer.
+        """
+        client = get_redis()
+        if client:
+            try:
+                gen = int(client.get(_gen_key(session_uuid)) or 0)
+                raw = client.get(_key(session_uuid, gen))
+                return gen, raw.decode() if isinstance(raw, bytes) else raw
+            except Exception as exc:  # pragma: no cover
+                record_failure(exc)
+                logger.debug("Redis session lookup fallback to cache")
+        if not cache_is_shared():
+            return None, None
+        gen = int(cache.get(_gen_key(session_uuid)) or 0)
+        return gen, cache.get(_key(session_uuid, gen))
+
+    def _shared_put(self, session_uuid: str, gen: Optional[int], row: Row):
+        if gen is None:
+            return
+        key = _key(session_uuid, gen)
+        encoded = _encode(row)
+        ttl = SHARED_TTL_SEC if row is not None else MISS_TTL_SEC
+        client = get_redis()
+        if client:
+            try:
+                client.set(key, encoded, ex=ttl)
+                return
+            except Exception as exc:  # pragma: no cover
+                record_failure(exc)
+                logger.debug("Redis session store fallback to cache")
+        if cache_is_shared():
+            cache.set(key, encoded, timeout=ttl)
+
+    def _query(self, session_uuid: str) -> Row:
+        self.queries += 1
+        session = VotingSession.objects.filter(session_uuid=session_uuid).first()
+        if session is None:
+            session = (
+                VotingSession.objects.filter(legacy_uuid=session_uuid).order_by("session_id").first()
+            )
+        return _row(session) if session is not None else None
+
+    def resolve(self, session_uuid) -> Optional[VotingSession]:
+        """
+        The session whose ``session_uuid`` (or pre-UUID share link) matches,
+        or None.
+        """
+        canonical = _canonical(session_uuid)
+        if canonical is None:
+            return None
+        found, row = self._local_get(canonical)
+        if not found:
+            gen, raw = self._shared_get(canonical)
+            if raw is not None:
+                self.shared_hits += 1
+                row = _decode(raw)
+            else:
+                row = self._query(canonical)
+                self._shared_put(canonical, gen, row)
+            self._local_put(canonical, row)
+        if row is None:
+            return None
+        return VotingSession.from_db(
+            router.db_for_read(VotingSession), [field.attname for field in _FIELDS], list(row)
+        )
+
+    def invalidate(self, session: VotingSession):
+        uuids = [str(value) for value in (session.session_uuid, session.legacy_uuid) if value]
+        with self._lock:
+            for session_uuid in uuids:
+                self._local.pop(session_uuid, None)
+        client = get_redis()
+        if client and uuids:
+            try:
+                pipe = client.pipeline()
+                for session_uuid in uuids:
+                    pipe.incr(_gen_key(session_uuid))
+                pipe.execute()
+            except Exception as exc:  # pragma: no cover
+                record_failure(exc)
+        if cache_is_shared():
+            for session_uuid in uuids:
+                key = _gen_key(session_uuid)
+                cache.add(key, 0, timeout=None)
+                try:
+                    cache.incr(key)
+                except ValueError:  # pragma: no cover - evicted between add and incr
+                    cache.set(key, 1, timeout=None)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._local)
+        return {
+            "local_size": size,
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "queries": self.queries,
+        }
+
+
+session_resolver = SessionResolver()
+
+
+def get_session_or_404(session_uuid) -> VotingSession:
+    session = session_resolver.resolve(session_uuid)
+    if session is None:
+        raise Http404("No VotingSession matches the given query.")
+    return session
+
+
+def invalidate_session(sender, instance, **kwargs):
+    session_resolver.invalidate(instance)
+    # A lookup between now and the commit still reads the old row.
+    transaction.on_commit(lambda: session_resolver.invalidate(instance))
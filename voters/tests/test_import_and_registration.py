@@ -1,9 +1,13 @@
+from unittest import mock
+
+import fakeredis
 from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 from voters.models import VotingSession, Voter
+from voters.views import _rate_limited
 
 
 class ImportAndSelfRegistrationTests(TestCase):
@@ -32,6 +36,27 @@ class ImportAndSelfRegistrationTests(TestCase):
         voter = voters.first()
         self.assertEqual(voter.registration_source, Voter.SOURCE_IMPORT)
         self.assertEqual(voter.registration_status, Voter.STATUS_APPROVED)
+        self.assertEqual((voter.fname_norm, voter.lname_norm), ("ada", "lovelace"))
+
+    def test_name_lookup_uses_normalized_columns(self):
+        voter = Voter.objects.create(session=self.session, Fname="Mary  Ann", Lname="O'Brien")
+        self.assertEqual((voter.fname_norm, voter.lname_norm), ("mary ann", "o'brien"))
+        match = Voter.objects.filter(session=self.session).with_name(" mary ann ", "O'BRIEN")
+        self.assertEqual(list(match), [voter])
+
+        voter.Lname = "Smith"
+        voter.save(update_fields=["Lname"])
+        voter.refresh_from_db()
+        self.assertEqual(voter.lname_norm, "smith")
+        self.assertTrue(self.session.voters.with_name("Mary Ann", "smith").exists())
+
+    def test_duplicate_self_registration_matches_any_case(self):
+        Voter.objects.create(session=self.session, Fname="Grace", Lname="Hopper")
+        url = reverse("self_register", args=[self.session.session_uuid])
+        resp = self.client.post(url, {"Fname": "GRACE", "Lname": "hopper"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.context["already_registered"])
+        self.assertEqual(Voter.objects.filter(session=self.session).count(), 1)
 
     def test_self_registration_creates_pending_voter(self):
         url = reverse("self_register", args=[self.session.session_uuid])
@@ -55,3 +80,13 @@ class ImportAndSelfRegistrationTests(TestCase):
         url = reverse("self_register", args=[self.session.session_uuid])
         resp = self.client.get(url)
         self.assertEqual(resp.status_code, 403)
+
+    def test_rate_limit_on_redis_6(self):
+        client = fakeredis.FakeRedis(version=6)
+        with mock.patch("motions.redis_registry.get_redis", return_value=client), \
+                mock.patch("motions.redis_registry.record_failure") as failed:
+            results = [_rate_limited("selfreg:test", 2, 60) for _ in range(3)]
+        self.assertEqual(results, [False, False, True])
+        self.assertFalse(failed.called)
+        self.assertLessEqual(client.ttl("selfreg:test"), 60)
+        self.assertGreater(client.ttl("selfreg:test"), 0)
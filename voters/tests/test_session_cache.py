@@ -0,0 +1,86 @@
+import uuid
+from unittest import mock
+
+import fakeredis
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import Http404
+from django.test import TestCase
+
+from motions.redis_registry import registry
+from voters.models import VotingSession
+from voters.session_cache import get_session_or_404, session_resolver
+
+
+class SessionResolverTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        session_resolver.clear_local()
+        self.admin = User.objects.create_user(username="admin", password="pw")
+        self.session = VotingSession.objects.create(title="AGM", admin=self.admin, is_active=True)
+
+    def test_hit_builds_instance_without_query(self):
+        first = get_session_or_404(self.session.session_uuid)
+        with self.assertNumQueries(0):
+            again = get_session_or_404(str(self.session.session_uuid))
+        self.assertEqual(again.pk, self.session.pk)
+        self.assertEqual(again.title, "AGM")
+        self.assertEqual(again.admin_id, self.admin.pk)
+        self.assertEqual(again.created_at, self.session.created_at)
+        self.assertIsNot(again, first)
+
+    def _redis(self):
+        patcher = mock.patch.object(registry, "get_client", return_value=fakeredis.FakeRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_shared_layer_serves_other_processes(self):
+        self._redis()
+        get_session_or_404(self.session.session_uuid)
+        session_resolver.clear_local()
+        with self.assertNumQueries(0):
+            session = get_session_or_404(self.session.session_uuid)
+        self.assertEqual(session.session_uuid, self.session.session_uuid)
+        self.assertTrue(session.is_active)
+
+    def test_no_shared_layer_without_redis_or_shared_cache(self):
+        get_session_or_404(self.session.session_uuid)
+        session_resolver.clear_local()
+        with self.assertNumQueries(1):
+            get_session_or_404(self.session.session_uuid)
+
+    def test_lookup_racing_a_save_does_not_cache_the_old_row(self):
+        self._redis()
+        query = session_resolver._query
+
+        def slow_query(session_uuid):
+            row = query(session_uuid)
+            self.session.is_active = False
+            self.session.save(update_fields=["is_active"])
+            return row
+
+        with mock.patch.object(session_resolver, "_query", side_effect=slow_query):
+            self.assertTrue(session_resolver.resolve(self.session.session_uuid).is_active)
+        session_resolver.clear_local()
+        self.assertFalse(session_resolver.resolve(self.session.session_uuid).is_active)
+
+    def test_save_invalidates(self):
+        get_session_or_404(self.session.session_uuid)
+        self.session.is_active = False
+        self.session.save(update_fields=["is_active"])
+        self.assertFalse(get_session_or_404(self.session.session_uuid).is_active)
+
+    def test_unknown_and_malformed_uuids(self):
+        missing = uuid.uuid4()
+        with self.assertRaises(Http404):
+            get_session_or_404(missing)
+        with self.assertNumQueries(0):
+            self.assertIsNone(session_resolver.resolve(missing))
+            self.assertIsNone(session_resolver.resolve("not-a-uuid"))
+
+    def test_legacy_share_link(self):
+        legacy = uuid.uuid4()
+        self.session.legacy_uuid = legacy
+        self.session.unique_url = f"http://example.com/voter_session/verify/{legacy}/"
+        self.session.save()
+        self.assertEqual(get_session_or_404(legacy).pk, self.session.pk)
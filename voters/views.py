@@ -1,6 +1,7 @@
 from django.shortcuts import render, redirect
-from .models import VotingSession, Voter, Candidate, VotingSegmentHeader, ManualCheckCard  # Import the Voter model
+from .models import VotingSession, Voter, Candidate, VotingSegmentHeader, ManualCheckCard, normalize_name  # Import the Voter model
 from .forms import VoterForm , VotingSessionForm
+from .session_cache import get_session_or_404
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.decorators import login_required
 import logging
@@ -170,13 +171,36 @@ def _client_ip(request):
     return request.META.get('REMOTE_ADDR', '')
 
 
+def _rate_limited(key: str, limit: int, window: int) -> bool:
+    """
+    Count one attempt against ``key`` and report whether the limit is exceeded.
+    Uses the shared Redis pool when available so the limit holds across workers.
+    """
+    from motions.redis_registry import get_redis, record_failure
+
+    client = get_redis()
+    if client:
+        try:
+            # SET NX starts the window (EXPIRE ... NX would need Redis 7).
+            pipe = client.pipeline()
+            pipe.set(key, 0, ex=window, nx=True)
+            pipe.incr(key)
+            _, count = pipe.execute()
+            return int(count) > limit
+        except Exception as exc:
+            record_failure(exc)
+            logger.debug("Redis rate limit fallback to cache")
+    count = cache.get(key, 0)
+    if count >= limit:
+        return True
+    cache.set(key, count + 1, timeout=window)
+    return False
+
+
 @require_http_methods(["GET", "POST"])
 @never_cache
 def self_register(request, session_uuid):
-    try:
-        session = VotingSession.objects.get(session_uuid=session_uuid)
-    except Exception:
-        session = get_object_or_404(VotingSession, unique_url__contains=f'{session_uuid}')
+    session = get_session_or_404(session_uuid)
 
     rate_limit = getattr(settings, 'SELF_REG_RATE_LIMIT', 8)
     rate_window = getattr(settings, 'SELF_REG_RATE_WINDOW_SEC', 600)
@@ -206,15 +230,12 @@ def self_register(request, session_uuid):
         ip = _client_ip(request)
         if ip:
             key = f"selfreg:{session.session_uuid}:{ip}"
-            count = cache.get(key, 0)
-            if count >= rate_limit:
+            if _rate_limited(key, rate_limit, rate_window):
                 errors.append("Too many attempts. Please try again in a few minutes.")
-            else:
-                cache.set(key, count + 1, timeout=rate_window)
 
         duplicate = None
         if fname and lname:
-            qs = Voter.objects.filter(session=session, Fname__iexact=fname, Lname__iexact=lname)
+            qs = Voter.objects.filter(session=session).with_name(fname, lname)
             if email:
                 qs = qs.filter(Q(email__iexact=email) | Q(email__isnull=True) | Q(email=''))
             duplicate = qs.first()
@@ -277,11 +298,8 @@ def create_voting_session(request):
 def manage_session(request, session_id=None , session_uuid=None):
      # Determine the voting session
     if session_uuid:
-        # Prefer canonical UUID; fallback to legacy unique_url contains
-        try:
-            voting_session = VotingSession.objects.get(session_uuid=session_uuid)
-        except Exception:
-            voting_session = get_object_or_404(VotingSession, unique_url__contains=f'{session_uuid}')
+        # Prefer canonical UUID; fallback to the indexed legacy_uuid
+        voting_session = get_session_or_404(session_uuid)
     elif session_id:
         voting_session = get_object_or_404(VotingSession, session_id=session_id)
     else:
@@ -592,10 +610,7 @@ def qr_png(request, session_uuid):
     """Serve a QR PNG for the session's unique_url without relying on MEDIA.
     This avoids 404s in multi-instance environments with ephemeral disks.
     """
-    try:
-        session = VotingSession.objects.get(session_uuid=session_uuid)
-    except Exception:
-        session = get_object_or_404(VotingSession, unique_url__contains=f"{session_uuid}")
+    session = get_session_or_404(session_uuid)
 
     protocol = 'https' if request.is_secure() else 'http'
     host = request.get_host()
@@ -678,7 +693,7 @@ def delete_voting_session(request, session_id):
 def add_voters(request , session_id=None, session_uuid=None):
     # Determine which identifier to use
     if session_uuid:
-        voting_session = get_object_or_404(VotingSession, unique_url__contains=f'')
+        voting_session = get_session_or_404(session_uuid)
     elif session_id:
         voting_session = get_object_or_404(VotingSession, session_id=session_id)
     else:
@@ -716,7 +731,7 @@ def add_voters(request , session_id=None, session_uuid=None):
 def voter_list(request, session_id=None, session_uuid=None):
     # Determine the voting session
     if session_uuid:
-        voting_session = get_object_or_404(VotingSession, session_uuid=session_uuid)
+        voting_session = get_session_or_404(session_uuid)
     elif session_id:
         voting_session = get_object_or_404(VotingSession, session_id=session_id)
     else:
@@ -749,7 +764,7 @@ def voter_list(request, session_id=None, session_uuid=None):
             
             # First, check if the entire query matches an exact first name or last name
             exact_matches = voters.filter(
-                Q(Fname__iexact=search_query) | Q(Lname__iexact=search_query)
+                Q(fname_norm=normalize_name(search_query)) | Q(lname_norm=normalize_name(search_query))
             )
             if exact_matches.exists():
                 voters = exact_matches
@@ -849,10 +864,7 @@ def delete_voter(request, voter_id):
     is_ajax = request.headers.get('x-requested-with') == 'XMLHttpRequest'
 
     if session_uuid:
-        try:
-            voter = Voter.objects.get(voter_id=voter_id, session__session_uuid=session_uuid)
-        except Exception:
-            voter = get_object_or_404(Voter, voter_id=voter_id, session__unique_url__contains=f'{session_uuid}')
+        voter = get_object_or_404(Voter, voter_id=voter_id, session=get_session_or_404(session_uuid))
     elif session_id:
         voter = get_object_or_404(Voter, voter_id=voter_id, session__session_id=session_id)
     else:
@@ -888,10 +900,7 @@ def edit_voter(request, voter_id):
     session_id = request.GET.get('session_id')
 
     if session_uuid:
-        try:
-            voter = Voter.objects.get(voter_id=voter_id, session__session_uuid=session_uuid)
-        except Exception:
-            voter = get_object_or_404(Voter, voter_id=voter_id, session__unique_url__contains=f'{session_uuid}')
+        voter = get_object_or_404(Voter, voter_id=voter_id, session=get_session_or_404(session_uuid))
     elif session_id:
         voter = get_object_or_404(Voter, voter_id=voter_id, session__session_id=session_id)
     else:
@@ -1123,11 +1132,8 @@ from django.http import JsonResponse
 
 
 def voter_verification(request, session_uuid):
-    # Retrieve the voting session by canonical UUID, fallback to legacy unique_url contains
-    try:
-        session = VotingSession.objects.get(session_uuid=session_uuid)
-    except Exception:
-        session = get_object_or_404(VotingSession, unique_url__contains=f'{session_uuid}')
+    # Retrieve the voting session by canonical UUID, fallback to legacy_uuid
+    session = get_session_or_404(session_uuid)
     
     # Ensure the session is active and not closed
     if not session.is_active:
@@ -1147,10 +1153,7 @@ def voter_verification(request, session_uuid):
             error_message = "Both first and last name are required."
         else:
             # Check if the voter exists in the session, case-insensitive
-            voter = session.voters.filter(
-                Fname__iexact=submitted_first_name,
-                Lname__iexact=submitted_last_name
-            ).first()
+            voter = session.voters.with_name(submitted_first_name, submitted_last_name).first()
 
             # Check if the name is valid
             if voter:
@@ -1180,10 +1183,7 @@ from .models import VotingSession, Voter, Vote
 
 def voter_session(request, session_uuid, voter_id):
     # Fetch the session and voter
-    try:
-        session = VotingSession.objects.get(session_uuid=session_uuid)
-    except Exception:
-        session = get_object_or_404(VotingSession, unique_url__contains=session_uuid)
+    session = get_session_or_404(session_uuid)
     voter = get_object_or_404(Voter, voter_id=voter_id)
 
     # Ensure the voter is associated with the session
@@ -1228,10 +1228,7 @@ def submit_vote(request, session_uuid , voter_id):
             return JsonResponse({'error': 'Anonymous handoff enabled. Use /api/cast via BBS.'}, status=400)
         print(f"Received POST request for session: {session_uuid}, voter: {voter_id}")
         voter = get_object_or_404(Voter,voter_id=voter_id)
-        try:
-            session = VotingSession.objects.get(session_uuid=session_uuid)
-        except Exception:
-            session = get_object_or_404(VotingSession, unique_url__contains=f'{session_uuid}')
+        session = get_session_or_404(session_uuid)
 
         
 
@@ -1291,10 +1288,7 @@ def segment_results(request, session_uuid):
     # Admin-only: restrict to authenticated staff
     if not request.user.is_authenticated or not getattr(request.user, 'is_staff', False):
         return HttpResponseForbidden("Results are restricted to administrators.")
-    try:
-        session = VotingSession.objects.get(session_uuid=session_uuid)
-    except Exception:
-        session = get_object_or_404(VotingSession, unique_url__contains=f'{session_uuid}')
+    session = get_session_or_404(session_uuid)
     segments = session.segments.all()
 
     # Calculate the vote tallies
@@ -1340,11 +1334,8 @@ from django.shortcuts import render, get_object_or_404
 from .models import Voter, Vote, VotingSession, VotingSegmentHeader, Candidate
 
 def review_voter_results(request, voter_id, session_uuid):
-    # Retrieve the voting session using session_uuid (canonical), fallback legacy
-    try:
-        session = VotingSession.objects.get(session_uuid=session_uuid)
-    except Exception:
-        session = get_object_or_404(VotingSession, unique_url__contains=f'{session_uuid}')
+    # Retrieve the voting session using session_uuid (canonical), fallback legacy_uuid
+    session = get_session_or_404(session_uuid)
     
     # Get the voter from the database
     voter = get_object_or_404(Voter, voter_id=voter_id, session=session)
@@ -1375,10 +1366,7 @@ def review_voter_results(request, voter_id, session_uuid):
 def manual_check_page(request, session_uuid):
     if not request.user.is_authenticated or not getattr(request.user, 'is_staff', False):
         return HttpResponseForbidden("Manual check is restricted to administrators.")
-    try:
-        voting_session = VotingSession.objects.get(session_uuid=session_uuid)
-    except Exception:
-        voting_session = get_object_or_404(VotingSession, unique_url__contains=f'{session_uuid}')
+    voting_session = get_session_or_404(session_uuid)
 
     voters = voting_session.voters.all()
     verified_voters_count = voters.filter(is_verified=True).count()
@@ -1403,10 +1391,7 @@ def manual_check_page(request, session_uuid):
 def manual_check_card(request, session_uuid):
     if not request.user.is_authenticated or not getattr(request.user, 'is_staff', False):
         return HttpResponseForbidden("Manual check is restricted to administrators.")
-    try:
-        session = VotingSession.objects.get(session_uuid=session_uuid)
-    except Exception:
-        session = get_object_or_404(VotingSession, unique_url__contains=f'{session_uuid}')
+    session = get_session_or_404(session_uuid)
 
     try:
         index = int(request.GET.get('index', 0))
@@ -1478,7 +1463,7 @@ def manual_check_card(request, session_uuid):
 
 def voter_counts(request, session_uuid):
     # Use canonical UUID field to support pre-activation fetching
-    session = get_object_or_404(VotingSession, session_uuid=session_uuid)
+    session = get_session_or_404(session_uuid)
     verified_count = session.voters.filter(is_verified=True).count()
     finished_count = session.voters.filter(has_finished=True).count()
     total_count = session.voters.count()
@@ -1493,7 +1478,7 @@ def voter_counts(request, session_uuid):
 def get_voters(request, session_id=None, session_uuid=None):
     # Determine which identifier to use
     if session_uuid:
-        voting_session = get_object_or_404(VotingSession, session_uuid=session_uuid)
+        voting_session = get_session_or_404(session_uuid)
     
     elif session_id:
         voting_session = get_object_or_404(VotingSession, session_id=session_id)
@@ -1564,7 +1549,7 @@ def update_segment_name(request, segment_id):
 def get_voter_status(request, session_uuid):
     try:
         # Fetch the VotingSession object using the canonical UUID
-        session = VotingSession.objects.get(session_uuid=session_uuid)
+        session = get_session_or_404(session_uuid)
 
 
         # Fetch the search query parameter
@@ -14,8 +14,10 @@ from channels.security.websocket import AllowedHostsOriginValidator
 from django.core.asgi import get_asgi_application
 
 import motions.routing
+from motions.workers import start_background_workers
 
 django_asgi_app = get_asgi_application()
+start_background_workers()
 
 application = ProtocolTypeRouter(
     {
@@ -132,10 +132,85 @@ WSGI_APPLICATION = 'voting_system.wsgi.application'
 ASGI_APPLICATION = 'voting_system.asgi.application'
 
 REDIS_URL = os.environ.get('REDIS_URL')
+# Shared Redis pool for tallies, presence, preview cache and rate limiting
+REDIS_POOL_MAX_CONNECTIONS = int(os.environ.get('REDIS_POOL_MAX_CONNECTIONS', '50'))
+REDIS_POOL_TIMEOUT_SEC = float(os.environ.get('REDIS_POOL_TIMEOUT_SEC', '2'))
+REDIS_HEALTH_CHECK_INTERVAL_SEC = int(os.environ.get('REDIS_HEALTH_CHECK_INTERVAL_SEC', '30'))
+REDIS_BREAKER_THRESHOLD = int(os.environ.get('REDIS_BREAKER_THRESHOLD', '5'))
+REDIS_BREAKER_COOLDOWN_SEC = float(os.environ.get('REDIS_BREAKER_COOLDOWN_SEC', '10'))
+# Motion vote ingestion: "db" (row-locked insert per vote) or "write_behind"
+# (Redis buffer + Lua tallies, flushed to MotionVote in batches; needs REDIS_URL)
+MOTION_VOTE_INGEST_MODE = os.environ.get('MOTION_VOTE_INGEST_MODE', 'db')
+MOTION_WRITE_BEHIND_FLUSH_SEC = float(os.environ.get('MOTION_WRITE_BEHIND_FLUSH_SEC', '0.5'))
+MOTION_WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('MOTION_WRITE_BEHIND_BATCH_SIZE', '500'))
+# Max admin tally frames per second per motion; votes in between are coalesced
+MOTION_TALLY_BROADCAST_HZ = float(os.environ.get('MOTION_TALLY_BROADCAST_HZ', '4'))
+# Broadcasts from views go through an outbox drained by a sender thread every
+# MOTION_BROADCAST_TICK_MS; frames for the same group are merged per tick.
+# (The in-memory channel layer always sends inline.)
+MOTION_BROADCAST_OUTBOX = os.environ.get('MOTION_BROADCAST_OUTBOX', 'true').lower() in ('1', 'true', 'yes')
+MOTION_BROADCAST_TICK_MS = float(os.environ.get('MOTION_BROADCAST_TICK_MS', '10'))
+# How long a voter socket's channel name stays registered for direct frames
+# (vote_ack) if it never disconnects cleanly.
+MOTION_CHANNEL_REGISTRY_TTL_SEC = int(os.environ.get('MOTION_CHANNEL_REGISTRY_TTL_SEC', '86400'))
+# Broadcast frames kept per event and audience for replay to sockets that
+# reconnect with ?last_seq=N.
+MOTION_REPLAY_BUFFER_SIZE = int(os.environ.get('MOTION_REPLAY_BUFFER_SIZE', '500'))
+# Read-only display streams (SSE): keep-alive comment interval, and frames
+# buffered per stream before a slow display is dropped to resume later.
+MOTION_SSE_KEEPALIVE_SEC = float(os.environ.get('MOTION_SSE_KEEPALIVE_SEC', '15'))
+MOTION_SSE_QUEUE_SIZE = int(os.environ.get('MOTION_SSE_QUEUE_SIZE', '256'))
+# Per-socket send queue: frames held for a slow client before superseded
+# presence/tally frames are dropped, and before it is closed with code 4408
+# (queue still full, or the oldest frame waited MOTION_SEND_STALL_SEC).
+MOTION_SEND_QUEUE_DEPTH = int(os.environ.get('MOTION_SEND_QUEUE_DEPTH', '64'))
+MOTION_SEND_STALL_SEC = float(os.environ.get('MOTION_SEND_STALL_SEC', '30'))
+# Voter handshakes admitted per second per ASGI process (token bucket with
+# MOTION_CONNECT_BURST headroom); the rest are closed with code 4429 and a
+# jittered retry hint. MOTION_CONNECT_RATE=0 disables admission control.
+MOTION_CONNECT_RATE = float(os.environ.get('MOTION_CONNECT_RATE', '200'))
+MOTION_CONNECT_BURST = float(os.environ.get('MOTION_CONNECT_BURST', '400'))
+# VotingSession lookups by public UUID: per-process LRU entries (and how long
+# another process may serve one after a save), then the shared Redis/cache copy
+SESSION_RESOLVER_LOCAL_SIZE = int(os.environ.get('SESSION_RESOLVER_LOCAL_SIZE', '512'))
+SESSION_RESOLVER_LOCAL_TTL_SEC = float(os.environ.get('SESSION_RESOLVER_LOCAL_TTL_SEC', '5'))
+SESSION_RESOLVER_TTL_SEC = int(os.environ.get('SESSION_RESOLVER_TTL_SEC', '300'))
+# Auto-close worker: "thread" runs in each web process, "command" expects
+# `manage.py motion_autoclose` to run as its own process
+MOTION_AUTOCLOSE_WORKER = os.environ.get('MOTION_AUTOCLOSE_WORKER', 'thread')
+# Tally reconciler: seconds between passes comparing live counters with
+# MotionVote, and where it runs ("thread" or `manage.py motion_reconcile`)
+MOTION_RECONCILE_INTERVAL_SEC = float(os.environ.get('MOTION_RECONCILE_INTERVAL_SEC', '5'))
+MOTION_RECONCILE_WORKER = os.environ.get('MOTION_RECONCILE_WORKER', 'thread')
+# presence_update cadence per audience: a frame goes out when the count has
+# changed and the interval has passed, or at once on a change of CHANGE_PCT
+# percent (0 = any change). Admins need live quorum, voters a rough figure.
+MOTION_PRESENCE_ADMIN_SEC = float(os.environ.get('MOTION_PRESENCE_ADMIN_SEC', '1'))
+MOTION_PRESENCE_ADMIN_CHANGE_PCT = float(os.environ.get('MOTION_PRESENCE_ADMIN_CHANGE_PCT', '0'))
+MOTION_PRESENCE_VOTER_SEC = float(os.environ.get('MOTION_PRESENCE_VOTER_SEC', '30'))
+MOTION_PRESENCE_VOTER_CHANGE_PCT = float(os.environ.get('MOTION_PRESENCE_VOTER_CHANGE_PCT', '5'))
+# Presence store: "exact" (sorted set per event) or "hll" (approximate
+# HyperLogLog per time bucket, for very large events; Redis only). Without
+# Redis a process-local bucketed store is used. Bucket width in seconds.
+MOTION_PRESENCE_MODE = os.environ.get('MOTION_PRESENCE_MODE', 'exact')
+MOTION_PRESENCE_BUCKET_SEC = int(os.environ.get('MOTION_PRESENCE_BUCKET_SEC', '5'))
+# Attendance history kept per event: per-second points and per-minute rollups
+MOTION_ATTENDANCE_SECONDS_KEPT = int(os.environ.get('MOTION_ATTENDANCE_SECONDS_KEPT', '900'))
+MOTION_ATTENDANCE_MINUTES_KEPT = int(os.environ.get('MOTION_ATTENDANCE_MINUTES_KEPT', '1440'))
+# Channel layer backend when REDIS_URL is set. "redis" writes every group
+# message into each member channel's queue in Redis (one write per socket);
+# "pubsub" publishes it once and each ASGI process fans it out to its own
+# sockets in memory, which suits events with thousands of voters. Compare
+# them with `manage.py motion_fanout_benchmark`.
+CHANNEL_LAYER_BACKENDS = {
+    'redis': 'channels_redis.core.RedisChannelLayer',
+    'pubsub': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+}
+MOTION_CHANNEL_LAYER = os.environ.get('MOTION_CHANNEL_LAYER', 'redis')
 if REDIS_URL:
     CHANNEL_LAYERS = {
         "default": {
-            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "BACKEND": CHANNEL_LAYER_BACKENDS.get(MOTION_CHANNEL_LAYER, CHANNEL_LAYER_BACKENDS['redis']),
             "CONFIG": {"hosts": [REDIS_URL]},
         }
     }
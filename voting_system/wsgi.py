@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voting_system.settings')
 
 application = get_wsgi_application()
+
+from motions.workers import start_background_workers  # noqa: E402
+
+start_background_workers()